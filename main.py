@@ -1,7 +1,10 @@
 import typer
 from pathlib import Path
 from pipeline.filter.pipeline import run_filter
+from pipeline.filter.pre_classifier import train_pre_classifier as train_local_classifier
 from pipeline.preprocess.pipeline import run_preprocess
+from pipeline.common.settings import ATTACHMENT_WORKERS, RECORDS_FORMAT, NEAR_DUP_ENABLED, LLM_MAX_CONCURRENCY
+from pipeline.common.records import convert_json_to_records
 from pipeline.eval.generate_qa_data import run_qa_generation
 from pipeline.chunking.pipeline import EmailProcessingPipeline
 from pipeline.eval.retriever_eval import eval_retriever_simple
@@ -10,42 +13,70 @@ app = typer.Typer()
 
 @app.command()
 def preprocess_emails(
-    input_file: str = "email_conversations.json"
+    input_file: str = "email_conversations",
+    full_attachments: bool = typer.Option(False, help="Fully extract every attachment instead of previews (filter-emails extracts included ones)"),
+    workers: int = typer.Option(ATTACHMENT_WORKERS, help="Attachment extraction processes (0 extracts in-process)"),
+    near_duplicates: bool = typer.Option(NEAR_DUP_ENABLED, help="Mark near-duplicate broadcast emails so they are classified and embedded once")
 ):
     """
     Preprocess emails from the input file, including body content and attachments.
     
     Args:
-        input_file: Name of the input JSON file in the data directory (default: email_conversations.json)
+        input_file: Name or stem of the input record file in the data directory (default: email_conversations)
     """
     print(f"Preprocessing emails from {input_file}...")
-    run_preprocess(input_file=input_file)
+    run_preprocess(input_file=input_file, full_attachments=full_attachments, workers=workers, near_duplicates=near_duplicates)
 
 @app.command()
 def filter_emails(
-    input_file: str = "preprocessed_email_conversations.json",
-    output_dir: str = "processed_emails"
+    input_file: str = "preprocessed_email_conversations",
+    output_dir: str = "processed_emails",
+    workers: int = typer.Option(LLM_MAX_CONCURRENCY, help="Number of conversations classified concurrently"),
+    requests_per_minute: int = typer.Option(0, help="Cap on classification requests per minute (0 for no cap)"),
+    resume: bool = typer.Option(True, help="Skip conversations already classified by an interrupted run"),
+    pre_classifier: bool = typer.Option(True, help="Decide obvious emails locally before calling the LLM"),
+    batch_size: int = typer.Option(1, help="Emails classified per LLM prompt (1 disables batching)")
 ):
     """
     Process and classify emails from the preprocessed file.
     
     Args:
-        input_file: Name of the input JSON file in the data directory (default: preprocessed_email_conversations.json)
+        input_file: Name or stem of the input record file in the data directory (default: preprocessed_email_conversations)
         output_dir: Name of the output directory in the data directory (default: processed_emails)
     """
     print(f"Processing emails from {input_file}...")
-    run_filter(input_file=input_file, output_dir=output_dir)
+    run_filter(
+        input_file=input_file,
+        output_dir=output_dir,
+        workers=workers,
+        requests_per_minute=requests_per_minute or None,
+        resume=resume,
+        use_pre_classifier=pre_classifier,
+        batch_size=batch_size
+    )
+
+@app.command()
+def train_pre_classifier(
+    output_dir: str = "processed_emails"
+):
+    """
+    Train the local pre-classifier on the LLM decisions of a previous filter run.
+    
+    Args:
+        output_dir: Name of the filter output directory in the data directory (default: processed_emails)
+    """
+    train_local_classifier(Path(__file__).parent / 'data' / output_dir)
 
 @app.command()
 def generate_qa(
-    input_file: str = "included_emails.json",
+    input_file: str = "included_emails",
     output_file: str = "qa_pairs.json"
 ):
     """
     Generate QA pairs from processed emails.
     
     Args:
-        input_file: Name of the input JSON file in the processed_emails directory (default: included_emails.json)
+        input_file: Name or stem of the input record file in the processed_emails directory (default: included_emails)
         output_file: Name of the output JSON file to store QA pairs (default: qa_pairs.json)
     """
     print(f"Generating QA pairs from {input_file}...")
@@ -53,16 +84,34 @@ def generate_qa(
 
 @app.command()
 def embed_emails(
-    input_file: str = "included_emails.json"
+    input_file: str = "included_emails",
+    incremental: bool = typer.Option(False, help="Only index new or changed conversations"),
+    delete_removed: bool = typer.Option(True, help="In incremental mode, delete conversations missing from the input")
 ):
     """
     Process emails into chunks and create embeddings.
     
     Args:
-        input_file: Name of the input JSON file in the processed_emails directory (default: included_emails.json)
+        input_file: Name or stem of the input record file in the processed_emails directory (default: included_emails)
+        incremental: Only index new or changed conversations into the existing index
+        delete_removed: In incremental mode, delete conversations missing from the input
     """
     from pipeline.chunking.pipeline import run_embed
-    run_embed(input_file=input_file)
+    run_embed(input_file=input_file, incremental=incremental, delete_removed=delete_removed)
+
+@app.command()
+def convert_to_jsonl(
+    input_file: str = typer.Argument(..., help="JSON array file in the data directory, e.g. processed_emails/included_emails.json"),
+    records_format: str = typer.Option(RECORDS_FORMAT, help="Output format: jsonl or jsonl.zst")
+):
+    """
+    Convert a legacy JSON array file to the streaming record format.
+    
+    Args:
+        input_file: Path of the JSON file relative to the data directory
+        records_format: Output format, jsonl or jsonl.zst (default from RECORDS_FORMAT)
+    """
+    convert_json_to_records(Path(__file__).parent / 'data' / input_file, records_format=records_format)
 
 @app.command()
 def eval_retriever(
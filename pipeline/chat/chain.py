@@ -167,7 +167,8 @@ class AnalysisChain:
                         input_str=query,
                         run_id=run_id
                     )
-            retrieval_output = self.content_retriever.run(query)
+            # Reuse the analysis from step 1 instead of analyzing again
+            retrieval_output = self.content_retriever.run({"query": query, "query_info": query_info})
             if callbacks:
                 for callback in callbacks:
                     # Convert retrieval output to dict if it's a Pydantic model
@@ -9,6 +9,7 @@ from ..retrieval.filter_builder import ElasticsearchFilterBuilder
 from ..retrieval.retrievers import VectorRetriever, WeightedAverageRetriever
 from ..retrieval.processor import ConversationProcessor
 from ..retrieval.schema import RetrievalResult
+from ..retrieval.request_context import RequestContext
 from ..generation.context_builder import ContextBuilder
 from ..generation.generator import Generator
 from ..common.store import EmailStore
@@ -38,16 +39,10 @@ class QueryAnalysisTool(BaseTool):
         Returns:
             Dict containing query and optional analysis/filter
         """
-        try:
-            analysis = self.analyzer.invoke(query)
-            result = {"query": query}
-            if analysis:
-                # Convert Pydantic model to dict for JSON serialization
-                result["analysis"] = analysis.model_dump() if hasattr(analysis, 'model_dump') else analysis
-                result["filter_dict"] = self.filter_builder.build_filter(analysis)
-            return result
-        except Exception as e:
-            return {"query": query, "error": str(e)}
+        context = RequestContext(query=query)
+        context.analyze(self.analyzer, self.filter_builder)
+        # Pydantic models are converted to dicts for JSON serialization
+        return context.to_query_info()
 
 class ContentRetrievalTool(BaseTool):
     """Tool for retrieving relevant content using vector or weighted retrieval."""
@@ -61,40 +56,45 @@ class ContentRetrievalTool(BaseTool):
     def __init__(self, **kwargs):
         """Initialize the content retrieval tool."""
         super().__init__(**kwargs)
-        self.store = EmailStore()
+        if self.store is None:
+            self.store = EmailStore()
     
     def _run(
         self,
-        query: str
+        query: str,
+        query_info: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """Run content retrieval.
         
         Args:
             query: Query string to search for
+            query_info: Output of QueryAnalysisTool for this query, if it already ran
                 
         Returns:
             Dict containing query and retrieval results
         """
-        # Build query info using QueryAnalyzer if needed
-        if self.retriever_type == "advanced":
-            query_info = QueryAnalysisTool().run(query)
-        else:
-            query_info = {"query": query}
+        # Build query info using QueryAnalyzer only if no analysis was passed in
+        if query_info is None:
+            if self.retriever_type == "advanced":
+                query_info = QueryAnalysisTool().run(query)
+            else:
+                query_info = {"query": query}
+        context = RequestContext.from_query_info(query_info)
         
         if self.retriever_type == "basic":
             retriever = VectorRetriever(store=self.store)
-            results = retriever.retrieve(query=query_info["query"], k=self.k)
+            results = retriever.retrieve(query=context.query, k=self.k)
         else:
             retriever = WeightedAverageRetriever(store=self.store)
             results = retriever.retrieve(
-                query=query_info["query"],
-                analysis=query_info.get("analysis"),
-                filter_dict=query_info.get("filter_dict"),
+                query=context.query,
+                analysis=context.analysis,
+                filter_dict=context.filter_dict,
                 k=self.k
             )
         
         return {
-            "query": query_info["query"],
+            "query": context.query,
             "results": results
         }
 
@@ -128,7 +128,8 @@ class ResultProcessorTool(BaseTool):
         retrieval_output = json.loads(retrieval_output_str)
         
         conversation_groups = self.processor.group_conversations(
-            retrieval_output["results"]
+            retrieval_output["results"],
+            lazy=True
         )
         
         result = RetrievalResult(query=retrieval_output["query"])
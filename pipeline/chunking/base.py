@@ -30,6 +30,12 @@ class ChunkMetadata:
     # For attachments
     attachment_metadata: Optional[Dict[str, Any]] = None
     
+    # Hash of the source conversation, used to detect changed conversations
+    conversation_hash: Optional[str] = None
+    
+    # Near-duplicate conversations represented by this conversation's chunks
+    duplicate_conversation_ids: Optional[List[str]] = None
+    
     def to_dict(self) -> Dict[str, Any]:
         """Convert to flat dictionary for Elasticsearch storage"""
         metadata_dict = {
@@ -45,6 +51,12 @@ class ChunkMetadata:
             "total_chunks": self.total_chunks,
         }
         
+        if self.conversation_hash:
+            metadata_dict["conversation_hash"] = self.conversation_hash
+        
+        if self.duplicate_conversation_ids:
+            metadata_dict["duplicate_conversation_ids"] = self.duplicate_conversation_ids
+        
         # Add attachment metadata if present
         if self.attachment_metadata:
             for k, v in self.attachment_metadata.items():
@@ -63,9 +75,9 @@ class Chunk:
         return cls(content=doc.page_content, metadata=metadata)
 
 class BaseChunker(ABC):
-    def __init__(self, dataset: str):
+    def __init__(self, dataset: str, embeddings=None):
         self.dataset = dataset
-        self.embeddings = EMBEDDINGS
+        self.embeddings = embeddings or EMBEDDINGS
 
     @abstractmethod
     def get_name(self) -> str:
@@ -1,15 +1,62 @@
-from typing import List, Dict, Any, Generator
+import re
+import json
+import bisect
+import hashlib
+from typing import List, Dict, Any, Generator, Optional, Tuple
 from pathlib import Path
 from .document_chunker import DocumentChunker
 from .base import Chunk
+from .thread_dedup import ThreadDeduplicator
 from pipeline.preprocess.attachment_processor import DocumentProcessor
+from pipeline.preprocess.near_duplicates import REFERENCES_FIELD
+from pipeline.common.settings import THREAD_DEDUP_ENABLED
+
+def compute_conversation_hash(conversation: Dict[str, Any]) -> str:
+    """Hash a conversation's content so changed conversations can be detected"""
+    serialized = json.dumps(conversation, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+# Sentence boundaries used by the semantic chunker; sentences themselves are copied verbatim
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.?!])\s+')
+
+def chunk_page_span(content: str, chunk_text: str, page_offsets: List[int], cursor: int = 0) -> Optional[Tuple[int, int, int]]:
+    """Pages (1-based) a chunk of content spans, located through its first and last sentences
+    
+    Args:
+        content: Full extracted attachment text
+        chunk_text: Text of one chunk of that content
+        page_offsets: Character offset where each page starts in content
+        cursor: Offset to search from, so repeated text resolves to the next occurrence
+        
+    Returns:
+        (first page, last page, offset to continue searching from), or None if the chunk
+        cannot be located
+    """
+    sentences = SENTENCE_BOUNDARY.split(chunk_text.strip())
+    first, last = sentences[0], sentences[-1]
+    if not first:
+        return None
+    start = content.find(first, cursor)
+    if start < 0:
+        start = content.find(first)
+        if start < 0:
+            return None
+    end = content.find(last, start)
+    end = start + len(first) if end < 0 else end + len(last)
+    return (
+        bisect.bisect_right(page_offsets, start),
+        bisect.bisect_right(page_offsets, max(start, end - 1)),
+        start + len(first)
+    )
 
 class ConversationProcessor:
     """Process entire email conversations including all messages and attachments"""
     
-    def __init__(self, dataset: str, base_dir: str = None):
+    def __init__(self, dataset: str, base_dir: str = None, dedup_threads: bool = THREAD_DEDUP_ENABLED):
         self.document_chunker = DocumentChunker(dataset)
         self.attachment_processor = DocumentProcessor(base_dir)
+        # Drops text quoted or forwarded from earlier messages so each reply is chunked once
+        self.thread_deduplicator = ThreadDeduplicator() if dedup_threads else None
         
     def process_conversation(self, conversation: Dict[str, Any]) -> Generator[Chunk, None, None]:
         """Process an entire conversation including all messages and attachments
@@ -21,19 +68,32 @@ class ConversationProcessor:
             Chunk objects for email bodies and attachments
         """
         conversation_id = conversation['ConversationID']
+        conversation_hash = compute_conversation_hash(conversation)
+        messages = conversation['Messages']
+        dedup = self.thread_deduplicator is not None and len(messages) > 1
+        bodies = self.thread_deduplicator.novel_bodies(messages) if dedup else [message['Body'] for message in messages]
         
         # Process each message in the conversation
-        for message in conversation['Messages']:
-            # Process email body
-            yield from self._process_message_body(conversation, message)
+        for message, body in zip(messages, bodies):
+            # Process the part of the email body not repeated from earlier messages,
+            # skipping replies that only quote the thread and emptied bodies
+            if not body.strip():
+                chunks = []
+            else:
+                chunks = list(self._process_message_body(conversation, message, body))
             
             # Process attachments if any
             # Only use pre-processed Attachments from included_emails.json
             if 'Attachments' in message and message['Attachments']:
-                yield from self._process_message_attachments_with_content(conversation_id, message)
+                chunks.extend(self._process_message_attachments_with_content(conversation_id, message))
+            
+            for chunk in chunks:
+                chunk.metadata.conversation_hash = conversation_hash
+                chunk.metadata.duplicate_conversation_ids = conversation.get(REFERENCES_FIELD)
+            yield from chunks
 
-    def _process_message_body(self, conversation: Dict[str, Any], message: Dict[str, Any]) -> Generator[Chunk, None, None]:
-        """Process a single message body"""
+    def _process_message_body(self, conversation: Dict[str, Any], message: Dict[str, Any], body: Optional[str] = None) -> Generator[Chunk, None, None]:
+        """Process a single message body, or the given novel part of it"""
         # Create metadata for the message
         metadata = {
             'ConversationID': conversation['ConversationID'],
@@ -43,7 +103,7 @@ class ConversationProcessor:
         
         # Process the message body
         chunks = self.document_chunker.process_document(
-            content=message['Body'],
+            content=message['Body'] if body is None else body,
             metadata=metadata
         )
         yield from chunks
@@ -87,6 +147,22 @@ class ConversationProcessor:
                     content=attachment['content'],
                     metadata=metadata
                 )
+                
+                # Record the pages each chunk came from so answers can cite them
+                extraction_metadata = attachment.get('metadata') or [{}]
+                page_offsets = extraction_metadata[0].get('page_offsets')
+                if page_offsets:
+                    cursor = 0
+                    for chunk in chunks:
+                        span = chunk_page_span(attachment['content'], chunk.content, page_offsets, cursor)
+                        if span is None:
+                            continue
+                        page_start, page_end, cursor = span
+                        chunk.metadata.attachment_metadata = {
+                            **(chunk.metadata.attachment_metadata or {}),
+                            'page_start': page_start,
+                            'page_end': page_end
+                        }
                 yield from chunks
                     
             except Exception as e:
@@ -94,22 +170,19 @@ class ConversationProcessor:
                 continue
 
 def process_conversations(conversations_file: str, dataset: str, base_dir: str = None) -> Generator[Chunk, None, None]:
-    """Process all conversations from a JSON file
+    """Process all conversations from a record file
     
     Args:
-        conversations_file: Path to JSON file containing conversations
+        conversations_file: Path to a .json, .jsonl or .jsonl.zst file containing conversations
         dataset: Name of the dataset
         base_dir: Base directory for relative attachment paths
         
     Yields:
         Chunk objects for all email bodies and attachments
     """
-    import json
+    from ..common.records import read_records
     
     processor = ConversationProcessor(dataset, base_dir)
     
-    with open(conversations_file, 'r') as f:
-        conversations = json.load(f)
-        
-    for conversation in conversations:
+    for conversation in read_records(conversations_file):
         yield from processor.process_conversation(conversation)
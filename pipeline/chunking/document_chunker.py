@@ -3,8 +3,12 @@ from .base import BaseChunker, Chunk, ChunkMetadata
 from .splitters import PDFSplitter, DocxSplitter, XLSXSplitter, DocumentSplitter
 
 class DocumentChunker(BaseChunker):
-    def __init__(self, dataset: str):
-        super().__init__(dataset)
+    def __init__(self, dataset: str, embeddings=None):
+        super().__init__(dataset, embeddings)
+        # Global chunk tracking across all processed documents
+        self._current_chunk_index = 0
+        self._total_chunks = 0
+        
         # Initialize document type specific splitters
         self._splitters = {
             '.pdf': PDFSplitter(self.embeddings),
@@ -22,37 +26,38 @@ class DocumentChunker(BaseChunker):
     def get_name(self) -> str:
         return f"document_chunker_{self.dataset}"
 
-    def process_document(self, content: str, metadata: Dict[str, Any]) -> List[Chunk]:
-        """Process a document (email or attachment) into chunks"""
-        # Initialize global chunk tracking if not present
-        if not hasattr(self, '_current_chunk_index'):
-            self._current_chunk_index = 0
-            self._total_chunks = 0
+    def reset_chunk_index(self, start_index: int = 0):
+        """Restart global chunk numbering at start_index
         
-        # First pass to count total chunks
-        if 'ConversationID' in metadata and 'Messages' in metadata:
-            chunks = self._process_email_body(content, metadata, count_only=True)
-        elif 'extension' in metadata:
-            chunks = self._process_attachment(content, metadata, count_only=True)
-        else:
-            chunks = self._process_default(content, metadata, count_only=True)
-        self._total_chunks += len(chunks)
+        Used by incremental ingestion so new chunks continue after the ones already indexed.
+        """
+        self._current_chunk_index = start_index
+        self._total_chunks = start_index
+
+    def process_document(self, content: str, metadata: Dict[str, Any]) -> List[Chunk]:
+        """Process a document (email or attachment) into chunks
         
-        # Second pass to actually process with global indices
+        Each document is split exactly once. Global chunk indices and the running
+        chunk total are filled in afterwards, once the number of chunks is known.
+        """
         if 'ConversationID' in metadata and 'Messages' in metadata:
             chunks = self._process_email_body(content, metadata)
         elif 'extension' in metadata:
             chunks = self._process_attachment(content, metadata)
         else:
             chunks = self._process_default(content, metadata)
+        
+        # Assign global indices now that the chunk count is known
+        self._total_chunks += len(chunks)
+        for chunk in chunks:
+            chunk.metadata.chunk_index = self._current_chunk_index
+            chunk.metadata.total_chunks = self._total_chunks
+            self._current_chunk_index += 1
             
         return chunks
 
-    def _process_email_body(self, content: str, metadata: Dict[str, Any], count_only: bool = False) -> List[Chunk]:
+    def _process_email_body(self, content: str, metadata: Dict[str, Any]) -> List[Chunk]:
         """Process email body as a single chunk"""
-        if count_only:
-            return [None]  # Just return a list of length 1
-            
         message = metadata['Messages'][0]  # Assuming first message
         # Parse received time into year, month, day
         received_time = message['ReceivedTime']
@@ -71,40 +76,28 @@ class DocumentChunker(BaseChunker):
                 month=month,
                 day=day,
                 chunk_type='email_body',
-                chunk_index=self._current_chunk_index,
-                total_chunks=self._total_chunks
+                chunk_index=0,
+                total_chunks=1
             )
         )
-        self._current_chunk_index += 1
         return [chunk]
 
-    def _process_attachment(self, content: str, metadata: Dict[str, Any], count_only: bool = False) -> List[Chunk]:
+    def _process_attachment(self, content: str, metadata: Dict[str, Any]) -> List[Chunk]:
         """Process attachment using appropriate splitter"""
         doc_type = metadata['extension']
         
         if doc_type in self._splitters:
-            chunks = self._splitters[doc_type].split_document(content, metadata)
-            if count_only:
-                return [None] * len(chunks)
-                
-            # Update global indices
-            for chunk in chunks:
-                chunk.metadata.chunk_index = self._current_chunk_index
-                chunk.metadata.total_chunks = self._total_chunks
-                self._current_chunk_index += 1
-            return chunks
+            return self._splitters[doc_type].split_document(content, metadata)
             
-        return self._process_default(content, metadata, count_only)
+        return self._process_default(content, metadata)
 
-    def _process_default(self, content: str, metadata: Dict[str, Any], count_only: bool = False) -> List[Chunk]:
+    def _process_default(self, content: str, metadata: Dict[str, Any]) -> List[Chunk]:
         """Default processing for unknown document types"""
         # Use default chunker from any splitter (they all have the same default)
         chunks = self._splitters['.pdf'].default_chunker.split_text(content)
-        if count_only:
-            return [None] * len(chunks)
-            
+        
         result = []
-        for chunk_content in chunks:
+        for idx, chunk_content in enumerate(chunks):
             chunk = Chunk(
                 content=chunk_content,
                 metadata=ChunkMetadata(
@@ -116,11 +109,10 @@ class DocumentChunker(BaseChunker):
                     month=metadata.get('month', 1),
                     day=metadata.get('day', 1),
                     chunk_type='unknown',
-                    chunk_index=self._current_chunk_index,
-                    total_chunks=self._total_chunks,
+                    chunk_index=idx,
+                    total_chunks=len(chunks),
                     attachment_metadata=metadata.get('attachment_metadata', {})
                 )
             )
             result.append(chunk)
-            self._current_chunk_index += 1
         return result
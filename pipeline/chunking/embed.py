@@ -1,22 +1,158 @@
-from typing import List, Dict, Any, TypeVar, Sequence
+import time
+import asyncio
+import hashlib
+import itertools
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Tuple, TypeVar, Sequence, Iterable, Iterator, Optional
 from tqdm import tqdm
 from ..common.store import EmailStore
-from ..common.settings import ELASTIC_DEFAULT_INDEX
+from ..common.records import batched
+from ..common.settings import (
+    ELASTIC_DEFAULT_INDEX,
+    EMBEDDING_BATCH_MAX_TOKENS,
+    EMBEDDING_BATCH_MAX_ITEMS,
+    EMBEDDING_WINDOW_CHUNKS
+)
 from .base import Chunk
+from .token_batcher import TokenBatcher, TokenStats
+
+
+def make_chunk_id(conversation_id: str, content: str, position: int) -> str:
+    """Build a deterministic document ID for a chunk
+
+    Args:
+        conversation_id: Conversation the chunk belongs to
+        content: Chunk text
+        position: Position of the chunk within its conversation
+    """
+    content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+    key = f"{conversation_id}:{position}:{content_hash}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+def make_batch_fingerprint(ids: List[str]) -> str:
+    """Fingerprint a batch by the IDs it contains"""
+    return hashlib.sha256('\n'.join(ids).encode('utf-8')).hexdigest()
+
+def make_run_id(mode: str, ids: List[str]) -> str:
+    """Identify an embedding run by its mode and input, keying its batch checkpoints"""
+    return f"{mode}-{make_batch_fingerprint(ids)[:16]}"
+
+@dataclass
+class DocumentPositions:
+    """Document numbering carried from one window of the chunk stream to the next"""
+    shift: int = 0
+    conversation_id: Optional[str] = None
+    position: int = 0
+
+    def next_position(self, conversation_id: str) -> int:
+        """Position of the next document within its conversation
+        
+        A conversation's chunks are contiguous in the stream, so only the
+        current conversation has to be tracked.
+        """
+        if conversation_id != self.conversation_id:
+            self.conversation_id = conversation_id
+            self.position = 0
+        position = self.position
+        self.position += 1
+        return position
+
+@dataclass
+class EmbeddingProgress:
+    """Tracks processed chunks, throughput and ETA for an embedding run
+    
+    Totals grow as windows of the chunk stream are prepared, so the ETA
+    covers the chunks seen so far.
+    """
+    total_chunks: int
+    total_batches: int
+    processed_chunks: int = 0
+    skipped_chunks: int = 0
+    completed_batches: int = 0
+    started_at: float = field(default_factory=time.time)
+
+    def update(self, processed: int, skipped: int = 0):
+        """Record a finished batch"""
+        self.processed_chunks += processed
+        self.skipped_chunks += skipped
+        self.completed_batches += 1
+
+    @property
+    def chunks_per_second(self) -> float:
+        elapsed = time.time() - self.started_at
+        return self.processed_chunks / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta_seconds(self) -> float:
+        remaining = self.total_chunks - self.processed_chunks - self.skipped_chunks
+        rate = self.chunks_per_second
+        return remaining / rate if rate > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total_chunks": self.total_chunks,
+            "total_batches": self.total_batches,
+            "processed_chunks": self.processed_chunks,
+            "skipped_chunks": self.skipped_chunks,
+            "completed_batches": self.completed_batches,
+            "chunks_per_second": round(self.chunks_per_second, 2),
+            "eta_seconds": round(self.eta_seconds, 1)
+        }
+
+@dataclass
+class StageStats:
+    """Throughput of one pipeline stage, measured over the time it was busy"""
+    name: str
+    items: int = 0
+    batches: int = 0
+    busy_seconds: float = 0.0
+
+    def record(self, items: int, seconds: float):
+        self.items += items
+        self.batches += 1
+        self.busy_seconds += seconds
+
+    @property
+    def items_per_second(self) -> float:
+        return self.items / self.busy_seconds if self.busy_seconds > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "items": self.items,
+            "batches": self.batches,
+            "busy_seconds": round(self.busy_seconds, 2),
+            "items_per_second": round(self.items_per_second, 2)
+        }
 
 
 T = TypeVar('T')
 class EmailEmbedder:
-    def __init__(self, index_name: str = ELASTIC_DEFAULT_INDEX, dataset: str = "email"):
+    def __init__(
+        self,
+        index_name: str = ELASTIC_DEFAULT_INDEX,
+        dataset: str = "email",
+        max_concurrent_embeddings: int = 4,
+        queue_size: int = 8,
+        max_batch_tokens: int = EMBEDDING_BATCH_MAX_TOKENS,
+        window_size: int = EMBEDDING_WINDOW_CHUNKS
+    ):
         """Initialize the embedder with Elasticsearch
         
         Args:
             index_name: Name of the Elasticsearch index to use
             dataset: Name of the dataset (strategy) to use
+            max_concurrent_embeddings: Number of embedding requests allowed in flight at once
+            queue_size: Maximum number of embedded batches waiting to be indexed
+            max_batch_tokens: Maximum total tokens sent in one embedding request
+            window_size: Number of chunks read from the chunk stream and batched at a time
         """
         self.index_name = index_name
         self.dataset = dataset
         self.store = EmailStore(index_name=index_name)
+        self.max_concurrent_embeddings = max(1, max_concurrent_embeddings)
+        self.queue_size = max(1, queue_size)
+        self.max_batch_tokens = max_batch_tokens
+        self.window_size = max(1, window_size)
 
     def _get_embedding_status(self) -> str:
         """Get the current embedding status"""
@@ -30,39 +166,213 @@ class EmailEmbedder:
         """Clear the index and reset status"""
         self.store.clear_index()
     
-    def _process_chunks(self, chunks: List[Chunk], batch_size: int):
-        """Process chunks in batches"""
-        # Prepare data for embedding
+    def _prepare_documents(self, chunks: List[Chunk], batcher: TokenBatcher, positions: DocumentPositions):
+        """Collect texts, metadata, deterministic IDs and token counts for non-empty chunks
+        
+        Chunks longer than the model's input limit are split into several documents.
+        Split pieces take consecutive chunk indices and later chunks are shifted up,
+        so every document keeps a unique chunk_index in reading order. The shift and
+        the position within the current conversation carry over through positions.
+        """
+        chunks = [chunk for chunk in chunks if chunk.content.strip()]  # Skip empty chunks
+        split = zip(chunks, batcher.split_texts([chunk.content for chunk in chunks]))
         documents = []
         metadatas = []
-        for chunk in chunks:
-            if not chunk.content.strip():  # Skip empty chunks
-                continue
-            documents.append(chunk.content)
-            metadatas.append(chunk.metadata.to_dict())
-
-        if not documents:
+        ids = []
+        token_counts = []
+        for chunk, pieces in sorted(split, key=lambda item: item[0].metadata.chunk_index):
+            conversation_id = chunk.metadata.conversation_id
+            metadata = chunk.metadata.to_dict()
+            for split_index, (text, tokens) in enumerate(pieces):
+                position = positions.next_position(conversation_id)
+                
+                piece_metadata = metadata
+                if len(pieces) > 1 or positions.shift:
+                    piece_metadata = {**metadata, "chunk_index": metadata["chunk_index"] + positions.shift + split_index}
+                if len(pieces) > 1:
+                    piece_metadata.update(split_index=split_index, split_count=len(pieces))
+                
+                documents.append(text)
+                metadatas.append(piece_metadata)
+                ids.append(make_chunk_id(conversation_id, text, position))
+                token_counts.append(tokens)
+            positions.shift += len(pieces) - 1
+        return documents, metadatas, ids, token_counts
+    
+    def _process_chunks(self, chunks: Iterable[Chunk], batch_size: int, mode: str = "full"):
+        """Process a chunk stream in windows, skipping batches committed by a previous run
+        
+        Only one window of documents is prepared ahead of the embedding requests,
+        so memory does not grow with the corpus. Batches are packed up to
+        max_batch_tokens tokens and batch_size chunks.
+        """
+        batcher = TokenBatcher(max_batch_tokens=self.max_batch_tokens, max_batch_items=batch_size)
+        windows = self._prepare_windows(chunks, batcher)
+        
+        total_documents = asyncio.run(self._run_pipeline(windows, batcher.stats, mode))
+        if not total_documents:
             print("Error: No valid documents to embed")
             return
-
-        print(f'Embedding {len(documents)} chunks')
+        batcher.stats.print_stats()
+    
+    def _prepare_windows(self, chunks: Iterable[Chunk], batcher: TokenBatcher) -> Iterator[Tuple]:
+        """Yield (documents, metadatas, ids, batches) for each window of the chunk stream"""
+        positions = DocumentPositions()
+        for window in batched(chunks, self.window_size):
+            documents, metadatas, ids, token_counts = self._prepare_documents(window, batcher, positions)
+            if documents:
+                yield documents, metadatas, ids, batcher.build_batches(token_counts)
+    
+    async def _run_pipeline(self, windows: Iterator[Tuple], token_stats: TokenStats, mode: str) -> int:
+        """Embed and index batches as a producer/consumer pipeline
+        
+        Windows are prepared off the event loop, so chunking and tokenizing the
+        next window overlaps embedding of the current one. Up to
+        max_concurrent_embeddings batches are embedded at once. Embedded batches
+        go through a bounded queue to a single indexing worker, which writes them
+        with parallel bulk and commits the batch checkpoint.
+        
+        The run is identified by its mode and the IDs of its first window; batch
+        fingerprints guard against reusing checkpoints of a different input.
+        
+        Returns:
+            Number of documents in the stream
+        """
+        progress = EmbeddingProgress(total_chunks=0, total_batches=0)
+        stages = {name: StageStats(name) for name in ("prepare", "embed", "index")}
+        
+        print(f'Embedding chunks in windows of {self.window_size} '
+              f'({self.max_concurrent_embeddings} concurrent embedding requests)')
+        
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        # A slot is held from the start of embedding until the batch is queued
+        slots = asyncio.Semaphore(self.max_concurrent_embeddings)
+        embed_tasks: List[asyncio.Task] = []
+        progress_bar = tqdm(total=0)
         
-        # Process in batches
-        for i in tqdm(range(0, len(documents), batch_size)):
-            batch_end = min(i + batch_size, len(documents))
-            batch_documents = documents[i:batch_end]
-            batch_metadatas = metadatas[i:batch_end]
+        async def embed_batch(
+            run_id: str,
+            batch_number: int,
+            fingerprint: str,
+            num_documents: int,
+            texts: List[str],
+            batch_metadatas: List[Dict[str, Any]],
+            batch_ids: List[str]
+        ):
+            try:
+                vectors = []
+                if texts:
+                    start = time.perf_counter()
+                    vectors = await self.store.embeddings.aembed_documents(texts)
+                    stages["embed"].record(len(texts), time.perf_counter() - start)
+                await queue.put((run_id, batch_number, fingerprint, num_documents, texts, vectors, batch_metadatas, batch_ids))
+            finally:
+                slots.release()
+        
+        async def produce():
+            run_id = None
+            batch_offset = 0
+            while True:
+                window = await asyncio.to_thread(next, windows, None)
+                if window is None:
+                    break
+                documents, metadatas, ids, batches = window
+                if run_id is None:
+                    run_id = make_run_id(mode, ids)
+                checkpoints = await asyncio.to_thread(
+                    self.store.get_batch_checkpoints, len(batches), run_id, batch_offset
+                )
+                
+                progress.total_chunks += len(documents)
+                progress.total_batches += len(batches)
+                progress_bar.total += len(batches)
+                progress_bar.refresh()
+                
+                for batch_number, (i, batch_end) in enumerate(batches, start=batch_offset):
+                    batch_ids = ids[i:batch_end]
+                    fingerprint = make_batch_fingerprint(batch_ids)
+                    
+                    checkpoint = checkpoints.get(batch_number)
+                    if checkpoint and checkpoint.get('fingerprint') == fingerprint:
+                        progress.update(processed=0, skipped=len(batch_ids))
+                        progress_bar.update(1)
+                        continue
+                    
+                    await slots.acquire()
+                    start = time.perf_counter()
+                    # Only embed documents that did not reach the index before an interruption
+                    existing = await asyncio.to_thread(self.store.get_existing_ids, batch_ids)
+                    pending = [j for j in range(i, batch_end) if ids[j] not in existing]
+                    stages["prepare"].record(len(batch_ids), time.perf_counter() - start)
+                    
+                    embed_tasks.append(asyncio.create_task(embed_batch(
+                        run_id,
+                        batch_number,
+                        fingerprint,
+                        len(batch_ids),
+                        [documents[j] for j in pending],
+                        [metadatas[j] for j in pending],
+                        [ids[j] for j in pending]
+                    )))
+                batch_offset += len(batches)
             
-            # Add to Elasticsearch - it will handle embeddings internally
-            self.store.add_documents(
-                texts=batch_documents,
-                metadatas=batch_metadatas
-            )
+            await asyncio.gather(*embed_tasks)
+            await queue.put(None)
+        
+        async def index_worker():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                run_id, batch_number, fingerprint, num_documents, texts, vectors, batch_metadatas, batch_ids = item
+                
+                if texts:
+                    start = time.perf_counter()
+                    # Deterministic IDs make this an upsert; partial failures are retried
+                    await asyncio.to_thread(self.store.index_embedded, texts, vectors, batch_metadatas, batch_ids)
+                    stages["index"].record(len(texts), time.perf_counter() - start)
+                
+                await asyncio.to_thread(self.store.set_batch_checkpoint, run_id, batch_number, fingerprint, num_documents)
+                progress.update(processed=len(texts), skipped=num_documents - len(texts))
+                progress_record = progress.to_dict()
+                progress_record["stages"] = {name: stage.to_dict() for name, stage in stages.items()}
+                progress_record["tokens"] = token_stats.to_dict()
+                await asyncio.to_thread(self.store.set_embedding_progress, progress_record)
+                progress_bar.update(1)
+        
+        producer_task = asyncio.create_task(produce())
+        worker_task = asyncio.create_task(index_worker())
+        try:
+            # Stop as soon as either side fails so the other cannot block forever
+            done, _ = await asyncio.wait({producer_task, worker_task}, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+            await worker_task
+        finally:
+            for task in [producer_task, worker_task, *embed_tasks]:
+                if not task.done():
+                    task.cancel()
+            progress_bar.close()
+        
+        stats = progress.to_dict()
+        print(f"Indexed {stats['processed_chunks']} chunks, skipped {stats['skipped_chunks']} already indexed "
+              f"({stats['chunks_per_second']} chunks/sec)")
+        for stage in stages.values():
+            print(f"  {stage.name}: {stage.items} items in {stage.busy_seconds:.1f}s busy "
+                  f"({stage.items_per_second:.1f} items/sec)")
+        return progress.total_chunks
     
-    def embed_chunks(self, chunks: List[Chunk], batch_size: int = 500):
-        """Embed chunks in batches with status tracking"""
+    def embed_chunks(self, chunks: Iterable[Chunk], batch_size: int = EMBEDDING_BATCH_MAX_ITEMS, resume: bool = True):
+        """Embed chunks in batches with status tracking
+        
+        Args:
+            chunks: Chunks to embed, as a list or a stream in chunk_index order
+            batch_size: Maximum number of chunks per batch (batches are also bounded by tokens)
+            resume: If True, continue an interrupted run from its last committed batch
+                instead of clearing the index
+        """
         print("=== Checking Embedding Status ===")
-        doc_count = self.store.client.count(index=self.index_name)['count']
+        doc_count = self.store.count_documents()
         status = self._get_embedding_status()
         print(f"Index: {self.index_name}")
         print(f"Status: {status}")
@@ -72,6 +382,9 @@ class EmailEmbedder:
             if status == "COMPLETE":
                 print("\nEmbeddings are complete, no need to reprocess")
                 return
+            elif resume:
+                print("\nFound documents but status is not complete")
+                print("Resuming from the last committed batch...")
             else:
                 print("\nFound documents but status is not complete")
                 print("Clearing index to start fresh...")
@@ -81,11 +394,39 @@ class EmailEmbedder:
             print("Initializing fresh embedding process...")
             self._clear_index()
 
+        self._run_with_status(chunks, batch_size, force_merge=True, mode="full")
+
+    def embed_delta(self, chunks: Iterable[Chunk], batch_size: int = EMBEDDING_BATCH_MAX_ITEMS):
+        """Index chunks of new or changed conversations into an existing index
+        
+        Unlike embed_chunks, this never clears the index and runs even when the
+        status is COMPLETE. Callers are responsible for deleting stale chunks first.
+        """
+        print("=== Indexing Delta ===")
+        print(f"Index: {self.index_name}")
+        print(f"Documents before delta: {self.store.count_documents()}")
+        
+        chunks = iter(chunks)
+        first = next(chunks, None)
+        if first is None:
+            print("No new chunks to index")
+            return
+        
+        self._run_with_status(itertools.chain([first], chunks), batch_size, mode="delta")
+
+    def _run_with_status(self, chunks: Iterable[Chunk], batch_size: int, force_merge: bool = False, mode: str = "full"):
+        """Process chunks while keeping the embedding status up to date
+        
+        Batch checkpoints are keyed by mode and input, and deleted once the run completes.
+        """
         # Start embedding process
         self._set_embedding_status("IN_PROGRESS")
         try:
-            self._process_chunks(chunks, batch_size)
+            # Disable refreshes and replicas while loading; settings are restored on exit
+            with self.store.bulk_load(force_merge=force_merge):
+                self._process_chunks(chunks, batch_size, mode)
             self._set_embedding_status("COMPLETE")
+            self.store.clear_checkpoints(batches_only=True)
             print("Embedding process completed successfully")
         except Exception as e:
             self._set_embedding_status("FAILED")
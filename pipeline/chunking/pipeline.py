@@ -1,10 +1,14 @@
-import json
+import hashlib
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import Iterable, Iterator, List, Dict, Any, Set, Tuple, Optional
 from tqdm import tqdm
-from ..common.settings import get_project_root
+from ..common.settings import get_project_root, EMBEDDINGS
+from ..common.embedding_cache import CachedEmbeddings
+from ..common.records import read_records, resolve_records_path
+from ..preprocess.near_duplicates import CANONICAL_FIELD, REFERENCES_FIELD, near_duplicate_references
 
-from .conversation_processor import ConversationProcessor
+from .base import Chunk
+from .conversation_processor import ConversationProcessor, compute_conversation_hash
 from .document_chunker import DocumentChunker
 from .embed import EmailEmbedder
 
@@ -19,69 +23,207 @@ class EmailProcessingPipeline:
         self.conversation_processor = ConversationProcessor(dataset=dataset)
         self.document_chunker = DocumentChunker(dataset)
         self.embedder = EmailEmbedder()
+        self.skipped_duplicates = 0
+        self.partial_duplicates = 0
+        self.generated_chunks = 0
 
-    def process_emails(self, input_file: str = None):
-        """Process emails from JSON, chunk them, and create embeddings"""
+    def process_emails(self, input_file: str = None, incremental: bool = False, delete_removed: bool = True):
+        """Process emails from a record file, chunk them, and create embeddings
+        
+        Args:
+            input_file: Path to the input .json, .jsonl or .jsonl.zst file
+            incremental: If True, only index new or changed conversations into the existing index
+            delete_removed: In incremental mode, delete conversations that are no longer in the input
+        """
         if input_file is None:
-            input_file = str(Path(__file__).parent.parent.parent / 'data' / 'processed_emails' / 'included_emails.json')
+            input_file = str(resolve_records_path(Path(__file__).parent.parent.parent / 'data' / 'processed_emails', 'included_emails'))
         
         print("=== Starting Email Processing Pipeline ===")
         
         # First check if we have complete embeddings
-        doc_count = self.embedder.store.client.count(index=self.embedder.store.index_name)['count']
+        doc_count = self.embedder.store.count_documents()
         status = self.embedder._get_embedding_status()
         print(f"Current index status: {status} with {doc_count} documents")
         
+        if incremental and doc_count > 0:
+            self._process_delta(input_file, delete_removed)
+            return
+        
         if status == "COMPLETE" and doc_count > 0:
             print("Found complete embeddings, no need to reprocess")
             return
         
         print(f"Processing emails from: {input_file}")
-        print("Loading conversations...")
-        conversations = self._load_conversations(input_file)
-        print(f"Loaded {len(conversations)} conversations\n")
-        
-        print("Processing conversations into chunks...")
-        all_chunks = []
-        for conv in tqdm(conversations, ascii=True):
-            # Process the conversation and get chunks
-            chunks = list(self.conversation_processor.process_conversation(conv))
-            all_chunks.extend(chunks)
-        
-        print(f"\nGenerated {len(all_chunks)} chunks")
+        print("Streaming conversations into chunks and embeddings...")
         print("\n=== Starting Embedding Process ===")
         
-        # Create embeddings
-        self.embedder.embed_chunks(all_chunks)
+        # Create embeddings; chunks are produced as the embedder consumes them
+        self.embedder.embed_chunks(self._chunk_conversations(self._canonical_conversations(input_file)))
+        
+        print(f"\nGenerated {self.generated_chunks} chunks")
+        self._print_duplicate_stats()
         
         #print("\n=== Cleaning Up Small Chunks ===")
         # Remove chunks that are too small
         #self.embedder.remove_small_chunks()
         
+        if isinstance(EMBEDDINGS, CachedEmbeddings):
+            EMBEDDINGS.print_stats()
+        
         print("\n=== Pipeline Complete ===")
 
-    def _load_conversations(self, input_file: str) -> List[Dict[str, Any]]:
-        """Load conversations from JSON file"""
-        with open(input_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+    def _process_delta(self, input_file: str, delete_removed: bool = True):
+        """Index only new or changed conversations and drop removed ones"""
+        store = self.embedder.store
+        
+        print(f"Processing email delta from: {input_file}")
+        # Diff input against what is already indexed
+        indexed_hashes = store.get_conversation_hashes()
+        input_ids = set()
+        changed_ids = []
+        to_index = []
+        for conv in self._canonical_conversations(input_file):
+            conv_id = conv['ConversationID']
+            input_ids.add(conv_id)
+            if conv_id not in indexed_hashes:
+                to_index.append(conv)
+            elif indexed_hashes[conv_id] != compute_conversation_hash(conv):
+                changed_ids.append(conv_id)
+                to_index.append(conv)
+        
+        removed_ids = [conv_id for conv_id in indexed_hashes if conv_id not in input_ids] if delete_removed else []
+        
+        print(f"New conversations: {len(to_index) - len(changed_ids)}")
+        print(f"Changed conversations: {len(changed_ids)}")
+        print(f"Removed conversations: {len(removed_ids)}")
+        print(f"Unchanged conversations: {len(input_ids) - len(to_index)}")
+        self._print_duplicate_stats()
+        
+        # Drop stale chunks before re-indexing changed conversations
+        stale_ids = changed_ids + removed_ids
+        if stale_ids:
+            deleted = store.delete_conversations(stale_ids)
+            print(f"Deleted {deleted} stale chunks")
+        
+        if to_index:
+            # Continue global chunk numbering after the chunks already indexed
+            next_index = store.get_max_chunk_index() + 1
+            self.conversation_processor.document_chunker.reset_chunk_index(next_index)
+            
+            print("Processing new conversations into chunks...")
+            print("\n=== Starting Embedding Process ===")
+            self.embedder.embed_delta(self._chunk_conversations(to_index))
+            print(f"\nGenerated {self.generated_chunks} chunks starting at chunk index {next_index}")
+        
+        if isinstance(EMBEDDINGS, CachedEmbeddings):
+            EMBEDDINGS.print_stats()
+        
+        print("\n=== Delta Pipeline Complete ===")
+
+    def _chunk_conversations(self, conversations: Iterable[Dict[str, Any]]) -> Iterator[Chunk]:
+        """Stream the chunks of every conversation, counting them in generated_chunks"""
+        self.generated_chunks = 0
+        for conv in tqdm(conversations, ascii=True):
+            # Process the conversation and pass its chunks on
+            for chunk in self.conversation_processor.process_conversation(conv):
+                self.generated_chunks += 1
+                yield chunk
+        thread_deduplicator = self.conversation_processor.thread_deduplicator
+        if thread_deduplicator is not None and thread_deduplicator.stats.messages:
+            print(thread_deduplicator.stats.summary())
+
+    def _canonical_conversations(self, input_file: str) -> Iterator[Dict[str, Any]]:
+        """Stream conversations, leaving out near-duplicates of an earlier conversation
+        
+        Each canonical conversation lists its near-duplicates under REFERENCES_FIELD,
+        so its chunks point at them and its hash changes when its cluster grows.
+        Near-duplicates whose canonical conversation is not in the file are kept.
+        
+        Preprocessing clusters on attachment previews, so attachments are compared
+        again on their full content here: a near-duplicate with attachments the
+        canonical conversation does not have is kept with only those attachments.
+        """
+        references = near_duplicate_references(self._load_conversations(input_file))
+        canonical_attachments: Dict[str, Set[str]] = {}
+        self.skipped_duplicates = 0
+        self.partial_duplicates = 0
+        for conv in self._load_conversations(input_file):
+            canonical = conv.get(CANONICAL_FIELD)
+            if canonical in canonical_attachments:
+                conv = self._without_attachments(conv, canonical_attachments[canonical])
+                if conv is None:
+                    self.skipped_duplicates += 1
+                    continue
+                self.partial_duplicates += 1
+            conv_id = conv['ConversationID']
+            if conv_id in references:
+                conv[REFERENCES_FIELD] = references[conv_id]
+                canonical_attachments[conv_id] = {
+                    content_hash
+                    for message in conv['Messages']
+                    for _, content_hash in self._extracted_attachments(message)
+                }
+            yield conv
+
+    def _extracted_attachments(self, message: Dict[str, Any]) -> Iterator[Tuple[Dict[str, Any], str]]:
+        """(attachment, SHA-256 of its text) for each successfully extracted attachment"""
+        for attachment in message.get('Attachments') or []:
+            if attachment.get('content') and 'error' not in attachment:
+                yield attachment, hashlib.sha256(attachment['content'].encode('utf-8')).hexdigest()
+
+    def _without_attachments(self, conversation: Dict[str, Any], hashes: Set[str]) -> Optional[Dict[str, Any]]:
+        """Copy of a near-duplicate keeping only attachments whose content is not in hashes
+        
+        The message bodies are dropped, since they repeat the canonical conversation.
+        Returns None when no attachment differs.
+        """
+        messages = []
+        for message in conversation['Messages']:
+            attachments = [
+                attachment for attachment, content_hash in self._extracted_attachments(message)
+                if content_hash not in hashes
+            ]
+            if attachments:
+                messages.append({**message, 'Body': '', 'Attachments': attachments})
+        if not messages:
+            return None
+        return {**conversation, 'Messages': messages}
+
+    def _print_duplicate_stats(self):
+        if self.skipped_duplicates:
+            print(f"Near-duplicate conversations embedded through their canonical conversation: {self.skipped_duplicates}")
+        if self.partial_duplicates:
+            print(f"Near-duplicate conversations embedded only for their differing attachments: {self.partial_duplicates}")
+
+    def _load_conversations(self, input_file: str) -> Iterator[Dict[str, Any]]:
+        """Stream conversations from a record file"""
+        for item in read_records(input_file):
             # Extract conversation data from the nested structure
-            return [item['conversation'] for item in data]
+            yield item['conversation']
 
 
-def run_embed(input_file: str = "included_emails.json", dataset: str = "email"):
+def run_embed(
+    input_file: str = "included_emails",
+    dataset: str = "email",
+    incremental: bool = False,
+    delete_removed: bool = True
+):
     """
     Process emails into chunks and create embeddings.
     
     Args:
-        input_file: Name of the input JSON file in the processed_emails directory (default: included_emails.json)
+        input_file: Name or stem of the input record file in the processed_emails directory (default: included_emails)
         dataset: Name of the dataset to process (default: "email")
+        incremental: Only index new or changed conversations into the existing index (default: False)
+        delete_removed: In incremental mode, delete conversations missing from the input (default: True)
     """
     data_dir = get_project_root() / "data" / "processed_emails"
-    input_path = data_dir / input_file
-    
-    if not input_path.exists():
-        raise FileNotFoundError(f"Input file not found: {input_path}")
+    input_path = resolve_records_path(data_dir, input_file)
         
     print(f"Processing and embedding emails from {input_file}...")
     pipeline = EmailProcessingPipeline(dataset=dataset)
-    pipeline.process_emails(input_file=str(input_path))
+    pipeline.process_emails(
+        input_file=str(input_path),
+        incremental=incremental,
+        delete_removed=delete_removed
+    )
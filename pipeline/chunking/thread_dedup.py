@@ -0,0 +1,167 @@
+"""Conversation-level removal of text repeated from earlier messages in a thread."""
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Set, Tuple
+
+from ..common.settings import THREAD_DEDUP_SHINGLE_WORDS, THREAD_DEDUP_MAX_GAP_WORDS
+
+WORD_PATTERN = re.compile(r'\w+')
+
+# Words per shingle when checking whether short text between or after repeated runs is quoted too
+GAP_SHINGLE_WORDS = 3
+
+# Lines that open a quoted or forwarded copy of another message
+REPLY_HEADER_PATTERN = re.compile(
+    r'-{2,}\s*(?:Original Message|Forwarded message)|Begin forwarded message:|^\s*On\b[^\n]*wrote:|\bFrom:',
+    re.IGNORECASE | re.MULTILINE
+)
+
+@dataclass
+class ThreadDedupStats:
+    """How much of the message bodies was kept as novel text"""
+    messages: int = 0
+    deduplicated_messages: int = 0
+    skipped_messages: int = 0
+    chars_before: int = 0
+    chars_after: int = 0
+
+    def summary(self) -> str:
+        removed_pct = 100 * (1 - self.chars_after / self.chars_before) if self.chars_before else 0.0
+        return (
+            f"Thread deduplication: {self.deduplicated_messages}/{self.messages} message bodies trimmed, "
+            f"{self.skipped_messages} fully repeated, {removed_pct:.1f}% of body text removed"
+        )
+
+class ThreadDeduplicator:
+    """Keeps only the part of each message that earlier messages of the conversation do not contain
+
+    Text counts as repeated when it shares runs of shingle_words consecutive words
+    with an earlier message, so quoting ('>' prefixes), re-wrapping and punctuation
+    changes do not hide it. Reply headers (From:/Sent:, "On ... wrote:", original and
+    forwarded message markers) directly before repeated text are removed with it, as
+    are short gaps between or after repeated runs that are quoted themselves (a reply
+    header, '>' markers, or words all found in earlier messages); a short answer
+    posted below or between quoted text is kept.
+
+    Example:
+        >>> dedup = ThreadDeduplicator()
+        >>> bodies = dedup.novel_bodies(conversation['Messages'])
+        >>> print(dedup.stats.summary())
+    """
+
+    def __init__(self, shingle_words: int = THREAD_DEDUP_SHINGLE_WORDS, max_gap_words: int = THREAD_DEDUP_MAX_GAP_WORDS):
+        """Initialize the deduplicator
+
+        Args:
+            shingle_words: Number of consecutive words that must match an earlier message
+            max_gap_words: Novel text between two repeated runs shorter than this is dropped as well
+        """
+        self.shingle_words = max(2, shingle_words)
+        self.max_gap_words = max_gap_words
+        self.stats = ThreadDedupStats()
+
+    def _shingles(self, words: List[str]) -> Set[Tuple[str, ...]]:
+        """Shingles of shingle_words words, plus the shorter ones used to check gaps"""
+        shingles = set()
+        for k in (self.shingle_words, GAP_SHINGLE_WORDS):
+            shingles.update(tuple(words[i:i + k]) for i in range(len(words) - k + 1))
+        return shingles
+
+    def _is_quoted(self, text: str, words: List[str], seen: Set[Tuple[str, ...]]) -> bool:
+        """True if the text between or after repeated runs is part of the quote"""
+        if REPLY_HEADER_PATTERN.search(text):
+            return True
+        lines = [line.strip() for line in text.splitlines() if line.strip()]
+        if lines and all(line.startswith('>') for line in lines):
+            return True
+        k = GAP_SHINGLE_WORDS
+        if len(words) < k:
+            # Too short to check on its own; quoted only if it has no words at all
+            return not words
+        covered = [False] * len(words)
+        for i in range(len(words) - k + 1):
+            if tuple(words[i:i + k]) in seen:
+                covered[i:i + k] = [True] * k
+        return all(covered)
+
+    def _repeated_runs(self, words: List[str], seen: Set[Tuple[str, ...]]) -> List[Tuple[int, int]]:
+        """Word index ranges [start, end) covered by shingles seen in earlier messages"""
+        k = self.shingle_words
+        runs: List[Tuple[int, int]] = []
+        for i in range(len(words) - k + 1):
+            if tuple(words[i:i + k]) in seen:
+                if runs and i <= runs[-1][1]:
+                    runs[-1] = (runs[-1][0], i + k)
+                else:
+                    runs.append((i, i + k))
+        return runs
+
+    def novel_text(self, body: str, seen: Set[Tuple[str, ...]]) -> str:
+        """Text of body not repeated from the shingles of earlier messages"""
+        matches = list(WORD_PATTERN.finditer(body))
+        words = [m.group().lower() for m in matches]
+        runs = self._repeated_runs(words, seen)
+        if not runs:
+            return body
+
+        # Character spans to drop, widened over short gaps and preceding reply headers
+        removed: List[List[int]] = []
+        previous_end_word = 0
+        for start_word, end_word in runs:
+            start = matches[start_word].start()
+            end = matches[end_word - 1].end()
+            gap_words = start_word - previous_end_word
+            if (removed and gap_words < self.max_gap_words
+                    and self._is_quoted(body[removed[-1][1]:start], words[previous_end_word:start_word], seen)):
+                removed[-1][1] = end
+            else:
+                # A reply header just before the run, or inside its first shingle (whose
+                # leading words then only matched by chance), is where the quote starts
+                gap_start = removed[-1][1] if removed else 0
+                first_shingle_end = matches[min(start_word + self.shingle_words, end_word) - 1].end()
+                headers = list(REPLY_HEADER_PATTERN.finditer(body, gap_start, first_shingle_end))
+                if headers:
+                    start = headers[-1].start()
+                removed.append([start, end])
+            previous_end_word = end_word
+
+        # Short quoted trailing text after the last repeated run is the rest of the quoted message
+        trailing_words = len(words) - previous_end_word
+        if trailing_words < self.max_gap_words and self._is_quoted(body[removed[-1][1]:], words[previous_end_word:], seen):
+            removed[-1][1] = len(body)
+
+        kept = []
+        position = 0
+        for start, end in removed:
+            kept.append(body[position:start])
+            kept.append('\n')
+            position = end
+        kept.append(body[position:])
+        text = re.sub(r'\n\s*\n\s*\n', '\n\n', ''.join(kept))
+        return text.strip()
+
+    def novel_bodies(self, messages: List[Dict]) -> List[str]:
+        """Novel body text of each message, in the order given
+
+        Messages are compared in ReceivedTime order, so only text already present
+        in an earlier message is removed. Bodies without repeated text are returned
+        unchanged; an empty string means nothing was new.
+        """
+        order = sorted(range(len(messages)), key=lambda i: messages[i].get('ReceivedTime') or '')
+        seen: Set[Tuple[str, ...]] = set()
+        bodies = [''] * len(messages)
+        for i in order:
+            body = messages[i].get('Body') or ''
+            novel = self.novel_text(body, seen) if seen else body
+            bodies[i] = novel
+
+            self.stats.messages += 1
+            self.stats.chars_before += len(body)
+            self.stats.chars_after += len(novel)
+            if novel != body:
+                self.stats.deduplicated_messages += 1
+            if body.strip() and not novel:
+                self.stats.skipped_messages += 1
+
+            seen |= self._shingles([w.lower() for w in WORD_PATTERN.findall(body)])
+        return bodies
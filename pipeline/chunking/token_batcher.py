@@ -0,0 +1,157 @@
+"""Token-budgeted batch assembly for embedding requests."""
+from dataclasses import dataclass
+from typing import List, Tuple, Dict, Any
+import tiktoken
+
+from ..common.settings import (
+    EMBEDDING_MODEL,
+    EMBEDDING_MAX_INPUT_TOKENS,
+    EMBEDDING_BATCH_MAX_TOKENS,
+    EMBEDDING_BATCH_MAX_ITEMS
+)
+
+@dataclass
+class TokenStats:
+    """Token statistics for one embedding run"""
+    input_chunks: int = 0
+    documents: int = 0
+    split_chunks: int = 0
+    total_tokens: int = 0
+    max_document_tokens: int = 0
+    batches: int = 0
+    max_batch_tokens: int = 0
+    token_budget: int = 0
+
+    @property
+    def avg_batch_tokens(self) -> float:
+        return self.total_tokens / self.batches if self.batches else 0.0
+
+    @property
+    def avg_batch_items(self) -> float:
+        return self.documents / self.batches if self.batches else 0.0
+
+    @property
+    def budget_utilization(self) -> float:
+        return self.avg_batch_tokens / self.token_budget if self.token_budget else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "input_chunks": self.input_chunks,
+            "documents": self.documents,
+            "split_chunks": self.split_chunks,
+            "total_tokens": self.total_tokens,
+            "max_document_tokens": self.max_document_tokens,
+            "batches": self.batches,
+            "avg_batch_tokens": round(self.avg_batch_tokens, 1),
+            "avg_batch_items": round(self.avg_batch_items, 1),
+            "max_batch_tokens": self.max_batch_tokens,
+            "budget_utilization": round(self.budget_utilization, 3)
+        }
+
+    def print_stats(self):
+        """Print a short token summary"""
+        print(f"Tokens: {self.total_tokens} across {self.documents} documents "
+              f"({self.split_chunks} oversize chunks split, largest document {self.max_document_tokens} tokens)")
+        print(f"Batches: {self.batches}, avg {self.avg_batch_tokens:.0f} tokens / {self.avg_batch_items:.0f} items, "
+              f"largest {self.max_batch_tokens} tokens ({self.budget_utilization:.1%} of budget on average)")
+
+class TokenBatcher:
+    """Packs texts into embedding requests bounded by a token budget and an item count"""
+
+    def __init__(
+        self,
+        model: str = EMBEDDING_MODEL,
+        max_batch_tokens: int = EMBEDDING_BATCH_MAX_TOKENS,
+        max_batch_items: int = EMBEDDING_BATCH_MAX_ITEMS,
+        max_input_tokens: int = EMBEDDING_MAX_INPUT_TOKENS
+    ):
+        """Initialize the batcher
+
+        Args:
+            model: Embedding model whose tokenizer is used for counting
+            max_batch_tokens: Maximum total tokens per embedding request
+            max_batch_items: Maximum number of texts per embedding request
+            max_input_tokens: Maximum tokens of a single text; longer texts are split
+        """
+        try:
+            self.encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            self.encoding = tiktoken.get_encoding("cl100k_base")
+        self.max_input_tokens = min(max_input_tokens, max_batch_tokens)
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_items = max(1, max_batch_items)
+        self.stats = TokenStats(token_budget=max_batch_tokens)
+
+    def split_texts(self, texts: List[str]) -> List[List[Tuple[str, int]]]:
+        """Tokenize texts, splitting any that exceed the per-input limit
+
+        Returns:
+            For each input text, a list of (piece, token_count) pairs
+        """
+        self.stats.input_chunks += len(texts)
+        results = []
+        for text, tokens in zip(texts, self.encoding.encode_ordinary_batch(texts)):
+            if len(tokens) <= self.max_input_tokens:
+                pieces = [(text, len(tokens))]
+            else:
+                self.stats.split_chunks += 1
+                pieces = self._split_tokens(tokens)
+
+            for _, count in pieces:
+                self.stats.documents += 1
+                self.stats.total_tokens += count
+                self.stats.max_document_tokens = max(self.stats.max_document_tokens, count)
+            results.append(pieces)
+        return results
+
+    def _split_tokens(self, tokens: List[int]) -> List[Tuple[str, int]]:
+        """Cut an oversize text into pieces of at most max_input_tokens tokens
+
+        Cuts are made at character offsets, never inside a multibyte character, and
+        each piece is re-encoded so its token count is exact.
+        """
+        text, offsets = self.encoding.decode_with_offsets(tokens)
+        offsets.append(len(text))
+        pieces = []
+        start = 0
+        while start < len(tokens):
+            end = min(start + self.max_input_tokens, len(tokens))
+            while True:
+                piece = text[offsets[start]:offsets[end]]
+                count = len(self.encoding.encode_ordinary(piece))
+                if count <= self.max_input_tokens or end - start == 1:
+                    break
+                end = max(start + 1, end - (count - self.max_input_tokens))
+            if piece:
+                pieces.append((piece, count))
+            start = end
+        return pieces
+
+    def build_batches(self, token_counts: List[int]) -> List[Tuple[int, int]]:
+        """Group consecutive documents into batches that fit the budget
+
+        Args:
+            token_counts: Token count of each document, in order
+
+        Returns:
+            List of (start, end) index ranges, one per batch
+        """
+        batches = []
+        start = 0
+        batch_tokens = 0
+        for i, count in enumerate(token_counts):
+            items = i - start
+            if items and (batch_tokens + count > self.max_batch_tokens or items >= self.max_batch_items):
+                batches.append((start, i))
+                self._record_batch(batch_tokens)
+                start, batch_tokens = i, 0
+            batch_tokens += count
+
+        if start < len(token_counts):
+            batches.append((start, len(token_counts)))
+            self._record_batch(batch_tokens)
+        return batches
+
+    def _record_batch(self, tokens: int):
+        self.stats.batches += 1
+        self.stats.max_batch_tokens = max(self.stats.max_batch_tokens, tokens)
@@ -1,15 +1,56 @@
+import time
+import random
+import asyncio
 from typing import Any, Dict, List, Optional
 from langchain_core.runnables import RunnableLambda
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 
-from .settings import LLM
+from .settings import LLM, LLM_MAX_CONCURRENCY, LLM_TIMEOUT_SECONDS, LLM_BACKOFF_BASE_SECONDS, LLM_BACKOFF_MAX_SECONDS
+from .llm_cache import LLMCache, make_cache_key, get_default_llm_cache
+
+def is_retryable_error(error: Exception) -> bool:
+    """True for rate limits (429), server errors (5xx), timeouts and connection failures"""
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    name = type(error).__name__
+    return 'Timeout' in name or 'Connection' in name
+
+def backoff_delay(attempt: int, base: float = LLM_BACKOFF_BASE_SECONDS, cap: float = LLM_BACKOFF_MAX_SECONDS) -> float:
+    """Exponential backoff with full jitter for the given (0-based) attempt"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
 
 class BaseAgent(RunnableLambda):
     """Base agent class that can be used with Langchain's Runnable interface."""
     
-    def __init__(self):
-        super().__init__(self._run)
+    # Bump in a subclass whenever its prompt template or examples change
+    prompt_version: str = "1"
+    
+    def __init__(
+        self,
+        cache: Optional[LLMCache] = None,
+        use_cache: bool = True,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        timeout: Optional[float] = LLM_TIMEOUT_SECONDS
+    ):
+        """Initialize the agent
+        
+        Args:
+            cache: Response cache to use (defaults to the cache configured in settings)
+            use_cache: Set to False to always call the LLM
+            max_concurrency: Maximum number of LLM requests this agent runs at once (async path)
+            timeout: Timeout in seconds for each async LLM attempt (None to wait indefinitely)
+        """
+        super().__init__(self._run, afunc=self._arun)
         self.llm = LLM
+        self.cache = (cache or get_default_llm_cache()) if use_cache else None
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self._semaphore = None  # (event loop, semaphore) of the loop last used
     
     def get_example_messages(self) -> List[Dict[str, str]]:
         """Return example messages for the agent. Override this in subclasses.
@@ -28,28 +69,113 @@ class BaseAgent(RunnableLambda):
         """Validate the LLM output. Override this in subclasses."""
         raise NotImplementedError
     
-    def _run(self, input_data: Any, max_retries: int = 3) -> Optional[Dict]:
-        """Run the agent on the input data."""
+    def _cache_key(self, messages: List[Dict[str, str]]) -> str:
+        """Cache key for a message list under the current model settings"""
+        model = getattr(self.llm, 'model_name', None) or getattr(self.llm, 'model', self.llm.__class__.__name__)
+        return make_cache_key(
+            model=model,
+            temperature=getattr(self.llm, 'temperature', None),
+            messages=messages,
+            prompt_version=f"{self.__class__.__name__}:{self.prompt_version}"
+        )
+    
+    def _build_messages(self, input_data: Any) -> List[Dict[str, str]]:
+        """Example messages followed by the prompt for this input"""
+        message_dicts = list(self.get_example_messages())
+        message_dicts.append({'role': 'user', 'content': self.get_prompt(input_data)})
+        return message_dicts
+    
+    def _to_langchain_messages(self, message_dicts: List[Dict[str, str]]) -> List[Any]:
         messages = []
-        for msg in self.get_example_messages():
+        for msg in message_dicts:
             if msg['role'] == 'system':
                 messages.append(SystemMessage(content=msg['content']))
             elif msg['role'] == 'user':
                 messages.append(HumanMessage(content=msg['content']))
             elif msg['role'] == 'assistant':
                 messages.append(AIMessage(content=msg['content']))
+        return messages
+    
+    def _lookup_cached(self, message_dicts: List[Dict[str, str]]):
+        """Return (cache_key, cached_output); both None when caching is off"""
+        if self.cache is None:
+            return None, None
+        cache_key = self._cache_key(message_dicts)
+        try:
+            return cache_key, self.cache.get(cache_key)
+        except Exception as e:
+            print(f"Warning: LLM cache lookup failed: {e}")
+            return cache_key, None
+    
+    def _run(self, input_data: Any, max_retries: int = 3) -> Optional[Dict]:
+        """Run the agent on the input data."""
+        message_dicts = self._build_messages(input_data)
+        cache_key, cached = self._lookup_cached(message_dicts)
+        if cached is not None:
+            return cached
         
-        messages.append(HumanMessage(content=self.get_prompt(input_data)))
-        
+        messages = self._to_langchain_messages(message_dicts)
         for attempt in range(max_retries):
             try:
                 response = self.llm.invoke(messages)
                 result = self.validate_output(response.content)
                 if result:
+                    # Only validated outputs are cached
+                    if cache_key is not None:
+                        self._store_cached(cache_key, result)
                     return result
             except Exception as e:
                 print(f"Error on attempt {attempt + 1}: {str(e)}")
                 if attempt == max_retries - 1:
                     raise
+                if is_retryable_error(e):
+                    time.sleep(backoff_delay(attempt))
         
         return None
+    
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """Semaphore bounding concurrent requests on the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore[0] is not loop:
+            self._semaphore = (loop, asyncio.Semaphore(self.max_concurrency))
+        return self._semaphore[1]
+    
+    async def _arun(self, input_data: Any, max_retries: int = 3) -> Optional[Dict]:
+        """Async version of _run with bounded concurrency, per-attempt timeouts and jittered backoff"""
+        message_dicts = self._build_messages(input_data)
+        # Cache I/O is blocking, so it runs in a thread to keep the other requests moving
+        cache_key, cached = await asyncio.to_thread(self._lookup_cached, message_dicts)
+        if cached is not None:
+            return cached
+        
+        messages = self._to_langchain_messages(message_dicts)
+        semaphore = self._get_semaphore()
+        for attempt in range(max_retries):
+            try:
+                async with semaphore:
+                    response = await asyncio.wait_for(self.llm.ainvoke(messages), timeout=self.timeout)
+                result = self.validate_output(response.content)
+                if result:
+                    # Only validated outputs are cached
+                    if cache_key is not None:
+                        await asyncio.to_thread(self._store_cached, cache_key, result)
+                    return result
+            except Exception as e:
+                message = "timed out" if isinstance(e, asyncio.TimeoutError) else str(e)
+                print(f"Error on attempt {attempt + 1}: {message}")
+                if attempt == max_retries - 1:
+                    raise
+                if is_retryable_error(e):
+                    # Back off outside the semaphore so other requests can proceed
+                    await asyncio.sleep(backoff_delay(attempt))
+        
+        return None
+    
+    def _store_cached(self, cache_key: str, result: Dict):
+        try:
+            self.cache.set(cache_key, result, model=str(getattr(self.llm, 'model_name', '')))
+        except (TypeError, ValueError):
+            # Outputs that are not JSON-serializable are simply not cached
+            pass
+        except Exception as e:
+            print(f"Warning: LLM cache write failed: {e}")
@@ -0,0 +1,235 @@
+"""Persistent, content-addressed cache for embedding vectors."""
+import re
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from array import array
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+class EmbeddingCache:
+    """SQLite-backed store of float32 vectors keyed by (model, normalized text hash)"""
+
+    def __init__(self, path: str, max_entries: int = 1_000_000):
+        """Open (or create) the cache file
+
+        Args:
+            path: Location of the SQLite cache file
+            max_entries: Maximum number of vectors kept before least recently used ones are evicted
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Normalize text so trivially different inputs share a cache entry"""
+        text = unicodedata.normalize('NFC', text)
+        return re.sub(r'\s+', ' ', text).strip()
+
+    @classmethod
+    def make_key(cls, model: str, text: str) -> str:
+        """Build the content-addressed key for a text under a given model"""
+        digest = hashlib.sha256(cls.normalize(text).encode('utf-8')).hexdigest()
+        return f"{model}:{digest}"
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Fetch cached vectors for the given keys, refreshing their access time"""
+        found = {}
+        if not keys:
+            return found
+
+        unique_keys = list(dict.fromkeys(keys))
+        now = time.time()
+        with self._lock:
+            # Stay below SQLite's bound parameter limit
+            for i in range(0, len(unique_keys), 500):
+                batch = unique_keys[i:i + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array('f')
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                        [(now, key) for key, _ in rows]
+                    )
+            self._conn.commit()
+        return found
+
+    def put_many(self, model: str, items: Dict[str, List[float]]):
+        """Store vectors as float32 and evict old entries if the cache is full"""
+        if not items:
+            return
+
+        now = time.time()
+        rows = [
+            (key, model, len(vector), array('f', vector).tobytes(), now)
+            for key, vector in items.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dim, vector, last_access) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Delete least recently used entries beyond max_entries"""
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+                (overflow,)
+            )
+
+    def count(self) -> int:
+        """Number of vectors currently stored"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def clear(self):
+        """Remove every cached vector"""
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that serves repeated texts from an EmbeddingCache"""
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        cache: Optional[EmbeddingCache] = None,
+        model_name: Optional[str] = None,
+        cache_factory: Optional[Callable[[], EmbeddingCache]] = None
+    ):
+        """Wrap an embeddings model with a persistent cache
+
+        Args:
+            embeddings: Underlying embeddings model that is called on cache misses
+            cache: Cache used to store and look up vectors
+            model_name: Name used in cache keys (defaults to the model's `model` attribute)
+            cache_factory: Creates the cache on first use when no cache is given, so
+                processes that never embed do not open the cache file
+        """
+        if cache is None and cache_factory is None:
+            raise ValueError("CachedEmbeddings needs a cache or a cache_factory")
+        self.embeddings = embeddings
+        self._cache = cache
+        self._cache_factory = cache_factory
+        self._cache_lock = threading.Lock()
+        self.model_name = model_name or getattr(embeddings, 'model', embeddings.__class__.__name__)
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    @property
+    def cache(self) -> EmbeddingCache:
+        """The cache, opened on first access"""
+        if self._cache is None:
+            with self._cache_lock:
+                if self._cache is None:
+                    self._cache = self._cache_factory()
+        return self._cache
+
+    def __getattr__(self, name):
+        # Expose attributes of the wrapped model (e.g. `model`, `dimensions`)
+        if name in ('embeddings', '_cache', '_cache_factory', '_cache_lock'):
+            raise AttributeError(name)
+        return getattr(self.embeddings, name)
+
+    def _lookup(self, texts: List[str]):
+        """Split texts into cached vectors and distinct missing texts"""
+        keys = [EmbeddingCache.make_key(self.model_name, text) for text in texts]
+        cached = self.cache.get_many(keys)
+
+        # Embed each distinct missing text once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        return keys, cached, missing
+
+    def _store(self, keys: List[str], cached: Dict[str, List[float]], missing: Dict[str, str],
+               vectors: List[List[float]]) -> List[List[float]]:
+        """Save newly embedded vectors and assemble results in input order"""
+        if missing:
+            # Round to the stored float32 precision so hits and misses return identical vectors
+            new_items = {key: array('f', vector).tolist() for key, vector in zip(missing.keys(), vectors)}
+            self.cache.put_many(self.model_name, new_items)
+            cached.update(new_items)
+
+        with self._stats_lock:
+            self.misses += len(missing)
+            self.hits += len(keys) - len(missing)
+
+        return [cached[key] for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts, calling the underlying model only for uncached ones"""
+        keys, cached, missing = self._lookup(texts)
+        vectors = self.embeddings.embed_documents(list(missing.values())) if missing else []
+        return self._store(keys, cached, missing, vectors)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Async variant of embed_documents using the model's async API for misses
+        
+        Cache reads and writes run in a worker thread so SQLite I/O does not block the event loop.
+        """
+        keys, cached, missing = await asyncio.to_thread(self._lookup, texts)
+        vectors = await self.embeddings.aembed_documents(list(missing.values())) if missing else []
+        return await asyncio.to_thread(self._store, keys, cached, missing, vectors)
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single query through the cache"""
+        return self.embed_documents([text])[0]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Async variant of embed_query"""
+        return (await self.aembed_documents([text]))[0]
+
+    def get_stats(self) -> Dict[str, float]:
+        """Return hit/miss counts for this process"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': self.cache.count()
+        }
+
+    def print_stats(self):
+        """Print a short cache summary"""
+        stats = self.get_stats()
+        print(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses "
+              f"({stats['hit_rate']:.1%} hit rate, {stats['entries']} cached vectors)")
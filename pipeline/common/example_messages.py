@@ -1,5 +1,8 @@
+import json
 from typing import List, Dict
 
+from .prompt import EMAIL_BATCH_CLASSIFICATION_PROMPT_TEMPLATE
+
 
 def get_generator_messages() -> List[Dict[str, str]]:
    """Get example messages for generator.""" 
@@ -2604,6 +2607,29 @@ KEY GUIDELINES:
 ]
 
 
+def get_email_batch_classification_messages() -> List[Dict[str, str]]:
+   """Get the email classification examples as one batch prompt answered with a JSON array."""
+   messages = get_email_classification_messages()
+   emails = []
+   answers = []
+   for user, assistant in zip(messages[1::2], messages[2::2]):
+      email_id = f"E{len(emails) + 1}"
+      email = user["content"].split("METADATA:", 1)[1].split("CLASSIFICATION TASK:", 1)[0]
+      emails.append(f"=== EMAIL {email_id} ===\nMETADATA:{email.rstrip()}")
+      answers.append({"id": email_id, **json.loads(assistant["content"])})
+   return [
+      messages[0],
+      {
+         "role": "user",
+         "content": EMAIL_BATCH_CLASSIFICATION_PROMPT_TEMPLATE.format(count=len(emails), emails="\n\n".join(emails))
+      },
+      {
+         "role": "assistant",
+         "content": json.dumps(answers, indent=4, ensure_ascii=False)
+      }
+   ]
+
+
 def get_email_qa_messages() -> List[Dict[str, str]]:
    """Get example messages for email QA generation."""
    return [
@@ -0,0 +1,149 @@
+"""Persistent, content-addressed cache for extracted attachment text."""
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .settings import ATTACHMENT_CACHE_ENABLED, ATTACHMENT_CACHE_PATH, ATTACHMENT_CACHE_MAX_ENTRIES
+
+def file_sha256(path: Path, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's bytes"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+@dataclass
+class ExtractionCacheStats:
+    """How the attachments of one run were served"""
+    hits: int = 0
+    duplicates: int = 0
+    extracted: int = 0
+
+    def summary(self) -> str:
+        total = self.hits + self.duplicates + self.extracted
+        served = self.hits + self.duplicates
+        served_pct = 100 * served / total if total else 0.0
+        return (
+            f"Extraction cache: {self.hits} cache hits, {self.duplicates} duplicates within the run, "
+            f"{self.extracted} extracted ({served_pct:.1f}% served without extraction)"
+        )
+
+class ExtractionCache:
+    """SQLite-backed store of cleaned attachment text and metadata
+
+    Keys combine the file's SHA-256 with the extractor and cleaning versions
+    (see DocumentProcessor.cache_namespace), so changing either invalidates
+    old entries without clearing the file.
+    """
+
+    def __init__(self, path: str, max_entries: int = 200_000):
+        """Open (or create) the cache file
+
+        Args:
+            path: Location of the SQLite cache file
+            max_entries: Maximum number of extractions kept before least recently used ones are evicted
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS extractions (
+                key TEXT PRIMARY KEY,
+                content BLOB NOT NULL,
+                metadata TEXT NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_extractions_last_access ON extractions(last_access)")
+        self._conn.commit()
+        # Running entry count, so puts do not scan the table
+        self._count = self._conn.execute("SELECT COUNT(*) FROM extractions").fetchone()[0]
+
+    @staticmethod
+    def make_key(file_hash: str, namespace: str) -> str:
+        """Build the cache key for a file under an extractor/cleaning namespace"""
+        return f"{namespace}:{file_hash}"
+
+    def get_many(self, keys: List[str]) -> Dict[str, Dict]:
+        """Fetch cached extractions as {'content', 'metadata'}, refreshing their access time"""
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        if not unique_keys:
+            return found
+
+        now = time.time()
+        with self._lock:
+            # Stay below SQLite's bound parameter limit
+            for i in range(0, len(unique_keys), 500):
+                batch = unique_keys[i:i + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, content, metadata FROM extractions WHERE key IN ({placeholders})",
+                    batch
+                ).fetchall()
+                for key, content, metadata in rows:
+                    found[key] = {
+                        'content': zlib.decompress(content).decode('utf-8'),
+                        'metadata': json.loads(metadata)
+                    }
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE extractions SET last_access = ? WHERE key = ?",
+                        [(now, key) for key, _, _ in rows]
+                    )
+            self._conn.commit()
+        return found
+
+    def put(self, key: str, content: str, metadata: List[Dict]):
+        """Store one extraction and evict old entries if the cache is full"""
+        now = time.time()
+        with self._lock:
+            exists = self._conn.execute("SELECT 1 FROM extractions WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extractions (key, content, metadata, last_access) VALUES (?, ?, ?, ?)",
+                (key, zlib.compress(content.encode('utf-8')), json.dumps(metadata, ensure_ascii=False, default=str), now)
+            )
+            if exists is None:
+                self._count += 1
+            overflow = self._count - self.max_entries
+            if overflow > 0:
+                deleted = self._conn.execute(
+                    "DELETE FROM extractions WHERE key IN "
+                    "(SELECT key FROM extractions ORDER BY last_access ASC LIMIT ?)",
+                    (overflow,)
+                ).rowcount
+                self._count -= deleted
+            self._conn.commit()
+
+    def count(self) -> int:
+        """Number of extractions currently stored"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM extractions").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM extractions")
+            self._conn.commit()
+            self._count = 0
+
+_default_cache: Optional[ExtractionCache] = None
+
+def get_default_extraction_cache() -> Optional[ExtractionCache]:
+    """Return the process-wide cache configured in settings (None if disabled)"""
+    global _default_cache
+    if not ATTACHMENT_CACHE_ENABLED:
+        return None
+    if _default_cache is None:
+        _default_cache = ExtractionCache(ATTACHMENT_CACHE_PATH, max_entries=ATTACHMENT_CACHE_MAX_ENTRIES)
+    return _default_cache
@@ -0,0 +1,266 @@
+"""Persistent cache for validated LLM responses."""
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .settings import (
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_BACKEND,
+    LLM_CACHE_PATH,
+    LLM_CACHE_INDEX,
+    LLM_CACHE_TTL_SECONDS,
+    LLM_CACHE_MAX_ENTRIES,
+    ELASTIC_URL,
+    ELASTIC_USER,
+    ELASTIC_PASSWORD
+)
+
+def make_cache_key(model: str, temperature: Any, messages: List[Dict[str, str]], prompt_version: str) -> str:
+    """Build a cache key from everything that determines an LLM response
+
+    Args:
+        model: Model name
+        temperature: Sampling temperature
+        messages: Full message list as {'role', 'content'} dictionaries
+        prompt_version: Version of the prompt template that produced the messages
+    """
+    payload = json.dumps(
+        {
+            "model": model,
+            "temperature": temperature,
+            "prompt_version": prompt_version,
+            "messages": messages
+        },
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class LLMCache:
+    """Interface for response cache backends"""
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the cached output for a key, or None if missing or expired"""
+        raise NotImplementedError
+
+    def set(self, key: str, value: Dict, model: str = ""):
+        """Store a validated output"""
+        raise NotImplementedError
+
+    def clear(self):
+        """Remove every cached response"""
+        raise NotImplementedError
+
+class SQLiteLLMCache(LLMCache):
+    """Local on-disk cache with TTL and least-recently-used size eviction"""
+
+    def __init__(self, path: str, ttl_seconds: Optional[float] = None, max_entries: int = 100_000, evict_every: int = 100):
+        """Open (or create) the cache file
+
+        Args:
+            path: Location of the SQLite cache file
+            ttl_seconds: Age after which entries expire (None keeps them forever)
+            max_entries: Maximum number of responses kept before least recently used ones are evicted
+            evict_every: Run eviction on open and after this many writes
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.evict_every = max(1, evict_every)
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_created_at ON responses(created_at)")
+        self._evict(time.time())
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            value, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(value)
+
+    def set(self, key: str, value: Dict, model: str = ""):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, value, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, model, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            self._writes += 1
+            if self._writes % self.evict_every == 0:
+                self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        """Delete expired entries and least recently used entries beyond max_entries"""
+        if self.ttl_seconds is not None:
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+
+        count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                (overflow,)
+            )
+
+    def count(self) -> int:
+        """Number of responses currently stored"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+class ElasticsearchLLMCache(LLMCache):
+    """Cache stored in an Elasticsearch index so several machines can share it"""
+
+    def __init__(
+        self,
+        index_name: str,
+        ttl_seconds: Optional[float] = None,
+        max_entries: int = 100_000,
+        evict_every: int = 100
+    ):
+        """Connect to the cache index, creating it if needed
+
+        Args:
+            index_name: Index holding cached responses
+            ttl_seconds: Age after which entries expire (None keeps them forever)
+            max_entries: Maximum number of responses kept; the oldest are evicted first
+            evict_every: Run eviction after this many writes
+        """
+        from elasticsearch import Elasticsearch
+
+        self.index_name = index_name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self._writes = 0
+        self.client = Elasticsearch(
+            ELASTIC_URL,
+            basic_auth=(ELASTIC_USER, ELASTIC_PASSWORD)
+        )
+        if not self.client.indices.exists(index=index_name):
+            self.client.indices.create(
+                index=index_name,
+                mappings={
+                    "properties": {
+                        "model": {"type": "keyword"},
+                        "value": {"type": "object", "enabled": False},
+                        "created_at": {"type": "double"}
+                    }
+                }
+            )
+
+    def get(self, key: str) -> Optional[Dict]:
+        result = self.client.options(ignore_status=404).get(index=self.index_name, id=key)
+        if not result.get("found"):
+            return None
+
+        source = result["_source"]
+        if self.ttl_seconds is not None and time.time() - source["created_at"] > self.ttl_seconds:
+            self.client.options(ignore_status=404).delete(index=self.index_name, id=key)
+            return None
+        return source["value"]
+
+    def set(self, key: str, value: Dict, model: str = ""):
+        self.client.index(
+            index=self.index_name,
+            id=key,
+            document={"model": model, "value": value, "created_at": time.time()}
+        )
+        self._writes += 1
+        if self._writes % self.evict_every == 0:
+            self._evict()
+
+    def _evict(self):
+        """Delete expired entries and the oldest entries beyond max_entries"""
+        if self.ttl_seconds is not None:
+            self.client.delete_by_query(
+                index=self.index_name,
+                query={"range": {"created_at": {"lt": time.time() - self.ttl_seconds}}},
+                conflicts="proceed"
+            )
+
+        self.client.indices.refresh(index=self.index_name)
+        count = self.client.count(index=self.index_name)["count"]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            # Find the creation time of the newest entry to drop
+            response = self.client.search(
+                index=self.index_name,
+                size=1,
+                from_=min(overflow, 10_000) - 1,
+                sort=[{"created_at": "asc"}],
+                source=False
+            )
+            hits = response["hits"]["hits"]
+            if hits:
+                self.client.delete_by_query(
+                    index=self.index_name,
+                    query={"range": {"created_at": {"lte": hits[0]["sort"][0]}}},
+                    conflicts="proceed"
+                )
+
+    def clear(self):
+        self.client.delete_by_query(index=self.index_name, query={"match_all": {}}, conflicts="proceed")
+
+_default_cache: Optional[LLMCache] = None
+_default_cache_lock = threading.Lock()
+
+def get_default_llm_cache() -> Optional[LLMCache]:
+    """Return the process-wide cache configured in settings (None if disabled)"""
+    global _default_cache
+    if not LLM_CACHE_ENABLED:
+        return None
+
+    with _default_cache_lock:
+        if _default_cache is None:
+            if LLM_CACHE_BACKEND == "elasticsearch":
+                _default_cache = ElasticsearchLLMCache(
+                    LLM_CACHE_INDEX,
+                    ttl_seconds=LLM_CACHE_TTL_SECONDS,
+                    max_entries=LLM_CACHE_MAX_ENTRIES
+                )
+            else:
+                _default_cache = SQLiteLLMCache(
+                    LLM_CACHE_PATH,
+                    ttl_seconds=LLM_CACHE_TTL_SECONDS,
+                    max_entries=LLM_CACHE_MAX_ENTRIES
+                )
+    return _default_cache
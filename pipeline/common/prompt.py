@@ -1,36 +1,6 @@
 from typing import List, Dict
 
-EMAIL_CLASSIFICATION_PROMPT_TEMPLATE = """Please classify this email for inclusion in our financial investment research RAG system based on the following information:
-
-METADATA:
-Topic: {topic}
-Subject: {subject}
-From: {sender_name} ({sender_email})
-To: {to}
-Conversation Topic: {conversation_topic}
-
-CONTENT:
-{body}
-
-ATTACHMENTS:
-{attachment_content}
-
-CLASSIFICATION TASK:
-Analyze if this email should be included in an investment research database used by professional investors for market research, company analysis, and investment decisions.
-
-Your response must be in this exact JSON format:
-{{
-    "thought_process": [
-        "First, I analyze the sender and context: [who sent it and why]",
-        "Then, I examine the core content and attachments: [key information/topics covered in both email and attachments]",
-        "Next, I identify any investment relevance: [specific financial/market/investment value]",
-        "Finally, I match it to classification criteria: [which category it fits and why]"
-    ],
-    "decision": "INCLUDE/EXCLUDE",
-    "category": "[category from below]",
-}}
-
-EXCLUSION CATEGORIES (If any of these fit, exclude):
+EMAIL_CLASSIFICATION_CRITERIA = """EXCLUSION CATEGORIES (If any of these fit, exclude):
 1. Non-Financial Onboarding/Welcome Emails
    → Generic welcome messages, app introductions (e.g., "Welcome to LinkedIn")
 2. Email Delivery Failures
@@ -66,6 +36,76 @@ KEY GUIDELINES:
 - Include if contains unique financial insights or data
 - Context matters: even routine emails may be included if they contain valuable investment information"""
 
+EMAIL_CLASSIFICATION_PROMPT_TEMPLATE = """Please classify this email for inclusion in our financial investment research RAG system based on the following information:
+
+METADATA:
+Topic: {topic}
+Subject: {subject}
+From: {sender_name} ({sender_email})
+To: {to}
+Conversation Topic: {conversation_topic}
+
+CONTENT:
+{body}
+
+ATTACHMENTS:
+{attachment_content}
+
+CLASSIFICATION TASK:
+Analyze if this email should be included in an investment research database used by professional investors for market research, company analysis, and investment decisions.
+
+Your response must be in this exact JSON format:
+{{
+    "thought_process": [
+        "First, I analyze the sender and context: [who sent it and why]",
+        "Then, I examine the core content and attachments: [key information/topics covered in both email and attachments]",
+        "Next, I identify any investment relevance: [specific financial/market/investment value]",
+        "Finally, I match it to classification criteria: [which category it fits and why]"
+    ],
+    "decision": "INCLUDE/EXCLUDE",
+    "category": "[category from below]",
+}}
+
+""" + EMAIL_CLASSIFICATION_CRITERIA
+
+EMAIL_BATCH_ITEM_TEMPLATE = """=== EMAIL {email_id} ===
+METADATA:
+Topic: {topic}
+Subject: {subject}
+From: {sender_name} ({sender_email})
+To: {to}
+Conversation Topic: {conversation_topic}
+
+CONTENT:
+{body}
+
+ATTACHMENTS:
+{attachment_content}"""
+
+EMAIL_BATCH_CLASSIFICATION_PROMPT_TEMPLATE = """Please classify each of the following {count} emails for inclusion in our financial investment research RAG system. Classify every email independently, exactly as you would if it were sent on its own.
+
+{emails}
+
+CLASSIFICATION TASK:
+For each email, analyze if it should be included in an investment research database used by professional investors for market research, company analysis, and investment decisions.
+
+Your response must be a JSON array with exactly one object per email, in this exact format:
+[
+    {{
+        "id": "[email id, e.g. E1]",
+        "thought_process": [
+            "First, I analyze the sender and context: [who sent it and why]",
+            "Then, I examine the core content and attachments: [key information/topics covered in both email and attachments]",
+            "Next, I identify any investment relevance: [specific financial/market/investment value]",
+            "Finally, I match it to classification criteria: [which category it fits and why]"
+        ],
+        "decision": "INCLUDE/EXCLUDE",
+        "category": "[category from below]"
+    }}
+]
+
+""" + EMAIL_CLASSIFICATION_CRITERIA
+
 
 EMAIL_QA_PROMPT_TEMPLATE = '''Generate one high-quality investment research question-answer pair from this email content. The Q&A should help investors find and analyze relevant information from a large email database.
 
@@ -0,0 +1,206 @@
+"""Streaming record files shared by the pipeline stages.
+
+Stages exchange one JSON record per line (JSONL), optionally compressed with
+zstandard (``.jsonl.zst``), so each stage can read and write a conversation
+at a time instead of loading a whole JSON array. Legacy ``.json`` array files
+are still readable, also without loading them whole.
+"""
+import io
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from .settings import RECORDS_FORMAT, RECORDS_BATCH_SIZE
+
+RECORD_SUFFIXES = ['.jsonl.zst', '.jsonl', '.json']
+
+# Read size for the legacy JSON array parser
+_JSON_READ_SIZE = 1 << 20
+
+def _suffix(path: Path) -> str:
+    name = path.name
+    for suffix in RECORD_SUFFIXES:
+        if name.endswith(suffix):
+            return suffix
+    return path.suffix
+
+def records_filename(stem: str, records_format: str = RECORDS_FORMAT) -> str:
+    """File name for a stage output, e.g. included_emails.jsonl.zst"""
+    return f"{stem}.{records_format}"
+
+def resolve_records_path(directory: Path, name: str) -> Path:
+    """Find a record file by exact name, or by stem in any supported format
+
+    'included_emails' and 'included_emails.json' both resolve to whichever of
+    included_emails.jsonl.zst / .jsonl / .json exists, preferring that order.
+    """
+    exact = directory / name
+    if exact.exists():
+        return exact
+    stem = name
+    suffix = _suffix(Path(name))
+    if suffix in RECORD_SUFFIXES:
+        stem = name[:-len(suffix)]
+    for suffix in RECORD_SUFFIXES:
+        candidate = directory / f"{stem}{suffix}"
+        if candidate.exists():
+            return candidate
+    raise FileNotFoundError(f"No {' / '.join(RECORD_SUFFIXES)} file for '{name}' in {directory}")
+
+def _open_text(path: Path, mode: str):
+    """Open a (possibly zstd-compressed) text file for 'r' or 'w'/'a'"""
+    if _suffix(path) == '.jsonl.zst':
+        import zstandard
+        if mode == 'r':
+            raw = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True, closefd=True)
+        else:
+            raw = zstandard.ZstdCompressor(level=3).stream_writer(open(path, mode + 'b'), closefd=True)
+        return io.TextIOWrapper(raw, encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+def _iter_json_array(f, read_size: int = _JSON_READ_SIZE) -> Iterator[Any]:
+    """Decode the elements of a top-level JSON array incrementally"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    started = False
+    eof = False
+    while True:
+        # Skip separators between elements
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if not started and pos < len(buffer):
+            if buffer[pos] != '[':
+                raise ValueError("Expected a JSON array")
+            started = True
+            pos += 1
+            continue
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        try:
+            if pos >= len(buffer):
+                raise json.JSONDecodeError("Need more data", buffer, pos)
+            item, end = decoder.raw_decode(buffer, pos)
+            # A value ending exactly at the buffer edge may be truncated (e.g. a number)
+            if end == len(buffer) and not eof:
+                raise json.JSONDecodeError("Need more data", buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                if pos >= len(buffer):
+                    raise ValueError("Unterminated JSON array")
+                raise
+            chunk = f.read(read_size)
+            if not chunk:
+                eof = True
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield item
+        pos = end
+
+def read_records(path) -> Iterator[Dict]:
+    """Yield records one at a time from a .jsonl, .jsonl.zst or legacy .json array file"""
+    path = Path(path)
+    with _open_text(path, 'r') as f:
+        if _suffix(path) == '.json':
+            yield from _iter_json_array(f)
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def count_records(path) -> int:
+    """Number of records in a file (streams through it once)"""
+    return sum(1 for _ in read_records(path))
+
+class RecordWriter:
+    """Writes records one per line to a .jsonl or .jsonl.zst file
+
+    Example:
+        >>> with RecordWriter(data_dir / 'included_emails.jsonl') as writer:
+        ...     for entry in entries:
+        ...         writer.write(entry)
+    """
+
+    def __init__(self, path, append: bool = False):
+        self.path = Path(path)
+        if _suffix(self.path) not in ('.jsonl', '.jsonl.zst'):
+            raise ValueError(f"Record files must end in .jsonl or .jsonl.zst: {self.path}")
+        self.count = 0
+        self._file = _open_text(self.path, 'a' if append else 'w')
+
+    def write(self, record: Dict):
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.count += 1
+
+    def write_many(self, records: Iterable[Dict]):
+        for record in records:
+            self.write(record)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def stage_writer(directory: Path, stem: str, records_format: str = RECORDS_FORMAT) -> RecordWriter:
+    """Open a stage output for writing, removing copies of it in other formats
+
+    Without the cleanup a stale included_emails.jsonl.zst would shadow a fresh
+    included_emails.jsonl in resolve_records_path. Legacy .json files are kept;
+    record files already take precedence over them.
+    """
+    path = directory / records_filename(stem, records_format)
+    for suffix in ('.jsonl', '.jsonl.zst'):
+        sibling = directory / f"{stem}{suffix}"
+        if sibling != path and sibling.exists():
+            sibling.unlink()
+    return RecordWriter(path)
+
+def batched(records: Iterable[Dict], size: int = RECORDS_BATCH_SIZE) -> Iterator[List[Dict]]:
+    """Group a record stream into lists of at most size records"""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def write_json_array(path, records: Iterable[Any]) -> int:
+    """Stream records into a JSON array file for consumers that expect one; returns the count"""
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('[')
+        for record in records:
+            f.write(',\n' if count else '\n')
+            f.write(json.dumps(record, ensure_ascii=False))
+            count += 1
+        f.write('\n]\n' if count else ']\n')
+    return count
+
+def convert_json_to_records(input_path, output_path: Optional[Path] = None, records_format: str = RECORDS_FORMAT) -> Path:
+    """One-time conversion of a legacy JSON array file to the record format
+
+    Args:
+        input_path: Existing .json array file
+        output_path: Destination (defaults to the input stem with the configured format)
+        records_format: 'jsonl' or 'jsonl.zst' when output_path is not given
+
+    Returns:
+        Path of the written record file
+    """
+    input_path = Path(input_path)
+    if output_path is None:
+        output_path = input_path.with_name(records_filename(input_path.stem, records_format))
+    with RecordWriter(output_path) as writer:
+        writer.write_many(read_records(input_path))
+    print(f"Converted {writer.count} records from {input_path} to {output_path}")
+    return Path(output_path)
@@ -3,20 +3,64 @@ from pathlib import Path
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from pydantic_settings import BaseSettings
+from .embedding_cache import EmbeddingCache, CachedEmbeddings
 
 load_dotenv()
 
+def get_project_root() -> Path:
+    """Get the root directory of the project"""
+    return Path(__file__).parent.parent.parent
+
 # LLM settings
 LLM_PROVIDER = "openai"
 LLM_MODEL = "gpt-4o-mini"
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
 LLM = ChatOpenAI(
     api_key=os.getenv("OPENAI_API_KEY"),
     model=LLM_MODEL,
-    temperature=0
+    temperature=0,
+    timeout=LLM_TIMEOUT_SECONDS
 )
 
 # Embedding settings
-EMBEDDINGS = OpenAIEmbeddings(model="text-embedding-3-small")
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    str(get_project_root() / "data" / "cache" / "embeddings.sqlite")
+)
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "1000000"))
+
+# Per-request limits used to pack embedding batches
+EMBEDDING_MAX_INPUT_TOKENS = int(os.getenv("EMBEDDING_MAX_INPUT_TOKENS", "8191"))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "250000"))
+EMBEDDING_BATCH_MAX_ITEMS = int(os.getenv("EMBEDDING_BATCH_MAX_ITEMS", "500"))
+# Chunks read from the chunk stream and batched at a time, bounding embedding memory
+EMBEDDING_WINDOW_CHUNKS = int(os.getenv("EMBEDDING_WINDOW_CHUNKS", "10000"))
+
+EMBEDDINGS = OpenAIEmbeddings(model=EMBEDDING_MODEL)
+if EMBEDDING_CACHE_ENABLED:
+    # Serve repeated sentences, chunks and queries from the local cache
+    # (the cache file is opened on the first embedding call, not at import)
+    EMBEDDINGS = CachedEmbeddings(
+        EMBEDDINGS,
+        model_name=EMBEDDING_MODEL,
+        cache_factory=lambda: EmbeddingCache(EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES)
+    )
+
+# LLM response cache settings
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "sqlite")  # sqlite or elasticsearch
+LLM_CACHE_PATH = os.getenv(
+    "LLM_CACHE_PATH",
+    str(get_project_root() / "data" / "cache" / "llm_responses.sqlite")
+)
+LLM_CACHE_INDEX = os.getenv("LLM_CACHE_INDEX", "llm_cache")
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "100000"))
 
 # Elasticsearch settings
 ELASTIC_URL = os.getenv("ELASTIC_URL", "http://localhost:9200")
@@ -24,10 +68,6 @@ ELASTIC_USER = os.getenv("ELASTIC_USER", "elastic")
 ELASTIC_PASSWORD = os.getenv("ELASTIC_PASSWORD", "linqalpha")
 ELASTIC_DEFAULT_INDEX = os.getenv("ELASTIC_DEFAULT_INDEX", "emails")
 
-def get_project_root() -> Path:
-    """Get the root directory of the project"""
-    return Path(__file__).parent.parent.parent
-
 def get_embedding_dirname(strategy_name: str = "parent_child") -> Path:
     """Get the directory for storing embeddings"""
     embed_dir = get_project_root() / "embed" / strategy_name
@@ -44,3 +84,71 @@ def get_llm_with_streaming() -> ChatOpenAI:
         **settings,
         streaming=True
     )
+
+# Local pre-classifier run before the LLM email classifier
+PRE_CLASSIFIER_ENABLED = os.getenv("PRE_CLASSIFIER_ENABLED", "true").lower() == "true"
+PRE_CLASSIFIER_MODEL_PATH = os.getenv(
+    "PRE_CLASSIFIER_MODEL_PATH",
+    str(get_project_root() / "data" / "models" / "pre_classifier.npz")
+)
+PRE_CLASSIFIER_CONFIDENCE = float(os.getenv("PRE_CLASSIFIER_CONFIDENCE", "0.97"))
+PRE_CLASSIFIER_MIN_EXAMPLES = int(os.getenv("PRE_CLASSIFIER_MIN_EXAMPLES", "50"))
+PRE_CLASSIFIER_EXCLUDE_DOMAINS = [d.strip().lower() for d in os.getenv("PRE_CLASSIFIER_EXCLUDE_DOMAINS", "").split(",") if d.strip()]
+PRE_CLASSIFIER_INCLUDE_DOMAINS = [d.strip().lower() for d in os.getenv("PRE_CLASSIFIER_INCLUDE_DOMAINS", "").split(",") if d.strip()]
+# Exclude short calendar invites without the LLM (investment events are always left to the LLM)
+PRE_CLASSIFIER_CALENDAR_RULE = os.getenv("PRE_CLASSIFIER_CALENDAR_RULE", "false").lower() == "true"
+
+# Batched email classification (emails packed into one prompt)
+EMAIL_BATCH_MAX_SIZE = int(os.getenv("EMAIL_BATCH_MAX_SIZE", "10"))
+EMAIL_BATCH_MAX_TOKENS = int(os.getenv("EMAIL_BATCH_MAX_TOKENS", "12000"))
+
+# Attachment previews used for classification (full extraction runs for included conversations only)
+ATTACHMENT_PREVIEW_CHARS = int(os.getenv("ATTACHMENT_PREVIEW_CHARS", "2000"))
+ATTACHMENT_PREVIEW_ROWS = int(os.getenv("ATTACHMENT_PREVIEW_ROWS", "30"))
+
+# Caps on full spreadsheet and Word extraction; larger files are truncated
+ATTACHMENT_MAX_ROWS = int(os.getenv("ATTACHMENT_MAX_ROWS", "100000"))
+ATTACHMENT_MAX_CELLS = int(os.getenv("ATTACHMENT_MAX_CELLS", "1000000"))
+ATTACHMENT_MAX_TEXT_BYTES = int(os.getenv("ATTACHMENT_MAX_TEXT_BYTES", "10000000"))
+
+# Page-parallel extraction of large PDFs (outside the extraction pool, which runs one file per worker)
+PDF_PAGE_WORKERS = int(os.getenv("PDF_PAGE_WORKERS", "4"))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "40"))
+
+# Attachment extraction worker pool
+ATTACHMENT_WORKERS = int(os.getenv("ATTACHMENT_WORKERS", str(os.cpu_count() or 1)))
+ATTACHMENT_TIMEOUT_SECONDS = float(os.getenv("ATTACHMENT_TIMEOUT_SECONDS", "120"))
+ATTACHMENT_MAX_RSS_MB = float(os.getenv("ATTACHMENT_MAX_RSS_MB", "2048"))
+
+# Attachment extraction cache settings
+ATTACHMENT_CACHE_ENABLED = os.getenv("ATTACHMENT_CACHE_ENABLED", "true").lower() == "true"
+ATTACHMENT_CACHE_PATH = os.getenv(
+    "ATTACHMENT_CACHE_PATH",
+    str(get_project_root() / "data" / "cache" / "attachments.sqlite")
+)
+ATTACHMENT_CACHE_MAX_ENTRIES = int(os.getenv("ATTACHMENT_CACHE_MAX_ENTRIES", "200000"))
+
+# Intermediate record files written by the pipeline stages: jsonl or jsonl.zst
+RECORDS_FORMAT = os.getenv("RECORDS_FORMAT", "jsonl")
+# Conversations held in memory at once by the streaming stages
+RECORDS_BATCH_SIZE = int(os.getenv("RECORDS_BATCH_SIZE", "500"))
+
+# Parser for HTML email bodies: html.parser, or lxml (faster, but not byte-identical to html.parser)
+EMAIL_HTML_PARSER = os.getenv("EMAIL_HTML_PARSER", "html.parser")
+
+# Chunk only the text of each message that earlier messages in its conversation do not already contain
+THREAD_DEDUP_ENABLED = os.getenv("THREAD_DEDUP_ENABLED", "true").lower() == "true"
+# Consecutive words shared with an earlier message that mark text as repeated
+THREAD_DEDUP_SHINGLE_WORDS = int(os.getenv("THREAD_DEDUP_SHINGLE_WORDS", "8"))
+# Fewer words than this between or after repeated runs are dropped with them
+THREAD_DEDUP_MAX_GAP_WORDS = int(os.getenv("THREAD_DEDUP_MAX_GAP_WORDS", "12"))
+
+# Near-duplicate detection of broadcast emails (MinHash + LSH) during preprocessing
+NEAR_DUP_ENABLED = os.getenv("NEAR_DUP_ENABLED", "true").lower() == "true"
+# Estimated Jaccard similarity of word shingles at which two conversations are near-duplicates
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.8"))
+NEAR_DUP_NUM_PERM = int(os.getenv("NEAR_DUP_NUM_PERM", "128"))
+NEAR_DUP_BANDS = int(os.getenv("NEAR_DUP_BANDS", "16"))
+NEAR_DUP_SHINGLE_WORDS = int(os.getenv("NEAR_DUP_SHINGLE_WORDS", "5"))
+# Conversations with fewer words are never treated as near-duplicates
+NEAR_DUP_MIN_WORDS = int(os.getenv("NEAR_DUP_MIN_WORDS", "50"))
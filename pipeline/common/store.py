@@ -1,22 +1,36 @@
-from typing import List, Dict, Any, Optional
+import time
+from typing import List, Dict, Any, Optional, Set
 from datetime import datetime
-from elasticsearch import Elasticsearch
+from contextlib import contextmanager
+from elasticsearch import Elasticsearch, helpers
 from langchain_elasticsearch import ElasticsearchStore
 from .settings import ELASTIC_URL, ELASTIC_USER, ELASTIC_PASSWORD, EMBEDDINGS
 
 class EmailStore:
     """Unified store for both embedding storage and retrieval using Elasticsearch"""
     
-    def __init__(self, index_name: str = "emails", status_index: str = "email_status"):
+    # Field ElasticsearchStore writes embeddings to
+    VECTOR_FIELD = "vector"
+    # Index settings while bulk_load is active
+    BULK_LOAD_SETTINGS = {"refresh_interval": "-1", "number_of_replicas": 0}
+    
+    def __init__(self, index_name: str = "emails", status_index: str = "email_status", embeddings=None):
         """Initialize the Elasticsearch store
         
         Args:
             index_name: Name of the Elasticsearch index to use
             status_index: Name of the index for storing embedding status
+            embeddings: Embeddings model to use (defaults to the global EMBEDDINGS)
         """
         # Initialize Elasticsearch client
         self.index_name = index_name
         self.status_index = status_index
+        self.embeddings = embeddings or EMBEDDINGS
+        
+        # Bulk-load state (see bulk_load)
+        self._bulk_mode = False
+        self._bulk_thread_count = 4
+        self._bulk_chunk_size = 500
         
         # Define our index mapping
         self.es_mapping = {
@@ -33,6 +47,8 @@ class EmailStore:
                             "year": {"type": "integer"},
                             "month": {"type": "integer"},
                             "day": {"type": "integer"},
+                            # Near-duplicate conversations embedded through this one
+                            "duplicate_conversation_ids": {"type": "keyword"},
                             
                             # Chunk-specific metadata
                             "chunk_type": {"type": "keyword"},  # email_body or attachment
@@ -64,7 +80,10 @@ class EmailStore:
                 mappings={
                     "properties": {
                         "status": {"type": "keyword"},
-                        "timestamp": {"type": "date"}
+                        "timestamp": {"type": "date"},
+                        "record_type": {"type": "keyword"},
+                        "index_name": {"type": "keyword"},
+                        "index_uuid": {"type": "keyword"}
                     }
                 }
             )
@@ -82,29 +101,194 @@ class EmailStore:
             es_user=ELASTIC_USER,
             es_password=ELASTIC_PASSWORD,
             index_name=index_name,
-            embedding=EMBEDDINGS
+            embedding=self.embeddings
         )
     
-    def add_documents(self, texts: List[str], metadatas: List[Dict[str, Any]]) -> List[str]:
-        """Add documents with their metadata to the store
+    @contextmanager
+    def bulk_load(
+        self,
+        force_merge: bool = False,
+        max_num_segments: int = 1,
+        thread_count: int = 4,
+        chunk_size: int = 500
+    ):
+        """Context manager that tunes the index for large ingests
+        
+        While active, refresh is disabled, replicas are set to zero and
+        add_documents writes through helpers.parallel_bulk without per-batch
+        refreshes. Original settings are restored on exit, followed by a
+        single refresh and an optional force-merge.
         
         Args:
-            texts: List of document texts
-            metadatas: List of metadata dictionaries
+            force_merge: Force-merge the index after loading
+            max_num_segments: Target segment count for the force-merge
+            thread_count: Number of parallel bulk threads
+            chunk_size: Number of documents per bulk request
+        """
+        original = self._get_index_settings()
+        self._set_index_settings(self.BULK_LOAD_SETTINGS)
+        self._bulk_mode = True
+        self._bulk_thread_count = thread_count
+        self._bulk_chunk_size = chunk_size
+        try:
+            yield self
+        finally:
+            self._bulk_mode = False
+            if self.client.indices.exists(index=self.index_name):
+                # None resets a setting to its default
+                self._set_index_settings({
+                    "refresh_interval": original.get("refresh_interval"),
+                    "number_of_replicas": original.get("number_of_replicas")
+                })
+                self.client.indices.refresh(index=self.index_name)
+                if force_merge:
+                    print(f"Force-merging {self.index_name} to {max_num_segments} segment(s)...")
+                    self.client.indices.forcemerge(
+                        index=self.index_name,
+                        max_num_segments=max_num_segments
+                    )
+    
+    def _get_index_settings(self) -> Dict[str, Any]:
+        """Get refresh and replica settings of the main index"""
+        if not self.client.indices.exists(index=self.index_name):
+            return {}
+        settings = self.client.indices.get_settings(index=self.index_name)
+        index_settings = settings[self.index_name]["settings"]["index"]
+        return {
+            "refresh_interval": index_settings.get("refresh_interval"),
+            "number_of_replicas": index_settings.get("number_of_replicas")
+        }
+    
+    def _set_index_settings(self, settings: Dict[str, Any]):
+        """Apply dynamic settings to the main index if it exists"""
+        if self.client.indices.exists(index=self.index_name):
+            self.client.indices.put_settings(index=self.index_name, settings={"index": settings})
+    
+    def _ensure_vector_index(self, dims: int):
+        """Create the main index with the same vector mapping ElasticsearchStore uses
+        
+        The index is created with default settings. Inside bulk_load the bulk-load
+        settings are applied right after, and bulk_load resets them to the defaults
+        on exit (the index did not exist when it read the original settings).
+        """
+        if self.client.indices.exists(index=self.index_name):
+            return
+        self.client.indices.create(
+            index=self.index_name,
+            mappings={
+                "properties": {
+                    self.VECTOR_FIELD: {
+                        "type": "dense_vector",
+                        "dims": dims,
+                        "index": True,
+                        "similarity": "cosine"
+                    }
+                }
+            }
+        )
+        if self._bulk_mode:
+            self._set_index_settings(self.BULK_LOAD_SETTINGS)
+    
+    def index_embedded(
+        self,
+        texts: List[str],
+        vectors: List[List[float]],
+        metadatas: List[Dict[str, Any]],
+        ids: Optional[List[str]] = None,
+        max_retries: int = 3,
+        retry_delay: float = 1.0
+    ) -> List[str]:
+        """Write pre-embedded documents with helpers.parallel_bulk
+        
+        Items rejected with a retryable status (429 or 5xx) are retried on their
+        own with exponential backoff; the rest of the batch is not resent.
+        
+        Args:
+            texts: Document texts
+            vectors: Embedding vectors, one per text
+            metadatas: Metadata dictionaries, one per text
+            ids: Optional document IDs
+            max_retries: Number of retries for failed items
+            retry_delay: Initial delay between retries in seconds
             
         Returns:
-            List of document IDs
+            List of indexed document IDs
         """
-        ids = self.store.add_documents(texts=texts, metadatas=metadatas)
-        # Force refresh the index to make documents searchable immediately
-        self.client.indices.refresh(index=self.index_name)
-        return ids
+        if not texts:
+            return []
+        self._ensure_vector_index(len(vectors[0]))
+        
+        actions = []
+        for i, (text, vector, metadata) in enumerate(zip(texts, vectors, metadatas)):
+            action = {
+                "_op_type": "index",
+                "_index": self.index_name,
+                "_source": {"text": text, self.VECTOR_FIELD: vector, "metadata": metadata}
+            }
+            if ids is not None:
+                action["_id"] = ids[i]
+            actions.append(action)
+        
+        indexed_ids = []
+        for attempt in range(max_retries + 1):
+            ok_ids, failed = self._parallel_bulk(actions)
+            indexed_ids.extend(ok_ids)
+            if not failed:
+                break
+            
+            retryable = [(action, error) for action, error in failed if self._is_retryable(error)]
+            if len(retryable) < len(failed) or attempt == max_retries:
+                raise RuntimeError(f"{len(failed)} documents failed to index, first error: {failed[0][1]}")
+            
+            print(f"Retrying {len(retryable)} failed documents (attempt {attempt + 1}/{max_retries})")
+            time.sleep(retry_delay * (2 ** attempt))
+            actions = [action for action, _ in retryable]
+        
+        if not self._bulk_mode:
+            self.client.indices.refresh(index=self.index_name)
+        return indexed_ids
+    
+    def _parallel_bulk(self, actions: List[Dict[str, Any]]):
+        """Run parallel_bulk and split results into indexed IDs and failed actions"""
+        ok_ids = []
+        failed = []
+        # parallel_bulk yields results in the same order as the actions
+        results = helpers.parallel_bulk(
+            self.client,
+            actions,
+            thread_count=self._bulk_thread_count,
+            chunk_size=self._bulk_chunk_size,
+            raise_on_error=False,
+            raise_on_exception=False
+        )
+        for action, (ok, item) in zip(actions, results):
+            result = item.get("index", {})
+            if ok:
+                ok_ids.append(result.get("_id"))
+            else:
+                failed.append((action, result))
+        return ok_ids, failed
+    
+    @staticmethod
+    def _is_retryable(error: Dict[str, Any]) -> bool:
+        status = error.get("status")
+        if not isinstance(status, int):
+            # Transport-level failures (e.g. connection errors) carry no HTTP status
+            return True
+        return status == 429 or status >= 500
+    
+    def _source_filter(self, with_vectors: bool) -> Dict[str, Any]:
+        """Search/get keyword arguments that drop stored vectors from _source unless requested"""
+        if with_vectors:
+            return {}
+        return {"source_excludes": [self.VECTOR_FIELD]}
     
     def similarity_search(
         self,
         query: str,
         filter_dict: Optional[Dict] = None,
-        k: int = 50
+        k: int = 50,
+        with_vectors: bool = False
     ) -> List[Dict]:
         """Search for similar documents with optional filters
         
@@ -112,16 +296,17 @@ class EmailStore:
             query: Query text
             filter_dict: Optional Elasticsearch filter query
             k: Number of results to return (default: 50)
+            with_vectors: Include the stored embedding vector of each hit
             
         Returns:
             List of documents with their metadata and scores
         """
         # Get query embedding
-        embedding = EMBEDDINGS.embed_query(query)
+        embedding = self.embeddings.embed_query(query)
         
         # Build search query
         knn = {
-            "field": "vector",
+            "field": self.VECTOR_FIELD,
             "query_vector": embedding,
             "k": k,
             "num_candidates": max(k * 2, 100)
@@ -150,13 +335,15 @@ class EmailStore:
         response = self.client.search(
             index=self.index_name,
             body=search_query,
-            size=k
+            size=k,
+            **self._source_filter(with_vectors)
         )
         
         # Process results
         results = []
         for hit in response["hits"]["hits"]:
             doc = hit["_source"]
+            doc["id"] = hit["_id"]
             doc["vector_score"] = hit["_score"]
             doc["combined_score"] = hit["_score"]
             
@@ -213,27 +400,171 @@ class EmailStore:
                 es_user=ELASTIC_USER,
                 es_password=ELASTIC_PASSWORD,
                 index_name=self.index_name,
-                embedding=EMBEDDINGS
+                embedding=self.embeddings
             )
+            self.clear_checkpoints()
             self.set_embedding_status("NOT_STARTED")
         except Exception as e:
             print(f"Error clearing index: {e}")
     
-    def add_documents(self, texts: List[str], metadatas: List[Dict[str, Any]]):
+    def add_documents(
+        self,
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        ids: Optional[List[str]] = None
+    ) -> List[str]:
         """Add documents to the store with their metadata
         
         Args:
             texts: List of document texts
             metadatas: List of metadata dictionaries
+            ids: Optional document IDs. Existing documents with the same ID are overwritten.
+            
+        Returns:
+            List of document IDs
         """
         if len(texts) != len(metadatas):
             raise ValueError("Number of texts must match number of metadata dicts")
+        if ids is not None and len(ids) != len(texts):
+            raise ValueError("Number of ids must match number of texts")
+        
+        if self._bulk_mode:
+            # Embed, then write through parallel bulk without refreshing
+            vectors = self.embeddings.embed_documents(texts)
+            return self.index_embedded(texts, vectors, metadatas, ids)
         
         # Add documents in a single batch
-        self.store.add_texts(
+        return self.store.add_texts(
             texts=texts,
-            metadatas=metadatas
+            metadatas=metadatas,
+            ids=ids
+        )
+    
+    def get_existing_ids(self, ids: List[str]) -> Set[str]:
+        """Return the subset of document IDs that are already indexed"""
+        if not ids or not self.client.indices.exists(index=self.index_name):
+            return set()
+        response = self.client.mget(index=self.index_name, ids=ids, source=False)
+        return {doc['_id'] for doc in response['docs'] if doc.get('found')}
+    
+    def get_index_uuid(self) -> Optional[str]:
+        """Get the UUID of the main index, which changes whenever it is recreated"""
+        try:
+            settings = self.client.indices.get_settings(index=self.index_name)
+            return settings[self.index_name]['settings']['index']['uuid']
+        except Exception:
+            return None
+    
+    def _checkpoint_id(self, run_id: str, batch_number: int) -> str:
+        return f"{self.index_name}:{run_id}:batch:{batch_number}"
+    
+    def get_batch_checkpoints(self, num_batches: int, run_id: str, start: int = 0) -> Dict[int, Dict[str, Any]]:
+        """Get committed batch checkpoints that belong to the current index and run
+        
+        Args:
+            num_batches: Number of batches to look up
+            run_id: Identifier of the run (full or delta, and its input), so runs
+                with different inputs never share batch numbers
+            start: Batch number of the first batch to look up
+            
+        Returns:
+            Dictionary mapping batch number to its checkpoint record
+        """
+        index_uuid = self.get_index_uuid()
+        if not index_uuid or num_batches == 0:
+            return {}
+        
+        try:
+            response = self.client.mget(
+                index=self.status_index,
+                ids=[self._checkpoint_id(run_id, i) for i in range(start, start + num_batches)]
+            )
+        except Exception as e:
+            print(f"Error loading checkpoints: {e}")
+            return {}
+        
+        checkpoints = {}
+        for doc in response['docs']:
+            if not doc.get('found'):
+                continue
+            record = doc['_source']
+            # Checkpoints from a previous incarnation of the index are stale
+            if record.get('index_uuid') == index_uuid:
+                checkpoints[record['batch_number']] = record
+        return checkpoints
+    
+    def set_batch_checkpoint(self, run_id: str, batch_number: int, fingerprint: str, num_documents: int):
+        """Record that a batch of a run has been fully indexed"""
+        self.client.index(
+            index=self.status_index,
+            id=self._checkpoint_id(run_id, batch_number),
+            document={
+                "record_type": "batch_checkpoint",
+                "index_name": self.index_name,
+                "index_uuid": self.get_index_uuid(),
+                "run_id": run_id,
+                "batch_number": batch_number,
+                "fingerprint": fingerprint,
+                "num_documents": num_documents,
+                "status": "COMPLETE",
+                "timestamp": datetime.utcnow()
+            }
         )
+    
+    def set_embedding_progress(self, progress: Dict[str, Any]):
+        """Store the latest progress record (processed counts, throughput, ETA)"""
+        try:
+            self.client.index(
+                index=self.status_index,
+                id=f"{self.index_name}:progress",
+                document={
+                    **progress,
+                    "record_type": "progress",
+                    "index_name": self.index_name,
+                    "timestamp": datetime.utcnow()
+                }
+            )
+        except Exception as e:
+            print(f"Error setting progress: {e}")
+    
+    def get_embedding_progress(self) -> Optional[Dict[str, Any]]:
+        """Get the latest progress record, if any"""
+        try:
+            result = self.client.get(index=self.status_index, id=f"{self.index_name}:progress")
+            return result["_source"]
+        except Exception:
+            return None
+    
+    def _status_keyword_field(self, field: str) -> str:
+        """Name to use for exact matches on a status index field
+        
+        Status indexes created before the field was mapped have it as dynamic
+        text with a .keyword subfield.
+        """
+        mapping = self.client.indices.get_mapping(index=self.status_index)
+        properties = next(iter(mapping.values()))["mappings"].get("properties", {})
+        field_mapping = properties.get(field, {})
+        if field_mapping.get("type") == "text" and "keyword" in field_mapping.get("fields", {}):
+            return f"{field}.keyword"
+        return field
+    
+    def clear_checkpoints(self, batches_only: bool = False):
+        """Delete batch checkpoints and progress records for the main index
+        
+        Args:
+            batches_only: Keep the progress record and delete only batch checkpoints
+        """
+        try:
+            filters = [{"term": {self._status_keyword_field("index_name"): self.index_name}}]
+            if batches_only:
+                filters.append({"term": {self._status_keyword_field("record_type"): "batch_checkpoint"}})
+            self.client.delete_by_query(
+                index=self.status_index,
+                query={"bool": {"filter": filters}},
+                refresh=True
+            )
+        except Exception as e:
+            print(f"Error clearing checkpoints: {e}")
         
     def count_documents(self) -> int:
         """Get the total number of documents in the index"""
@@ -244,10 +575,74 @@ class EmailStore:
             print(f"Error counting documents: {e}")
             return 0
             
-    def get_chunks_by_conversation_id(self, conversation_id: str) -> List[Dict]:
-        """Get all chunks for a conversation ID"""
-        # Build Elasticsearch query to get all chunks from a conversation
-        query = {
+    def get_conversation_hashes(self) -> Dict[str, Optional[str]]:
+        """Get every indexed conversation ID with its stored content hash
+
+        Returns:
+            Dictionary mapping conversation ID to conversation hash (None for chunks indexed without one)
+        """
+        hashes = {}
+        if not self.client.indices.exists(index=self.index_name):
+            return hashes
+
+        after_key = None
+        while True:
+            composite = {
+                "size": 1000,
+                "sources": [
+                    {"conversation_id": {"terms": {"field": "metadata.conversation_id.keyword"}}},
+                    {"conversation_hash": {"terms": {"field": "metadata.conversation_hash.keyword", "missing_bucket": True}}}
+                ]
+            }
+            if after_key:
+                composite["after"] = after_key
+
+            response = self.client.search(
+                index=self.index_name,
+                size=0,
+                aggs={"conversations": {"composite": composite}}
+            )
+            agg = response["aggregations"]["conversations"]
+            for bucket in agg["buckets"]:
+                hashes[bucket["key"]["conversation_id"]] = bucket["key"]["conversation_hash"]
+
+            after_key = agg.get("after_key")
+            if not agg["buckets"] or not after_key:
+                break
+
+        return hashes
+
+    def get_max_chunk_index(self) -> int:
+        """Get the highest chunk_index in the index (-1 if empty)"""
+        if not self.client.indices.exists(index=self.index_name):
+            return -1
+        response = self.client.search(
+            index=self.index_name,
+            size=0,
+            aggs={"max_chunk_index": {"max": {"field": "metadata.chunk_index"}}}
+        )
+        value = response["aggregations"]["max_chunk_index"]["value"]
+        return int(value) if value is not None else -1
+
+    def delete_conversations(self, conversation_ids: List[str], batch_size: int = 1000) -> int:
+        """Delete all chunks belonging to the given conversations
+
+        Returns:
+            Number of deleted chunks
+        """
+        deleted = 0
+        for i in range(0, len(conversation_ids), batch_size):
+            response = self.client.delete_by_query(
+                index=self.index_name,
+                query={"terms": {"metadata.conversation_id.keyword": conversation_ids[i:i + batch_size]}},
+                refresh=True
+            )
+            deleted += response.get("deleted", 0)
+        return deleted
+
+    def _conversation_query(self, conversation_id: str) -> Dict[str, Any]:
+        """Query returning all chunks of one conversation in chunk order"""
+        return {
             "query": {
                 "match": {
                     "metadata.conversation_id.keyword": conversation_id
@@ -258,25 +653,38 @@ class EmailStore:
                 {"metadata.chunk_index": "asc"}  # Sort by chunk index
             ]
         }
+    
+    def _hit_to_chunk(self, hit: Dict[str, Any], with_vectors: bool) -> Dict[str, Any]:
+        """Convert a search hit into the chunk dictionary used by retrieval"""
+        source = hit['_source']
+        chunk = {
+            'id': hit['_id'],
+            'text': source['text'],
+            'metadata': source['metadata'],
+            'vector_score': 0,  # No vector score since this is direct fetch
+            'combined_score': 0  # No score since this is direct fetch
+        }
+        if with_vectors:
+            chunk['vector'] = source.get(self.VECTOR_FIELD)
+        return chunk
+    
+    def get_chunks_by_conversation_id(self, conversation_id: str, with_vectors: bool = False) -> List[Dict]:
+        """Get all chunks for a conversation ID
         
+        Args:
+            conversation_id: Conversation to fetch
+            with_vectors: Include the stored embedding vector of each chunk
+        """
         try:
             # Execute search
             response = self.client.search(
                 index=self.index_name,
-                body=query
+                body=self._conversation_query(conversation_id),
+                **self._source_filter(with_vectors)
             )
             
             # Convert hits to chunks
-            chunks = []
-            for hit in response['hits']['hits']:
-                source = hit['_source']
-                chunk = {
-                    'text': source['text'],
-                    'metadata': source['metadata'],
-                    'vector_score': 0,  # No vector score since this is direct fetch
-                    'combined_score': 0  # No score since this is direct fetch
-                }
-                chunks.append(chunk)
+            chunks = [self._hit_to_chunk(hit, with_vectors) for hit in response['hits']['hits']]
                 
             if not chunks:
                 print(f"Warning: No chunks found for conversation {conversation_id}")
@@ -285,3 +693,49 @@ class EmailStore:
         except Exception as e:
             print(f"Error fetching chunks for conversation {conversation_id}: {e}")
             return []
+    
+    def get_chunks_by_conversation_ids(
+        self,
+        conversation_ids: List[str],
+        with_vectors: bool = False,
+        max_searches: int = 100
+    ) -> Dict[str, List[Dict]]:
+        """Get all chunks for several conversations with one msearch per max_searches conversations
+        
+        Args:
+            conversation_ids: Conversations to fetch
+            with_vectors: Include the stored embedding vector of each chunk
+            max_searches: Maximum number of conversations per msearch request
+            
+        Returns:
+            Dictionary mapping conversation ID to its chunks in chunk order
+        """
+        conversation_ids = list(dict.fromkeys(conversation_ids))
+        results = {conversation_id: [] for conversation_id in conversation_ids}
+        header = {"index": self.index_name}
+        if not with_vectors:
+            header["_source"] = {"excludes": [self.VECTOR_FIELD]}
+        
+        for i in range(0, len(conversation_ids), max_searches):
+            batch = conversation_ids[i:i + max_searches]
+            searches = []
+            for conversation_id in batch:
+                searches.append(header)
+                searches.append(self._conversation_query(conversation_id))
+            
+            try:
+                response = self.client.msearch(searches=searches)
+            except Exception as e:
+                print(f"Error fetching chunks for {len(batch)} conversations: {e}")
+                continue
+            
+            for conversation_id, item in zip(batch, response['responses']):
+                if 'error' in item:
+                    print(f"Error fetching chunks for conversation {conversation_id}: {item['error']}")
+                    continue
+                results[conversation_id] = [self._hit_to_chunk(hit, with_vectors) for hit in item['hits']['hits']]
+        
+        missing = [conversation_id for conversation_id, chunks in results.items() if not chunks]
+        if missing:
+            print(f"Warning: No chunks found for {len(missing)} conversations")
+        return results
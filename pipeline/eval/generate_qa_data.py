@@ -8,6 +8,7 @@ from tqdm import tqdm
 from langchain_core.runnables import chain
 
 from pipeline.common.base_agent import BaseAgent
+from pipeline.common.records import RecordWriter, read_records, resolve_records_path, write_json_array
 from pipeline.common.prompt import EMAIL_QA_PROMPT_TEMPLATE
 from pipeline.common.example_messages import get_email_qa_messages
 
@@ -76,98 +77,90 @@ class QAGenerator(BaseAgent):
             print("Error: Invalid JSON format in response")
             return None
 
-def run_qa_generation(input_file: str = "included_emails.json", output_file: str = "qa_pairs.json", save_every: int = 10):
+def run_qa_generation(input_file: str = "included_emails", output_file: str = "qa_pairs.json", save_every: int = 10):
     """
     Generate QA pairs from processed emails with incremental saving.
     
+    Conversations are streamed from the input and each QA pair is appended to
+    a JSONL progress file, so neither the input nor the results are held in
+    memory; the JSON output is assembled from the progress file at the end.
+    
     Args:
-        input_file: Name of the input JSON file in the data/processed_emails directory
+        input_file: Name or stem of the input record file in the data/processed_emails directory
         output_file: Name of the output JSON file to store QA pairs in the data directory
-        save_every: Save progress after processing this many conversations
+        save_every: Flush progress to disk after processing this many conversations
+    
+    Returns:
+        Number of QA pairs written
     """
     # Suppress warnings
     warnings.filterwarnings('ignore', category=UserWarning)
     
     data_dir = Path(__file__).parent.parent.parent / 'data'
-    input_path = data_dir / 'processed_emails' / input_file
+    input_path = resolve_records_path(data_dir / 'processed_emails', input_file)
     output_path = data_dir / output_file
-    temp_path = data_dir / f"{output_file}.temp"
+    temp_path = data_dir / f"{output_file}.temp.jsonl"
     
     print("\n=== Starting QA Generation Pipeline ===")
-    
-    # Load conversations
-    print(f"\nLoading conversations from {input_path}")
-    with open(input_path, 'r', encoding='utf-8') as f:
-        conversations = json.load(f)
-    print(f"Found {len(conversations)} conversations")
+    print(f"\nStreaming conversations from {input_path}")
     
     # Check for existing progress
-    qa_pairs = []
     processed_ids = set()
     if temp_path.exists():
         print("\nFound existing progress, loading...")
-        with open(temp_path, 'r', encoding='utf-8') as f:
-            qa_pairs = json.load(f)
-        processed_ids = {pair['Conversation_ID'] for pair in qa_pairs}
-        print(f"Loaded {len(qa_pairs)} existing QA pairs")
-    
-    # Filter out already processed conversations
-    remaining_conversations = [
-        conv for conv in conversations 
-        if conv['conversation']['ConversationID'] not in processed_ids
-    ]
-    print(f"Remaining conversations to process: {len(remaining_conversations)}")
+        processed_ids = {pair['Conversation_ID'] for pair in read_records(temp_path)}
+        print(f"Loaded {len(processed_ids)} existing QA pairs")
     
     # Generate QA pairs
     print("\nStep 1: Generating QA pairs...")
     generator = QAGenerator()
     error_count = 0
+    total = 0
+    skipped = 0
     
-    def save_progress():
-        """Save current progress to temp file"""
-        with open(temp_path, 'w', encoding='utf-8') as f:
-            json.dump(qa_pairs, f, ensure_ascii=False, indent=2)
-        print(f"\nProgress saved: {len(qa_pairs)} QA pairs")
-    
-    try:
-        pbar = tqdm(total=len(remaining_conversations), ascii=True)
-        for i, conv in enumerate(remaining_conversations, 1):
-            try:
-                result = generator.invoke(conv['conversation'])
-                if result:
-                    qa_pairs.append({
-                        "Question": result["question"],
-                        "Conversation_ID": conv['conversation']["ConversationID"],
-                        "Answer": result["answer"],
-                        "Thought_Process": result["thought_process"]
-                    })
-            except Exception as e:
-                error_count += 1
-                print(f"\nError processing conversation {conv['conversation']['ConversationID']}: {str(e)}")
-            
-            # Save progress periodically
-            if i % save_every == 0:
-                save_progress()
+    with RecordWriter(temp_path, append=True) as writer:
+        try:
+            pbar = tqdm(ascii=True)
+            for conv in read_records(input_path):
+                total += 1
+                conversation_id = conv['conversation']['ConversationID']
+                # Skip conversations processed by an earlier run
+                if conversation_id in processed_ids:
+                    skipped += 1
+                    continue
+                try:
+                    result = generator.invoke(conv['conversation'])
+                    if result:
+                        writer.write({
+                            "Question": result["question"],
+                            "Conversation_ID": conversation_id,
+                            "Answer": result["answer"],
+                            "Thought_Process": result["thought_process"]
+                        })
+                except Exception as e:
+                    error_count += 1
+                    print(f"\nError processing conversation {conversation_id}: {str(e)}")
+                
+                # Save progress periodically
+                if (total - skipped) % save_every == 0:
+                    writer.flush()
+                
+                pbar.update(1)
+            pbar.close()
             
-            pbar.update(1)
-        pbar.close()
-        
-        # Final save of progress
-        save_progress()
-        
-        # Move temp file to final output
-        temp_path.rename(output_path)
-        
-    except KeyboardInterrupt:
-        print("\n\nInterrupted! Saving current progress...")
-        save_progress()
-        print("You can resume later by running the script again")
-        return qa_pairs
+        except KeyboardInterrupt:
+            print(f"\n\nInterrupted! Progress saved to {temp_path}")
+            print("You can resume later by running the script again")
+            return len(processed_ids) + writer.count
+    
+    # Assemble the final output and drop the progress file
+    qa_count = write_json_array(output_path, read_records(temp_path))
+    temp_path.unlink()
     
     print("\n=== QA Generation Pipeline Complete! ===")
-    print(f"Total conversations processed: {len(conversations)}")
-    print(f"Successfully generated QA pairs: {len(qa_pairs)}")
+    print(f"Total conversations processed: {total} ({skipped} from earlier progress)")
+    print(f"Successfully generated QA pairs: {qa_count}")
     print(f"Errors encountered: {error_count}")
     print(f"Results saved to: {output_path}")
     
-    return qa_pairs
+    return qa_count
@@ -6,6 +6,7 @@ import numpy as np
 from datetime import datetime
 from tqdm import tqdm
 from ..retrieval.pipeline import RetrievalPipeline, RetrieverType
+from ..retrieval.processor import group_conversation_ids
 
 def load_qa_pairs(qa_path: str) -> List[Dict]:
     """Load QA pairs from json file"""
@@ -100,7 +101,11 @@ def evaluate_retriever(
                 key=lambda x: x.max_score,
                 reverse=True
             )[:10]
-            retrieved_ids = [conv.conversation_id for conv in conversations]
+            # A group also stands for the near-duplicates indexed through it
+            retrieved_ids = [
+                ground_truth_id if ground_truth_id in group_conversation_ids(conv) else conv.conversation_id
+                for conv in conversations
+            ]
         
         # Calculate NDCG
         ndcg = calculate_ndcg(retrieved_ids, ground_truth_id)
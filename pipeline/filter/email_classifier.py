@@ -1,11 +1,57 @@
 from pathlib import Path
 from typing import Dict, List, Optional
 import json
+import asyncio
+import tiktoken
 from langchain_core.runnables import chain
 
 from pipeline.common.base_agent import BaseAgent
-from pipeline.common.prompt import EMAIL_CLASSIFICATION_PROMPT_TEMPLATE
-from pipeline.common.example_messages import get_email_classification_messages
+from pipeline.common.prompt import (
+    EMAIL_CLASSIFICATION_PROMPT_TEMPLATE,
+    EMAIL_BATCH_ITEM_TEMPLATE,
+    EMAIL_BATCH_CLASSIFICATION_PROMPT_TEMPLATE
+)
+from pipeline.common.example_messages import get_email_classification_messages, get_email_batch_classification_messages
+from pipeline.common.settings import LLM_MODEL, EMAIL_BATCH_MAX_SIZE, EMAIL_BATCH_MAX_TOKENS
+
+
+def format_attachment_content(message: Dict) -> str:
+    """Describe a message's attachments with a short preview of each."""
+    if not message.get('Attachments'):
+        return "No attachments in this email."
+
+    attachment_content = "The email contains the following attachments:\n\n"
+    for idx, attachment in enumerate(message['Attachments'], 1):
+        attachment_content += f"Attachment {idx} ({attachment['type']}):\n"
+        if 'error' in attachment:
+            attachment_content += f"Error processing attachment: {attachment['error']}\n"
+        else:
+            # Take first 500 characters of content as preview
+            content_preview = attachment['content'][:500]
+            if len(attachment['content']) > 500:
+                content_preview += "..."
+            attachment_content += f"Content preview:\n{content_preview}\n"
+        attachment_content += "\n"
+    return attachment_content
+
+
+def _prompt_fields(conversation: Dict) -> Dict[str, str]:
+    message = conversation['Messages'][0]
+    return dict(
+        topic=conversation['Topic'],
+        subject=message['Subject'],
+        sender_name=message['SenderName'],
+        sender_email=message['SenderEmail'],
+        to=message['To'],
+        conversation_topic=message['ConversationTopic'],
+        body=message['Body'],
+        attachment_content=format_attachment_content(message)
+    )
+
+
+def _is_valid_classification(parsed: Dict) -> bool:
+    required_fields = ["thought_process", "decision", "category"]
+    return all(k in parsed for k in required_fields) and parsed["decision"] in ["INCLUDE", "EXCLUDE"]
 
 
 class EmailClassifier(BaseAgent):
@@ -16,36 +62,7 @@ class EmailClassifier(BaseAgent):
     
     def get_prompt(self, conversation: Dict) -> str:
         """Create a prompt for classifying a single email conversation."""
-        message = conversation['Messages'][0]
-        
-        # Process attachments if present
-        attachment_content = ""
-        if 'Attachments' in message and message['Attachments']:
-            attachment_content = "The email contains the following attachments:\n\n"
-            for idx, attachment in enumerate(message['Attachments'], 1):
-                attachment_content += f"Attachment {idx} ({attachment['type']}):\n"
-                if 'error' in attachment:
-                    attachment_content += f"Error processing attachment: {attachment['error']}\n"
-                else:
-                    # Take first 500 characters of content as preview
-                    content_preview = attachment['content'][:500]
-                    if len(attachment['content']) > 500:
-                        content_preview += "..."
-                    attachment_content += f"Content preview:\n{content_preview}\n"
-                attachment_content += "\n"
-        else:
-            attachment_content = "No attachments in this email."
-        
-        return EMAIL_CLASSIFICATION_PROMPT_TEMPLATE.format(
-            topic=conversation['Topic'],
-            subject=message['Subject'],
-            sender_name=message['SenderName'],
-            sender_email=message['SenderEmail'],
-            to=message['To'],
-            conversation_topic=message['ConversationTopic'],
-            body=message['Body'],
-            attachment_content=attachment_content
-        )
+        return EMAIL_CLASSIFICATION_PROMPT_TEMPLATE.format(**_prompt_fields(conversation))
     
     def validate_output(self, output: str) -> Optional[Dict]:
         """Validate the classification output from the LLM."""
@@ -68,3 +85,128 @@ class EmailClassifier(BaseAgent):
         except json.JSONDecodeError:
             print("Error: Invalid JSON format in response")
             return None
+
+
+class BatchEmailClassifier(EmailClassifier):
+    """Classifies several emails per LLM call so the few-shot examples are sent once per batch.
+    
+    Emails are labelled E1..EN inside a batch. Items missing from the response or
+    failing validation are classified again one at a time, sharing this
+    classifier's concurrency limit.
+    """
+    
+    def __init__(
+        self,
+        max_batch_size: int = EMAIL_BATCH_MAX_SIZE,
+        max_batch_tokens: int = EMAIL_BATCH_MAX_TOKENS,
+        **kwargs
+    ):
+        """Initialize the batch classifier
+        
+        Args:
+            max_batch_size: Maximum number of emails per prompt
+            max_batch_tokens: Token budget for the emails packed into one prompt
+            **kwargs: Passed to BaseAgent (and to the single-email fallback classifier)
+        """
+        super().__init__(**kwargs)
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_batch_tokens = max_batch_tokens
+        self.single_classifier = EmailClassifier(**kwargs)
+        # Fallback requests count against the same concurrency limit as batch requests
+        self.single_classifier._get_semaphore = self._get_semaphore
+        try:
+            self.encoding = tiktoken.encoding_for_model(LLM_MODEL)
+        except KeyError:
+            self.encoding = tiktoken.get_encoding("o200k_base")
+    
+    def get_example_messages(self) -> List[Dict[str, str]]:
+        return get_email_batch_classification_messages()
+    
+    def format_email(self, email_id: str, conversation: Dict) -> str:
+        return EMAIL_BATCH_ITEM_TEMPLATE.format(email_id=email_id, **_prompt_fields(conversation))
+    
+    def get_prompt(self, conversations: List[Dict]) -> str:
+        """Create a prompt classifying every conversation in the batch."""
+        emails = "\n\n".join(
+            self.format_email(f"E{n}", conv) for n, conv in enumerate(conversations, 1)
+        )
+        return EMAIL_BATCH_CLASSIFICATION_PROMPT_TEMPLATE.format(count=len(conversations), emails=emails)
+    
+    def validate_output(self, output: str) -> Optional[Dict]:
+        """Keep the valid classifications of a JSON array response, keyed by email id."""
+        try:
+            parsed = json.loads(output)
+        except json.JSONDecodeError:
+            print("Error: Invalid JSON format in response")
+            return None
+        if not isinstance(parsed, list):
+            print("Error: Expected a JSON array of classifications")
+            return None
+        
+        classifications = {}
+        for item in parsed:
+            if isinstance(item, dict) and isinstance(item.get("id"), str) and _is_valid_classification(item):
+                email_id = item.pop("id")
+                classifications.setdefault(email_id, item)
+        if not classifications:
+            print("Error: No valid classifications in model output")
+            return None
+        return {"classifications": classifications}
+    
+    def pack_batches(self, conversations: List[Dict]) -> List[List[int]]:
+        """Group conversation indices into batches bounded by size and token budget
+        
+        Input order is kept; an email larger than the budget gets a batch of its own.
+        """
+        batches: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = 0
+        for i, conv in enumerate(conversations):
+            tokens = len(self.encoding.encode(self.format_email(f"E{self.max_batch_size}", conv), disallowed_special=()))
+            if current and (len(current) >= self.max_batch_size or current_tokens + tokens > self.max_batch_tokens):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+    
+    async def _aclassify_single(self, conversation: Dict, limiter=None) -> Optional[Dict]:
+        try:
+            if limiter is not None:
+                await limiter.wait()
+            return await self.single_classifier.ainvoke(conversation)
+        except Exception as e:
+            print(f"Error classifying conversation {conversation.get('ConversationID')}: {str(e)}")
+            return None
+    
+    async def aclassify_batch(self, conversations: List[Dict], limiter=None) -> List[Optional[Dict]]:
+        """Classify one packed batch, falling back to single-email prompts for failed items
+        
+        Args:
+            conversations: Conversations of one packed batch
+            limiter: Optional rate limiter; the caller has already waited for the batch
+                request, and each fallback request waits again
+        
+        Returns:
+            Classification per conversation in input order (None where the fallback also failed)
+        """
+        if len(conversations) == 1:
+            return [await self._aclassify_single(conversations[0])]
+        
+        try:
+            output = await self.ainvoke(conversations)
+        except Exception as e:
+            print(f"Error classifying batch of {len(conversations)}: {str(e)}")
+            output = None
+        classifications = (output or {}).get("classifications", {})
+        results = [classifications.get(f"E{n}") for n in range(1, len(conversations) + 1)]
+        
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            print(f"Falling back to single-email classification for {len(missing)} of {len(conversations)} emails")
+            fallback = await asyncio.gather(*[self._aclassify_single(conversations[i], limiter) for i in missing])
+            for i, result in zip(missing, fallback):
+                results[i] = result
+        return results
@@ -1,91 +1,355 @@
 """Pipeline for filtering and classifying emails."""
 
 import json
+import time
+import asyncio
+import hashlib
 import warnings
+from functools import partial
 from pathlib import Path
+from typing import Dict, List, Optional
 from tqdm import tqdm
 from .email_filter import split_conversations_by_message_count
-from .email_classifier import EmailClassifier
+from .email_classifier import EmailClassifier, BatchEmailClassifier
+from .pre_classifier import PreClassifier
+from ..preprocess.pipeline import complete_attachments
+from ..preprocess.attachment_extraction import AttachmentExtractionPool
+from ..preprocess.near_duplicates import CANONICAL_FIELD, near_duplicate_references
+from ..common.records import read_records, resolve_records_path, stage_writer, batched
+from ..common.settings import LLM_MAX_CONCURRENCY, PRE_CLASSIFIER_ENABLED
 
-def run_filter(input_file: str, output_dir: str) -> None:
+CHECKPOINT_FILENAME = 'classification_checkpoint.jsonl'
+
+def _conversation_hash(conversation: Dict) -> str:
+    """Hash a conversation so checkpoints are not reused after its content changes"""
+    serialized = json.dumps(conversation, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+def load_checkpoint(path: Path) -> Dict[str, Dict]:
+    """Load classifications written by a previous run, keyed by conversation hash"""
+    results = {}
+    if not path.exists():
+        return results
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash can leave a partial last line
+                continue
+            results[record['conversation_hash']] = record['classification']
+    return results
+
+class RateLimiter:
+    """Spaces out request starts to stay under a requests-per-minute limit"""
+
+    def __init__(self, requests_per_minute: Optional[int] = None):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_start - now
+            self._next_start = max(now, self._next_start) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+async def classify_conversations(
+    conversations: List[Dict],
+    classifier: EmailClassifier,
+    checkpoint_path: Path,
+    workers: int = LLM_MAX_CONCURRENCY,
+    requests_per_minute: Optional[int] = None,
+    resume: bool = True,
+    checkpoint: Optional[Dict[str, Dict]] = None
+) -> List[Optional[Dict]]:
+    """Classify conversations concurrently, checkpointing each result to disk
+
+    Args:
+        conversations: Conversations to classify
+        classifier: Classifier to run
+        checkpoint_path: JSONL file receiving one line per finished classification
+        workers: Number of classification requests in flight at once
+        requests_per_minute: Optional cap on the request start rate
+        resume: Reuse classifications from an existing checkpoint file
+        checkpoint: Already loaded checkpoint contents; when given the file is not
+            re-read and new results are appended to it
+
+    Returns:
+        Classification results in the same order as the input (None where classification failed)
+    """
+    hashes = [_conversation_hash(conv) for conv in conversations]
+    append = resume or checkpoint is not None
+    if checkpoint is None:
+        checkpoint = load_checkpoint(checkpoint_path) if resume else {}
+    results: List[Optional[Dict]] = [checkpoint.get(h) for h in hashes]
+
+    pending = [i for i, result in enumerate(results) if result is None]
+    if len(pending) < len(conversations):
+        print(f"Resuming: {len(conversations) - len(pending)} conversations already classified")
+    if not pending:
+        return results
+
+    # Batch classifiers get token-packed groups; the single-email classifier one conversation each
+    if isinstance(classifier, BatchEmailClassifier):
+        batches = [
+            [pending[j] for j in batch]
+            for batch in classifier.pack_batches([conversations[i] for i in pending])
+        ]
+    else:
+        batches = [[i] for i in pending]
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for batch in batches:
+        queue.put_nowait(batch)
+
+    limiter = RateLimiter(requests_per_minute)
+    pbar = tqdm(total=len(conversations), initial=len(conversations) - len(pending), ascii=True)
+
+    with open(checkpoint_path, 'a' if append else 'w') as checkpoint_file:
+        async def worker():
+            while True:
+                try:
+                    batch = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                batch_conversations = [conversations[i] for i in batch]
+                try:
+                    await limiter.wait()
+                    if isinstance(classifier, BatchEmailClassifier):
+                        batch_results = await classifier.aclassify_batch(batch_conversations, limiter)
+                    else:
+                        batch_results = [await classifier.ainvoke(batch_conversations[0])]
+                except Exception as e:
+                    ids = ', '.join(conv['ConversationID'] for conv in batch_conversations)
+                    print(f"\nError processing conversation {ids}: {str(e)}")
+                    batch_results = [None] * len(batch)
+
+                for i, result in zip(batch, batch_results):
+                    if not result:
+                        continue
+                    results[i] = result
+                    checkpoint_file.write(json.dumps({
+                        'conversation_id': conversations[i]['ConversationID'],
+                        'conversation_hash': hashes[i],
+                        'classification': result
+                    }) + '\n')
+                checkpoint_file.flush()
+                pbar.update(len(batch))
+
+        await asyncio.gather(*[worker() for _ in range(max(1, workers))])
+    pbar.close()
+    return results
+
+def reuse_duplicate_classifications(
+    conversations: List[Dict],
+    results: List[Optional[Dict]],
+    classifications: Dict[str, Dict]
+) -> int:
+    """Give near-duplicates the classification of their canonical conversation
+
+    Args:
+        conversations: Conversations being classified
+        results: Their results so far, filled in place
+        classifications: Results of canonical conversations, keyed by ConversationID
+
+    Returns:
+        Number of results filled
+    """
+    reused = 0
+    for i, conv in enumerate(conversations):
+        canonical = conv.get(CANONICAL_FIELD)
+        if results[i] is None and canonical in classifications:
+            results[i] = dict(classifications[canonical])
+            reused += 1
+    return reused
+
+async def _classify_pending(
+    conversations: List[Dict],
+    indices: List[int],
+    results: List[Optional[Dict]],
+    pre_classifier: Optional[PreClassifier],
+    classifier: EmailClassifier,
+    checkpoint_path: Path,
+    checkpoint: Dict[str, Dict],
+    workers: int,
+    requests_per_minute: Optional[int]
+) -> int:
+    """Classify conversations[i] for each index, locally where possible; returns the LLM count"""
+    if not indices:
+        return 0
+    if pre_classifier is not None:
+        local_results = await asyncio.to_thread(pre_classifier.classify_batch, [conversations[i] for i in indices])
+        for i, result in zip(indices, local_results):
+            results[i] = result
+    pending = [i for i in indices if results[i] is None]
+    
+    llm_results = await classify_conversations(
+        [conversations[i] for i in pending],
+        classifier,
+        checkpoint_path,
+        workers=workers,
+        requests_per_minute=requests_per_minute,
+        checkpoint=checkpoint
+    )
+    for i, result in zip(pending, llm_results):
+        results[i] = result
+    return len(pending)
+
+def run_filter(
+    input_file: str,
+    output_dir: str,
+    workers: int = LLM_MAX_CONCURRENCY,
+    requests_per_minute: Optional[int] = None,
+    resume: bool = True,
+    use_pre_classifier: bool = PRE_CLASSIFIER_ENABLED,
+    batch_size: int = 1
+) -> None:
     """
     Run the email filtering and classification pipeline.
     
+    Conversations are streamed through in windows of RECORDS_BATCH_SIZE and
+    each window's results are appended to the output files, so memory use
+    does not grow with the size of the input.
+    
     Args:
-        input_file: Name of the input JSON file in the data directory
+        input_file: Name of the input file (.json, .jsonl or .jsonl.zst) in the data directory
         output_dir: Name of the output directory in the data directory
+        workers: Number of conversations classified concurrently
+        requests_per_minute: Optional cap on classification requests per minute
+        resume: Reuse classifications checkpointed by an interrupted run
+        use_pre_classifier: Decide confident cases locally and only send the rest to the LLM
+        batch_size: Emails packed into one classification prompt (1 classifies them one at a time)
     """
     # Suppress warnings
     warnings.filterwarnings('ignore', category=UserWarning)
     
     root_dir = Path(__file__).parent.parent.parent
-    input_path = root_dir / 'data' / input_file
+    input_path = resolve_records_path(root_dir / 'data', input_file)
     output_dir_path = root_dir / 'data' / output_dir
     output_dir_path.mkdir(exist_ok=True)
     
     print("\n=== Starting Email Filter Pipeline ===")
+    print(f"\nStreaming preprocessed conversations from {input_path}")
     
-    # Load preprocessed conversations
-    print(f"\nLoading preprocessed conversations from {input_path}")
-    with open(input_path, 'r') as f:
-        conversations = json.load(f)
-    print(f"Found {len(conversations)} conversations")
+    pre_classifier = PreClassifier.load() if use_pre_classifier else None
+    if batch_size > 1:
+        classifier = BatchEmailClassifier(max_batch_size=batch_size, max_concurrency=workers)
+    else:
+        classifier = EmailClassifier(max_concurrency=workers)
     
-    # Step 1: Split conversations by message count
-    print("\nStep 1: Splitting conversations by message count...")
-    single_conversations, multi_conversations = split_conversations_by_message_count(conversations)
-    print(f"Found {len(single_conversations)} single-message conversations")
-    print(f"Found {len(multi_conversations)} multi-message conversations")
+    checkpoint_path = output_dir_path / CHECKPOINT_FILENAME
+    if not resume:
+        checkpoint_path.unlink(missing_ok=True)
+    checkpoint = load_checkpoint(checkpoint_path)
+    if checkpoint:
+        print(f"Resuming with {len(checkpoint)} checkpointed classifications")
     
-    # Save multi-message conversations
-    multi_msg_path = output_dir_path / 'multi_message_conversations.json'
-    print(f"\nSaving multi-message conversations to {multi_msg_path}")
-    with open(multi_msg_path, 'w') as f:
-        json.dump(multi_conversations, f, indent=2)
+    # Canonical conversations of near-duplicate clusters marked by preprocessing
+    canonical_ids = set(near_duplicate_references(read_records(input_path)))
+    cluster_classifications: Dict[str, Dict] = {}
+    if canonical_ids:
+        print(f"Classifying {len(canonical_ids)} near-duplicate clusters once each")
+    classify = partial(
+        _classify_pending,
+        pre_classifier=pre_classifier,
+        classifier=classifier,
+        checkpoint_path=checkpoint_path,
+        checkpoint=checkpoint,
+        workers=workers,
+        requests_per_minute=requests_per_minute
+    )
     
-    # Step 2: Classify single message conversations
-    print("\nStep 2: Classifying single message conversations...")
-    classifier = EmailClassifier()
+    total = 0
+    failed = 0
+    llm_classified = 0
+    reused = 0
     
-    included = []
-    excluded = []
-    pbar = tqdm(total=len(single_conversations), ascii=True)
-    
-    for conv in single_conversations:
-        try:
-            result = classifier.invoke(conv)
-            if result:
+    async def filter_windows(extraction_pool, multi_writer, included_writer, excluded_writer):
+        """Classify and write every window on one event loop, so the LLM client's
+        connections stay valid; file reads, extraction and writes run in threads"""
+        nonlocal total, failed, llm_classified, reused
+        windows = batched(read_records(input_path))
+        while True:
+            window = await asyncio.to_thread(next, windows, None)
+            if window is None:
+                break
+            total += len(window)
+            single_conversations, multi_conversations = split_conversations_by_message_count(window)
+            
+            # Multi-message conversations skip classification, so they need their full attachments now
+            await asyncio.to_thread(complete_attachments, multi_conversations, extraction_pool)
+            await asyncio.to_thread(multi_writer.write_many, multi_conversations)
+            
+            # Classify single message conversations, each near-duplicate cluster once
+            results: List[Optional[Dict]] = [None] * len(single_conversations)
+            reused += reuse_duplicate_classifications(single_conversations, results, cluster_classifications)
+            # Near-duplicates of a conversation in this window wait for its result
+            window_ids = {conv['ConversationID'] for conv in single_conversations}
+            deferred = [
+                i for i, conv in enumerate(single_conversations)
+                if results[i] is None and conv.get(CANONICAL_FIELD) in window_ids
+            ]
+            deferred_set = set(deferred)
+            llm_classified += await classify(
+                single_conversations,
+                [i for i, result in enumerate(results) if result is None and i not in deferred_set],
+                results
+            )
+            for conv, result in zip(single_conversations, results):
+                if result and conv['ConversationID'] in canonical_ids:
+                    cluster_classifications[conv['ConversationID']] = result
+            reused += reuse_duplicate_classifications(single_conversations, results, cluster_classifications)
+            # Classify the rest on their own if their canonical conversation failed
+            llm_classified += await classify(single_conversations, [i for i in deferred if results[i] is None], results)
+            
+            # Results keep input order, so the output files are deterministic
+            included = []
+            excluded = []
+            for conv, result in zip(single_conversations, results):
+                if not result:
+                    failed += 1
+                    continue
+                entry = {
+                    'conversation_id': conv['ConversationID'],
+                    'conversation': conv,
+                    'classification': result
+                }
                 if result['decision'] == 'INCLUDE':
-                    included.append({
-                        'conversation_id': conv['ConversationID'],
-                        'conversation': conv,
-                        'classification': result
-                    })
+                    included.append(entry)
                 else:
-                    excluded.append({
-                        'conversation_id': conv['ConversationID'],
-                        'conversation': conv,
-                        'classification': result
-                    })
-        except Exception as e:
-            print(f"\nError processing conversation {conv['ConversationID']}: {str(e)}")
-        pbar.update(1)
-    pbar.close()
+                    excluded.append(entry)
+            
+            # Only included conversations need their attachments fully extracted
+            await asyncio.to_thread(complete_attachments, [entry['conversation'] for entry in included], extraction_pool)
+            await asyncio.to_thread(included_writer.write_many, included)
+            await asyncio.to_thread(excluded_writer.write_many, excluded)
     
-    # Save results
-    print("\nStep 3: Saving classification results...")
-    included_path = output_dir_path / 'included_emails.json'
-    print(f"Writing {len(included)} included emails to {included_path}")
-    with open(included_path, 'w') as f:
-        json.dump(included, f, indent=2)
+    start = time.perf_counter()
+    with AttachmentExtractionPool() as extraction_pool, \
+            stage_writer(output_dir_path, 'multi_message_conversations') as multi_writer, \
+            stage_writer(output_dir_path, 'included_emails') as included_writer, \
+            stage_writer(output_dir_path, 'excluded_emails') as excluded_writer:
+        asyncio.run(filter_windows(extraction_pool, multi_writer, included_writer, excluded_writer))
+    elapsed = time.perf_counter() - start
     
-    excluded_path = output_dir_path / 'excluded_emails.json'
-    print(f"Writing {len(excluded)} excluded emails to {excluded_path}")
-    with open(excluded_path, 'w') as f:
-        json.dump(excluded, f, indent=2)
+    if failed:
+        print(f"\n{failed} conversations failed; rerun to retry them (checkpoint kept at {checkpoint_path})")
+    else:
+        checkpoint_path.unlink(missing_ok=True)
     
     print("\n=== Filter Pipeline Complete! ===")
+    print(f"Processed {total} conversations in {elapsed:.1f}s ({llm_classified} sent to the LLM)")
+    if reused:
+        print(f"Near-duplicates classified through their canonical conversation: {reused}")
     print(f"Results saved in: {output_dir_path}")
-    print(f"Multi-message conversations: {len(multi_conversations)}")
-    print(f"Included single-message emails: {len(included)}")
-    print(f"Excluded single-message emails: {len(excluded)}")
+    print(f"Multi-message conversations: {multi_writer.count}")
+    print(f"Included single-message emails: {included_writer.count}")
+    print(f"Excluded single-message emails: {excluded_writer.count}")
+    print(extraction_pool.stats.summary())
+    if pre_classifier is not None:
+        print(pre_classifier.stats.summary())
@@ -0,0 +1,442 @@
+"""Local first-stage classifier that settles obvious emails without the LLM."""
+
+import re
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+from ..common.records import read_records, resolve_records_path
+from ..common.prompt import EMAIL_CLASSIFICATION_CRITERIA
+from ..common.settings import (
+    PRE_CLASSIFIER_MODEL_PATH,
+    PRE_CLASSIFIER_CONFIDENCE,
+    PRE_CLASSIFIER_MIN_EXAMPLES,
+    PRE_CLASSIFIER_EXCLUDE_DOMAINS,
+    PRE_CLASSIFIER_INCLUDE_DOMAINS,
+    PRE_CLASSIFIER_CALENDAR_RULE
+)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9'._-]*[a-z0-9]|[a-z0-9]")
+
+NO_REPLY_PATTERN = re.compile(r"^(no[-_.]?reply|do[-_.]?not[-_.]?reply|notifications?|alerts?)\b")
+BOUNCE_SENDER_PATTERN = re.compile(r"^(mailer[-_.]?daemon|postmaster)\b")
+BOUNCE_SUBJECT_PATTERN = re.compile(
+    r"^(undeliverable|undelivered mail|delivery status notification|mail delivery (failed|failure))",
+    re.IGNORECASE
+)
+CALENDAR_SUBJECT_PATTERN = re.compile(
+    r"^(invitation|updated invitation|accepted|declined|tentative|canceled|cancelled)( event)?:",
+    re.IGNORECASE
+)
+# Invites to these are "Investment Events" and must reach the LLM
+INVESTMENT_EVENT_PATTERN = re.compile(
+    r"\b(earnings|results|investors?|conference|webcast|guidance|shareholders?|analysts?|"
+    r"roadshow|agm|capital markets|fireside|expert call|management meeting)\b",
+    re.IGNORECASE
+)
+ACCOUNT_SUBJECT_PATTERN = re.compile(
+    r"\b(password|verify your|verification code|sign[- ]in|log[- ]?in|security alert|welcome to|"
+    r"your receipt|your order|subscription (confirmed|renewal))\b",
+    re.IGNORECASE
+)
+
+# Category names listed in the classification prompt
+PROMPT_CATEGORIES = frozenset(re.findall(r"^\d+\. (.+?)\s*$", EMAIL_CLASSIFICATION_CRITERIA, re.MULTILINE))
+
+# Calendar invites with a body longer than this may carry an agenda worth reading
+CALENDAR_MAX_BODY_CHARS = 500
+
+def _sender_parts(message: Dict) -> Tuple[str, str]:
+    """Lower-cased local part and domain of the sender address"""
+    address = (message.get('SenderEmail') or '').strip().lower()
+    local, _, domain = address.partition('@')
+    return local, domain
+
+def _domain_matches(domain: str, domains: Iterable[str]) -> bool:
+    """True if domain equals or is a subdomain of one of the listed domains"""
+    return any(domain == d or domain.endswith('.' + d) for d in domains)
+
+def _rule_result(decision: str, category: str, reason: str) -> Dict:
+    return {
+        "thought_process": [reason],
+        "decision": decision,
+        "category": category,
+        "classified_by": "rules"
+    }
+
+def _is_bare_calendar_invite(message: Dict, subject: str) -> bool:
+    """Calendar invite or response with no attachments, little body and no investment-event wording"""
+    body = message.get('Body') or ''
+    return (
+        bool(CALENDAR_SUBJECT_PATTERN.match(subject))
+        and len(body) <= CALENDAR_MAX_BODY_CHARS
+        and not message.get('Attachments')
+        and not INVESTMENT_EVENT_PATTERN.search(subject)
+        and not INVESTMENT_EVENT_PATTERN.search(body)
+    )
+
+def apply_sender_rules(
+    conversation: Dict,
+    exclude_domains: Iterable[str] = PRE_CLASSIFIER_EXCLUDE_DOMAINS,
+    include_domains: Iterable[str] = PRE_CLASSIFIER_INCLUDE_DOMAINS,
+    calendar_rule: bool = PRE_CLASSIFIER_CALENDAR_RULE
+) -> Optional[Dict]:
+    """Classify a conversation from its sender and subject alone
+
+    Args:
+        conversation: Single-message conversation
+        exclude_domains: Sender domains whose emails are always excluded
+        include_domains: Sender domains whose emails are always included
+        calendar_rule: Also exclude bare calendar invites (off by default)
+
+    Returns:
+        Classification in the EmailClassifier output format, or None if no rule applies
+    """
+    message = conversation['Messages'][0]
+    local, domain = _sender_parts(message)
+    subject = (message.get('Subject') or '').strip()
+
+    if domain and _domain_matches(domain, include_domains):
+        return _rule_result("INCLUDE", "Finance-Focused Product/Service Information", f"Sender domain {domain} is on the include list")
+    if domain and _domain_matches(domain, exclude_domains):
+        return _rule_result("EXCLUDE", "Non-Financial Service Emails", f"Sender domain {domain} is on the exclude list")
+
+    if BOUNCE_SENDER_PATTERN.match(local) or BOUNCE_SUBJECT_PATTERN.match(subject):
+        return _rule_result("EXCLUDE", "Email Delivery Failures", "Delivery failure notice")
+
+    if calendar_rule and _is_bare_calendar_invite(message, subject):
+        return _rule_result("EXCLUDE", "Schedule/Reminder Emails", "Calendar invite or response without content")
+
+    if NO_REPLY_PATTERN.match(local) and ACCOUNT_SUBJECT_PATTERN.search(subject):
+        return _rule_result("EXCLUDE", "Security/Account Notifications", "Automated account notification from a no-reply sender")
+
+    return None
+
+def conversation_features(conversation: Dict, max_body_chars: int = 3000) -> List[str]:
+    """Tokens describing a conversation for the local model
+
+    Sender, subject and attachment tokens are prefixed so they are weighted
+    independently of the same words in the body.
+    """
+    message = conversation['Messages'][0]
+    local, domain = _sender_parts(message)
+    features = [f"domain:{domain}", f"noreply:{bool(NO_REPLY_PATTERN.match(local))}"]
+    features += [f"sender:{t}" for t in TOKEN_PATTERN.findall(local)]
+    features += [f"subject:{t}" for t in TOKEN_PATTERN.findall((message.get('Subject') or '').lower())]
+    features += [f"attachment:{a.get('type')}" for a in message.get('Attachments') or []]
+
+    body_tokens = TOKEN_PATTERN.findall((message.get('Body') or '')[:max_body_chars].lower())
+    features += body_tokens
+    features += [f"{a} {b}" for a, b in zip(body_tokens, body_tokens[1:])]
+    return features
+
+class TfidfLogisticModel:
+    """TF-IDF over hashed tokens followed by L2-regularized logistic regression
+
+    The category of a decision is the nearest TF-IDF centroid among the LLM
+    categories seen with that decision in training. Implemented with numpy so
+    the filter stage needs no extra dependencies.
+    """
+
+    def __init__(self, n_features: int = 2 ** 18, l2: float = 1e-4):
+        self.n_features = n_features
+        self.l2 = l2
+        self.idf = np.ones(n_features, dtype=np.float32)
+        self.weights = np.zeros(n_features, dtype=np.float32)
+        self.bias = 0.0
+        self.categories: List[str] = []
+        self.category_labels = np.zeros(0, dtype=np.int8)
+        self.centroids = np.zeros((0, n_features), dtype=np.float32)
+
+    def _hash(self, token: str) -> int:
+        # crc32 is stable across processes, unlike hash()
+        return zlib.crc32(token.encode('utf-8')) % self.n_features
+
+    def _term_counts(self, documents: List[List[str]]):
+        """Sparse term counts as CSR arrays (indptr, indices, data)"""
+        indptr = [0]
+        indices = []
+        data = []
+        for tokens in documents:
+            counts: Dict[int, int] = {}
+            for token in tokens:
+                index = self._hash(token)
+                counts[index] = counts.get(index, 0) + 1
+            indices.extend(counts.keys())
+            data.extend(counts.values())
+            indptr.append(len(indices))
+        return (
+            np.asarray(indptr, dtype=np.int64),
+            np.asarray(indices, dtype=np.int64),
+            np.asarray(data, dtype=np.float32)
+        )
+
+    def _transform(self, documents: List[List[str]]):
+        """Sublinear TF-IDF rows, L2-normalized"""
+        indptr, indices, data = self._term_counts(documents)
+        values = (1.0 + np.log(data)) * self.idf[indices]
+        row_ids = np.repeat(np.arange(len(documents)), np.diff(indptr))
+        norms = np.sqrt(np.bincount(row_ids, weights=values ** 2, minlength=len(documents)))
+        values = values / np.maximum(norms[row_ids], 1e-12)
+        return row_ids, indices, values.astype(np.float32)
+
+    def _decision(self, row_ids, indices, values, n_rows: int, weights=None, bias=None) -> np.ndarray:
+        weights = self.weights if weights is None else weights
+        bias = self.bias if bias is None else bias
+        return np.bincount(row_ids, weights=values * weights[indices], minlength=n_rows) + bias
+
+    def _loss(self, decision: np.ndarray, y: np.ndarray, weights: np.ndarray) -> float:
+        """Mean logistic loss plus the L2 penalty"""
+        log_loss = float(np.mean(np.logaddexp(0.0, decision) - y * decision))
+        return log_loss + 0.5 * self.l2 * float(np.dot(weights, weights))
+
+    def fit(
+        self,
+        documents: List[List[str]],
+        labels: List[int],
+        categories: Optional[List[Optional[str]]] = None,
+        epochs: int = 300,
+        learning_rate: float = 20.0,
+        tolerance: float = 1e-6
+    ):
+        """Fit the model on tokenized documents with 1 = INCLUDE and 0 = EXCLUDE
+
+        Gradient descent halves the step size whenever a step would increase the
+        loss, and stops early once an epoch improves the loss by less than
+        tolerance (relative).
+
+        Args:
+            documents: Tokenized documents
+            labels: 1 = INCLUDE, 0 = EXCLUDE for each document
+            categories: LLM category of each document; names not in the prompt are ignored
+            epochs: Maximum gradient steps
+            learning_rate: Initial step size
+            tolerance: Minimum relative loss improvement per epoch
+        """
+        y = np.asarray(labels, dtype=np.float64)
+        n_rows = len(documents)
+
+        _, indices, _ = self._term_counts(documents)
+        # Document frequency counts each hashed term once per document
+        document_frequency = np.bincount(indices, minlength=self.n_features)
+        self.idf = (np.log((1 + n_rows) / (1 + document_frequency)) + 1).astype(np.float32)
+
+        row_ids, indices, values = self._transform(documents)
+        self.weights = np.zeros(self.n_features, dtype=np.float32)
+        self.bias = 0.0
+        decision = self._decision(row_ids, indices, values, n_rows)
+        loss = self._loss(decision, y, self.weights)
+        for _ in range(epochs):
+            error = (1.0 / (1.0 + np.exp(-decision)) - y) / n_rows
+            gradient = np.bincount(indices, weights=values * error[row_ids], minlength=self.n_features)
+            gradient = (gradient + self.l2 * self.weights).astype(np.float32)
+            while True:
+                weights = self.weights - learning_rate * gradient
+                bias = self.bias - learning_rate * float(error.sum())
+                new_decision = self._decision(row_ids, indices, values, n_rows, weights, bias)
+                new_loss = self._loss(new_decision, y, weights)
+                if new_loss <= loss or learning_rate < 1e-8:
+                    break
+                learning_rate /= 2
+            self.weights, self.bias, decision = weights, bias, new_decision
+            improvement = loss - new_loss
+            loss = new_loss
+            if improvement <= tolerance * max(loss, 1e-12):
+                break
+
+        self._fit_categories(row_ids, indices, values, labels, categories or [])
+        return self
+
+    def _fit_categories(self, row_ids, indices, values, labels: List[int], categories: List[Optional[str]]):
+        """L2-normalized TF-IDF centroid of each prompt category seen in training"""
+        names = sorted({c for c in categories if c in PROMPT_CATEGORIES})
+        self.categories = names
+        self.category_labels = np.zeros(len(names), dtype=np.int8)
+        self.centroids = np.zeros((len(names), self.n_features), dtype=np.float32)
+        for c, name in enumerate(names):
+            rows = np.array([i for i, category in enumerate(categories) if category == name])
+            mask = np.isin(row_ids, rows)
+            centroid = np.bincount(indices[mask], weights=values[mask], minlength=self.n_features)
+            self.centroids[c] = centroid / max(np.linalg.norm(centroid), 1e-12)
+            # A category belongs to the decision most of its examples received
+            self.category_labels[c] = int(np.mean([labels[i] for i in rows]) >= 0.5)
+
+    def predict_categories(self, documents: List[List[str]], labels: List[int]) -> List[Optional[str]]:
+        """Nearest training category with the given decision for each document (None if there is none)"""
+        row_ids, indices, values = self._transform(documents)
+        results: List[Optional[str]] = []
+        scores = np.stack([
+            np.bincount(row_ids, weights=values * centroid[indices], minlength=len(documents))
+            for centroid in self.centroids
+        ]) if self.categories else np.zeros((0, len(documents)))
+        for i, label in enumerate(labels):
+            candidates = np.flatnonzero(self.category_labels == label)
+            if not len(candidates):
+                results.append(None)
+                continue
+            results.append(self.categories[candidates[np.argmax(scores[candidates, i])]])
+        return results
+
+    def predict_proba(self, documents: List[List[str]]) -> np.ndarray:
+        """Probability of INCLUDE for each document"""
+        row_ids, indices, values = self._transform(documents)
+        return 1.0 / (1.0 + np.exp(-self._decision(row_ids, indices, values, len(documents))))
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(
+            path, idf=self.idf, weights=self.weights, bias=np.float64(self.bias), l2=np.float64(self.l2),
+            categories=np.array(self.categories, dtype=str), category_labels=self.category_labels, centroids=self.centroids
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "TfidfLogisticModel":
+        with np.load(path) as data:
+            model = cls(n_features=len(data['weights']), l2=float(data['l2']))
+            model.idf = data['idf']
+            model.weights = data['weights']
+            model.bias = float(data['bias'])
+            if 'categories' in data:
+                model.categories = [str(c) for c in data['categories']]
+                model.category_labels = data['category_labels']
+                model.centroids = data['centroids']
+        return model
+
+@dataclass
+class PreClassifierStats:
+    """Counts of how each conversation in a run was classified"""
+    total: int = 0
+    by_rules: int = 0
+    by_model: int = 0
+    forwarded: int = 0
+
+    @property
+    def llm_calls_saved(self) -> int:
+        return self.by_rules + self.by_model
+
+    def summary(self) -> str:
+        saved_pct = 100 * self.llm_calls_saved / self.total if self.total else 0.0
+        return (
+            f"Pre-classifier: {self.by_rules} by rules, {self.by_model} by model, "
+            f"{self.forwarded} forwarded to the LLM ({self.llm_calls_saved} LLM calls saved, {saved_pct:.1f}%)"
+        )
+
+class PreClassifier:
+    """Decides high-confidence conversations locally and forwards the rest to the LLM"""
+
+    def __init__(
+        self,
+        model: Optional[TfidfLogisticModel] = None,
+        confidence: float = PRE_CLASSIFIER_CONFIDENCE,
+        use_rules: bool = True
+    ):
+        """Initialize the pre-classifier
+
+        Args:
+            model: Trained text model (rules only when None)
+            confidence: Minimum model probability for a local INCLUDE or EXCLUDE decision
+            use_rules: Apply the sender-domain rules before the model
+        """
+        self.model = model
+        self.confidence = confidence
+        self.use_rules = use_rules
+        self.stats = PreClassifierStats()
+
+    @classmethod
+    def load(cls, path: str = PRE_CLASSIFIER_MODEL_PATH, **kwargs) -> "PreClassifier":
+        """Load the trained model if one exists, otherwise run with rules only"""
+        path = Path(path)
+        model = TfidfLogisticModel.load(path) if path.exists() else None
+        if model is None:
+            print(f"No pre-classifier model at {path}; using sender rules only")
+        return cls(model=model, **kwargs)
+
+    def classify_batch(self, conversations: List[Dict]) -> List[Optional[Dict]]:
+        """Classify what can be decided locally
+
+        Args:
+            conversations: Single-message conversations
+
+        Returns:
+            One classification per conversation, None where the LLM must decide
+        """
+        results: List[Optional[Dict]] = [
+            apply_sender_rules(conv) if self.use_rules else None for conv in conversations
+        ]
+        self.stats.total += len(conversations)
+        self.stats.by_rules += sum(1 for r in results if r is not None)
+
+        undecided = [i for i, r in enumerate(results) if r is None]
+        if self.model is not None and undecided:
+            features = [conversation_features(conversations[i]) for i in undecided]
+            probabilities = self.model.predict_proba(features)
+            confident = [j for j, p in enumerate(probabilities) if p >= self.confidence or p <= 1 - self.confidence]
+            categories = self.model.predict_categories(
+                [features[j] for j in confident], [int(probabilities[j] >= 0.5) for j in confident]
+            )
+            for j, category in zip(confident, categories):
+                if category is None:
+                    # No category learned for this decision; the LLM decides
+                    continue
+                p = float(probabilities[j])
+                decision, confidence = ("INCLUDE", p) if p >= 0.5 else ("EXCLUDE", 1 - p)
+                results[undecided[j]] = {
+                    "thought_process": [f"Local model is {confidence:.1%} confident in {decision}"],
+                    "decision": decision,
+                    "category": category,
+                    "classified_by": "model",
+                    "confidence": confidence
+                }
+                self.stats.by_model += 1
+
+        self.stats.forwarded += sum(1 for r in results if r is None)
+        return results
+
+def load_training_examples(output_dir: Path) -> Tuple[List[Dict], List[int], List[Optional[str]]]:
+    """LLM decisions from a previous filter run as (conversations, labels, categories)
+
+    Decisions made by the pre-classifier itself are skipped so the model only
+    learns from LLM labels.
+    """
+    conversations, labels, categories = [], [], []
+    for stem, label in [('included_emails', 1), ('excluded_emails', 0)]:
+        try:
+            path = resolve_records_path(output_dir, stem)
+        except FileNotFoundError:
+            continue
+        for entry in read_records(path):
+            if entry['classification'].get('classified_by'):
+                continue
+            conversations.append(entry['conversation'])
+            labels.append(label)
+            categories.append(entry['classification'].get('category'))
+    return conversations, labels, categories
+
+def train_pre_classifier(
+    output_dir: Path,
+    model_path: str = PRE_CLASSIFIER_MODEL_PATH,
+    min_examples: int = PRE_CLASSIFIER_MIN_EXAMPLES
+) -> Optional[TfidfLogisticModel]:
+    """Train the local model on previous LLM decisions and save it
+
+    Args:
+        output_dir: Filter output directory holding the included/excluded_emails records
+        model_path: Where to save the trained model
+        min_examples: Minimum examples of each class required to train
+
+    Returns:
+        The trained model, or None if there was not enough data
+    """
+    conversations, labels, categories = load_training_examples(output_dir)
+    included = sum(labels)
+    excluded = len(labels) - included
+    if min(included, excluded) < min_examples:
+        print(f"Not training pre-classifier: need {min_examples} examples of each class, have {included} INCLUDE / {excluded} EXCLUDE")
+        return None
+
+    model = TfidfLogisticModel().fit([conversation_features(conv) for conv in conversations], labels, categories)
+    model.save(Path(model_path))
+    print(f"Trained pre-classifier on {included} INCLUDE / {excluded} EXCLUDE decisions, saved to {model_path}")
+    return model
@@ -1,7 +1,8 @@
 """Build context from retrieved conversations for LLM generation."""
-from typing import Dict, List, Tuple
+from typing import Dict, List, Tuple, Optional
 from dataclasses import dataclass
 from ..retrieval.schema import RetrievalResult
+from ..retrieval.processor import ConversationProcessor, get_group_field
 
 @dataclass
 class GenerationContext:
@@ -15,11 +16,20 @@ class GenerationContext:
     num_truncated_chunks: int  # Chunks that were truncated
 
 class ContextBuilder:
-    def __init__(self, max_tokens: int = 6000):
+    def __init__(self, max_tokens: int = 6000, processor: Optional[ConversationProcessor] = None):
         self.max_tokens = max_tokens
         self.top_chunk_length = 3000
         self.bottom_chunk_length = 300
         self.max_conversations = 15  # Maximum number of conversations to include
+        self.hydration_batch_size = 5  # Lazy conversations fetched per request
+        self._processor = processor
+    
+    @property
+    def processor(self) -> ConversationProcessor:
+        """Processor used to hydrate lazy conversation groups (created on first use)"""
+        if self._processor is None:
+            self._processor = ConversationProcessor()
+        return self._processor
     
     def _format_chunk(self, chunk: Dict, show_metadata: bool = True, length: int = None) -> Tuple[str, str]:
         """Format a chunk with optional metadata and length limit
@@ -41,6 +51,9 @@ class ContextBuilder:
                 f"[Date: {metadata.get('year', 'N/A')}-{metadata.get('month', 'N/A')}-{metadata.get('day', 'N/A')}]",
                 f"[Chunk: {chunk_id}]"
             ])
+            duplicate_ids = metadata.get('duplicate_conversation_ids')
+            if duplicate_ids:
+                formatted.insert(-1, f"[Also received as {len(duplicate_ids)} near-identical emails]")
         else:
             formatted.append(f"[Chunk: {chunk_id}]")
         
@@ -96,13 +109,17 @@ class ContextBuilder:
         return total_tokens, chunk_stats
     
     def build(self, result: RetrievalResult) -> GenerationContext:
-        """Build context from retrieval result with adaptive length"""
+        """Build context from retrieval result with adaptive length
+        
+        Lazy conversation groups are hydrated here, and only those that are
+        considered for packing are fetched.
+        """
         # Start with top conversations by score
         # Sort conversations by max chunk score
         sorted_convs = sorted(
             result.conversation_groups.values(),
             key=lambda c: max((chunk.get('combined_score', chunk.get('vector_score', 0)) 
-                            for chunk in c.get('chunks', [])), default=0),
+                            for chunk in get_group_field(c, 'chunks', [])), default=0),
             reverse=True
         )
         
@@ -113,8 +130,13 @@ class ContextBuilder:
         all_chunk_stats = []
         
         # First pass - estimate tokens and collect stats
-        for i, conv in enumerate(sorted_convs, 1):
-            conv_tokens, chunk_stats = self._estimate_conversation_tokens(conv.get('chunks', []))
+        for i, conv in enumerate(sorted_convs):
+            if not get_group_field(conv, 'hydrated', True):
+                # Fetch the next few candidates together, never more than can still be packed
+                remaining = self.max_conversations - len(conversations_to_use)
+                self.processor.hydrate(sorted_convs[i:i + min(remaining, self.hydration_batch_size)])
+            
+            conv_tokens, chunk_stats = self._estimate_conversation_tokens(get_group_field(conv, 'chunks', []))
             conv_tokens += header_tokens
             
             if total_tokens + conv_tokens > self.max_tokens:
@@ -133,7 +155,7 @@ class ContextBuilder:
         
         for i, conv in enumerate(conversations_to_use, 1):
             # First ensure email_body comes first
-            chunks = conv.get('chunks', [])
+            chunks = get_group_field(conv, 'chunks', [])
             email_body = [c for c in chunks if c['metadata'].get('chunk_type') == 'email_body']
             others = [c for c in chunks if c['metadata'].get('chunk_type') != 'email_body']
             chunks = email_body + sorted(others, key=lambda c: c.get('combined_score', 0), reverse=True)
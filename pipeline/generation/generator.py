@@ -1,20 +1,31 @@
 """Generator for answering questions using email context."""
 from typing import Dict, List, Optional
+from contextvars import ContextVar
 from datetime import datetime
 import json
 from ..common.base_agent import BaseAgent
 from pipeline.common.prompt import GENERATOR_PROMPT_TEMPLATE 
 from pipeline.common.example_messages import get_generator_messages
 
+# Input of the call being validated; a context variable so concurrent calls each see their own
+_current_input: ContextVar[Optional[Dict]] = ContextVar('generator_input', default=None)
+
 class Generator(BaseAgent):
-    def __init__(self):
-        super().__init__()
-        self._current_input = None
-        
     def _run(self, input_data: Dict, max_retries: int = 3) -> Optional[Dict]:
-        """Store input_data for validation and call parent's _run"""
-        self._current_input = input_data
-        return super()._run(input_data, max_retries)
+        """Make input_data available to validation and call parent's _run"""
+        token = _current_input.set(input_data)
+        try:
+            return super()._run(input_data, max_retries)
+        finally:
+            _current_input.reset(token)
+
+    async def _arun(self, input_data: Dict, max_retries: int = 3) -> Optional[Dict]:
+        """Make input_data available to validation and call parent's _arun"""
+        token = _current_input.set(input_data)
+        try:
+            return await super()._arun(input_data, max_retries)
+        finally:
+            _current_input.reset(token)
         
     def get_example_messages(self) -> List[Dict[str, str]]:
         """Return example messages showing how to answer email questions."""
@@ -52,9 +63,10 @@ class Generator(BaseAgent):
                 print("answer must be a dictionary")
                 return None
                 
-            # Validate chunk IDs using stored input_data
-            if self._current_input and 'context' in self._current_input:
-                available_chunks = set(self._current_input['context'].chunk_ids)
+            # Validate chunk IDs against the input of this call
+            input_data = _current_input.get()
+            if input_data and 'context' in input_data:
+                available_chunks = set(input_data['context'].chunk_ids)
                 for chunk_id in parsed["answer"].keys():
                     try:
                         # Ensure chunk_id is numeric
@@ -59,7 +59,7 @@ def run_full_pipeline(
     )
     
     # 2. Build context
-    builder = ContextBuilder(max_tokens=max_tokens)
+    builder = ContextBuilder(max_tokens=max_tokens, processor=pipeline.processor)
     context = builder.build(result)
     
     # 3. Generate response
@@ -90,7 +90,7 @@ def process_results(
     processor = ConversationProcessor()
     
     # Group conversations
-    conversation_groups = processor.group_conversations(retrieval_output["results"])
+    conversation_groups = processor.group_conversations(retrieval_output["results"], lazy=True)
     
     # Create result object
     result = RetrievalResult(query=retrieval_output["query"])
@@ -0,0 +1,310 @@
+"""Attachment extraction in isolated worker processes."""
+
+import os
+import time
+import multiprocessing
+from multiprocessing.connection import wait
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .attachment_processor import DocumentProcessor
+from ..common.extraction_cache import ExtractionCache, ExtractionCacheStats, file_sha256, get_default_extraction_cache
+from ..common.settings import ATTACHMENT_WORKERS, ATTACHMENT_TIMEOUT_SECONDS, ATTACHMENT_MAX_RSS_MB
+
+SUPPORTED_ATTACHMENT_TYPES = ['.pdf', '.docx', '.xlsx']
+
+# How often the parent checks worker deadlines and memory
+POLL_INTERVAL_SECONDS = 0.2
+
+def _data_dir() -> Path:
+    return Path(__file__).parent.parent.parent / 'data'
+
+def resolve_attachment_path(attachment: str) -> Path:
+    """Absolute path of an attachment stored relative to the data directory"""
+    path_parts = attachment.replace('\\', '/').split('/')
+    return _data_dir() / '/'.join(path_parts)
+
+def _error_entry(attachment: str, message: str) -> Dict:
+    error_msg = f"Error processing {attachment}: {message}"
+    print(f"\nError: {error_msg}")
+    return {
+        'path': attachment,
+        'type': Path(attachment).suffix.lower(),
+        'error': error_msg
+    }
+
+def process_attachment(doc_processor: DocumentProcessor, attachment: str, preview: bool = False) -> Dict:
+    """
+    Extract one attachment into the dictionary stored under a message's 'Attachments'.
+
+    Args:
+        doc_processor: Processor used for extraction
+        attachment: Attachment path relative to the data directory
+        preview: Extract only the beginning of the document
+
+    Returns:
+        Attachment entry with 'content' and 'metadata', or 'error' if extraction failed
+    """
+    ext = Path(attachment).suffix.lower()
+    try:
+        full_path = resolve_attachment_path(attachment)
+
+        if not full_path.exists():
+            raise FileNotFoundError(f"File does not exist: {full_path}")
+
+        if preview:
+            processed_docs = [doc_processor.preview_document(str(full_path))]
+        else:
+            processed_docs = list(doc_processor.process_document(str(full_path)))
+        combined_content = "\n\n".join(doc.content for doc in processed_docs)
+
+        return {
+            'path': attachment,
+            'type': ext,
+            'content': combined_content,
+            'metadata': [doc.metadata for doc in processed_docs],
+            'preview': preview
+        }
+    except Exception as e:
+        return _error_entry(attachment, str(e))
+
+def _worker_main(conn, preview: bool):
+    """Worker loop: receive (index, attachment), send back (index, entry)"""
+    doc_processor = DocumentProcessor()
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        index, attachment = task
+        conn.send((index, process_attachment(doc_processor, attachment, preview)))
+
+def _rss_mb(pid: int) -> Optional[float]:
+    """Resident set size of a process in MB (None where /proc is unavailable)"""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+class _Worker:
+    """One extraction process and the task it is working on"""
+
+    def __init__(self, context, preview: bool):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, preview), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.task: Optional[Tuple[int, str]] = None
+        self.started = 0.0
+
+    def submit(self, index: int, attachment: str):
+        self.task = (index, attachment)
+        self.started = time.monotonic()
+        self.conn.send(self.task)
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, BrokenPipeError):
+            pass
+        self.process.join(timeout=1)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+class AttachmentExtractionPool:
+    """Extracts attachments in worker processes with a per-file timeout and memory cap
+
+    A worker that exceeds the timeout or RSS limit, or crashes, is killed and
+    replaced; the attachment it was working on gets an 'error' entry like any
+    other extraction failure.
+
+    Example:
+        >>> with AttachmentExtractionPool(workers=4) as pool:
+        ...     for entry in pool.imap(attachment_paths):
+        ...         print(entry['path'], 'error' in entry)
+    """
+
+    def __init__(
+        self,
+        workers: int = ATTACHMENT_WORKERS,
+        timeout: Optional[float] = ATTACHMENT_TIMEOUT_SECONDS,
+        max_rss_mb: Optional[float] = ATTACHMENT_MAX_RSS_MB,
+        preview: bool = False,
+        cache: Optional[ExtractionCache] = None,
+        use_cache: bool = True
+    ):
+        """Initialize the pool
+
+        Args:
+            workers: Number of worker processes (0 extracts in the calling process, without limits)
+            timeout: Wall-clock seconds allowed per file (None for no limit)
+            max_rss_mb: Resident memory allowed per worker in MB (None for no limit)
+            preview: Extract previews instead of full documents
+            cache: Extraction cache (defaults to the cache configured in settings)
+            use_cache: Set to False to always extract
+        """
+        self.workers = max(0, workers)
+        self.timeout = timeout
+        self.max_rss_mb = max_rss_mb
+        self.preview = preview
+        self.cache = (cache or get_default_extraction_cache()) if use_cache else None
+        self.stats = ExtractionCacheStats()
+        self._namespace = DocumentProcessor().cache_namespace(preview)
+        self._context = multiprocessing.get_context()
+        self._pool: List[_Worker] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for worker in self._pool:
+            worker.stop()
+        self._pool = []
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        worker.kill()
+        replacement = _Worker(self._context, self.preview)
+        self._pool[self._pool.index(worker)] = replacement
+        return replacement
+
+    def _check_limits(self, worker: _Worker) -> Optional[str]:
+        """Reason to kill a busy worker, or None if it is within its limits"""
+        if not worker.process.is_alive():
+            return f"extraction process exited with code {worker.process.exitcode}"
+        if self.timeout is not None and time.monotonic() - worker.started > self.timeout:
+            return f"extraction timed out after {self.timeout:g}s"
+        if self.max_rss_mb is not None:
+            rss = _rss_mb(worker.process.pid)
+            if rss is not None and rss > self.max_rss_mb:
+                return f"extraction exceeded memory limit ({rss:.0f} MB > {self.max_rss_mb:.0f} MB)"
+        return None
+
+    def _cache_key(self, attachment: str) -> Optional[str]:
+        """Content-addressed cache key for an attachment (None if the file cannot be read)"""
+        try:
+            file_hash = file_sha256(resolve_attachment_path(attachment))
+        except OSError:
+            return None
+        return ExtractionCache.make_key(file_hash, self._namespace)
+
+    def _from_cache(self, attachment: str, cached: Dict) -> Dict:
+        """Attachment entry for this path built from a cached or duplicate extraction"""
+        full_path = resolve_attachment_path(attachment)
+        metadata = []
+        for doc_metadata in cached['metadata']:
+            doc_metadata = dict(doc_metadata)
+            if 'source' in doc_metadata:
+                doc_metadata['source'] = str(full_path)
+            if 'file_path' in doc_metadata:
+                doc_metadata['file_path'] = str(full_path)
+            if 'file_name' in doc_metadata:
+                doc_metadata['file_name'] = full_path.name
+            metadata.append(doc_metadata)
+        return {
+            'path': attachment,
+            'type': Path(attachment).suffix.lower(),
+            'content': cached['content'],
+            'metadata': metadata,
+            'preview': self.preview
+        }
+
+    def imap(self, attachments: Iterable[str]) -> Iterator[Dict]:
+        """Extract attachments, yielding entries in input order as soon as they are ready
+
+        Files already in the extraction cache, and repeats of a file earlier in
+        the same input, are served without extracting them again.
+        """
+        attachments = list(attachments)
+        keys = [self._cache_key(attachment) for attachment in attachments]
+        known: Dict[str, Dict] = self.cache.get_many([k for k in keys if k]) if self.cache else {}
+
+        cached_keys = set(known)
+
+        # Extract only the first occurrence of each file that is not cached
+        to_extract = []
+        seen = set(known)
+        for index, key in enumerate(keys):
+            if key is None or key not in seen:
+                to_extract.append(index)
+                if key is not None:
+                    seen.add(key)
+        extracted = self._extract_ordered([attachments[i] for i in to_extract])
+
+        pending = set(to_extract)
+        for index, (attachment, key) in enumerate(zip(attachments, keys)):
+            if index in pending:
+                entry = next(extracted)
+                self.stats.extracted += 1
+                if key is not None and 'error' not in entry:
+                    known[key] = {'content': entry['content'], 'metadata': entry['metadata']}
+                    if self.cache:
+                        self.cache.put(key, entry['content'], entry['metadata'])
+                yield entry
+            elif key in known:
+                if key in cached_keys:
+                    self.stats.hits += 1
+                else:
+                    self.stats.duplicates += 1
+                yield self._from_cache(attachment, known[key])
+            else:
+                # The first copy of this file failed to extract
+                yield _error_entry(attachment, "extraction of an identical file failed")
+
+    def _extract_ordered(self, attachments: List[str]) -> Iterator[Dict]:
+        """Extract attachments in the worker pool, yielding entries in input order"""
+        if self.workers == 0:
+            doc_processor = DocumentProcessor()
+            for attachment in attachments:
+                yield process_attachment(doc_processor, attachment, self.preview)
+            return
+
+        tasks = iter(enumerate(attachments))
+        exhausted = False
+        finished: Dict[int, Dict] = {}
+        next_index = 0
+        while len(self._pool) < self.workers:
+            self._pool.append(_Worker(self._context, self.preview))
+
+        while True:
+            # Keep every idle worker busy
+            for worker in self._pool:
+                if worker.task is None and not exhausted:
+                    task = next(tasks, None)
+                    if task is None:
+                        exhausted = True
+                    else:
+                        worker.submit(*task)
+
+            busy = [worker for worker in self._pool if worker.task is not None]
+            if not busy and exhausted:
+                break
+
+            ready = wait([worker.conn for worker in busy], timeout=POLL_INTERVAL_SECONDS)
+            for worker in busy:
+                index, attachment = worker.task
+                if worker.conn in ready:
+                    try:
+                        result_index, entry = worker.conn.recv()
+                        finished[result_index] = entry
+                        worker.task = None
+                        continue
+                    except (EOFError, OSError):
+                        # The worker died mid-task; _check_limits reports why
+                        worker.process.join(timeout=1)
+                reason = self._check_limits(worker)
+                if reason:
+                    finished[index] = _error_entry(attachment, reason)
+                    self._replace(worker)
+
+            while next_index in finished:
+                yield finished.pop(next_index)
+                next_index += 1
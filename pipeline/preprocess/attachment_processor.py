@@ -1,12 +1,78 @@
 from pathlib import Path
-from typing import Generator, Dict, Any
+from typing import Generator, Dict, Any, Iterator, List, Optional, Tuple
 from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
 import re
-from langchain_community.document_loaders import PyMuPDFLoader, TextLoader
-from docx import Document
+import zipfile
+import multiprocessing
+from lxml import etree
 import openpyxl
+import pymupdf
 import os
 
+from ..common.settings import (
+    ATTACHMENT_PREVIEW_CHARS,
+    ATTACHMENT_PREVIEW_ROWS,
+    ATTACHMENT_MAX_ROWS,
+    ATTACHMENT_MAX_CELLS,
+    ATTACHMENT_MAX_TEXT_BYTES,
+    PDF_PAGE_WORKERS,
+    PDF_PARALLEL_MIN_PAGES
+)
+
+# WordprocessingML element names used by the streaming DOCX reader
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+W_P, W_R, W_T, W_TBL, W_TR, W_TC = (f'{_W}p', f'{_W}r', f'{_W}t', f'{_W}tbl', f'{_W}tr', f'{_W}tc')
+# Run children rendered as text, like python-docx's Run.text
+W_RUN_TEXT = {f'{_W}tab': '\t', f'{_W}ptab': '\t', f'{_W}cr': '\n', f'{_W}noBreakHyphen': '-'}
+W_BR, W_BR_TYPE = f'{_W}br', f'{_W}type'
+
+def _extract_pdf_range(path: str, start: int, end: int) -> List[str]:
+    """Cleaned text of pages [start, end) of a PDF (runs in a page worker process)"""
+    processor = DocumentProcessor()
+    with pymupdf.open(path) as doc:
+        return [processor._clean_text(doc[i].get_text()) for i in range(start, end)]
+
+@dataclass
+class ExtractionLimits:
+    """Caps that end a spreadsheet or Word extraction early (None disables a cap)"""
+    max_rows: Optional[int] = ATTACHMENT_MAX_ROWS
+    max_cells: Optional[int] = ATTACHMENT_MAX_CELLS
+    max_bytes: Optional[int] = ATTACHMENT_MAX_TEXT_BYTES
+
+class _TextBudget:
+    """Collects extracted lines until one of the limits is reached"""
+
+    def __init__(self, limits: ExtractionLimits):
+        self.limits = limits
+        self.lines: List[str] = []
+        self.rows = 0
+        self.cells = 0
+        self.bytes = 0
+        self.truncated: Optional[str] = None
+
+    def add_row(self, cell_count: int) -> bool:
+        """Count a table row; False once the row or cell cap is exceeded"""
+        self.rows += 1
+        self.cells += cell_count
+        if self.limits.max_rows is not None and self.rows > self.limits.max_rows:
+            self.truncated = f"row limit ({self.limits.max_rows})"
+        elif self.limits.max_cells is not None and self.cells > self.limits.max_cells:
+            self.truncated = f"cell limit ({self.limits.max_cells})"
+        return self.truncated is None
+
+    def add_line(self, line: str) -> bool:
+        """Keep a line of text; False once the byte cap is exceeded"""
+        self.bytes += len(line.encode('utf-8')) + 1
+        if self.limits.max_bytes is not None and self.bytes > self.limits.max_bytes:
+            self.truncated = f"text limit ({self.limits.max_bytes} bytes)"
+            return False
+        self.lines.append(line)
+        return True
+
+    def text(self) -> str:
+        return '\n'.join(self.lines)
+
 @dataclass
 class ProcessedDocument:
     """Represents a processed document with its content and metadata"""
@@ -24,6 +90,11 @@ class DocumentProcessor:
         # '.msg': 'Email Message'
     }
 
+    # Bump when the text produced by the loaders changes (invalidates the extraction cache)
+    EXTRACTOR_VERSION = "3"
+    # Bump when _clean_text or REDUNDANT_PATTERNS change
+    CLEANING_VERSION = "1"
+
     # Headers that appear on every page that we want to remove
     REDUNDANT_PATTERNS = [
         r'Proprietary & Confidential\. Do Not Distribute\.',
@@ -33,13 +104,21 @@ class DocumentProcessor:
         r'^[A-Z\s]+$',  # Standalone uppercase words like "HEALTHCARE"
     ]
     
-    def __init__(self, base_dir: str = None):
+    def __init__(self, base_dir: str = None, page_workers: int = PDF_PAGE_WORKERS):
         """Initialize the document processor
         
         Args:
             base_dir: Base directory for relative paths. If None, use absolute paths.
+            page_workers: Processes extracting page ranges of PDFs with at least
+                PDF_PARALLEL_MIN_PAGES pages (1 extracts pages sequentially)
         """
         self.base_dir = Path(base_dir) if base_dir else None
+        self.page_workers = max(1, page_workers)
+    
+    def cache_namespace(self, preview: bool = False) -> str:
+        """Extraction cache namespace for the current extractor, cleaning rules and mode"""
+        mode = f"preview-{ATTACHMENT_PREVIEW_CHARS}-{ATTACHMENT_PREVIEW_ROWS}" if preview else "full"
+        return f"x{self.EXTRACTOR_VERSION}-c{self.CLEANING_VERSION}-{mode}"
     
     def _get_full_path(self, path: str) -> Path:
         """Get full path from potentially relative path"""
@@ -111,74 +190,285 @@ class DocumentProcessor:
         
         return text.strip()
     
-    def _get_loader_from_extension(self, extension: str, path: str):
-        """Get appropriate document loader based on file extension"""
-        if extension == '.pdf':
-            return PyMuPDFLoader(path)
-        elif extension == '.docx':
-            return self._load_docx(path)
-        elif extension == '.xlsx':
-            return self._load_xlsx(path)
-        else:
-            # Fallback to text loader
-            return TextLoader(path)
-    
-    def _load_docx(self, path: str):
-        """Load a DOCX file and return its content"""
-        doc = Document(path)
-        paragraphs = []
+    def _pdf_metadata(self, doc, path: str) -> Dict[str, Any]:
+        """Document-level PDF metadata (title, author, ...) with the file path and page count"""
+        metadata = {k: v for k, v in (doc.metadata or {}).items() if v}
+        metadata.update({'file_path': path, 'total_pages': doc.page_count})
+        return metadata
+
+    def _page_ranges(self, page_count: int) -> List[Tuple[int, int]]:
+        """Split pages into contiguous ranges, two per worker so slow pages even out"""
+        parts = min(page_count, self.page_workers * 2)
+        bounds = [page_count * i // parts for i in range(parts + 1)]
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def _iter_pdf_pages(self, path: str, page_count: int) -> Iterator[str]:
+        """Cleaned text of each page in order, from page workers when the PDF is large"""
+        # Extraction pool workers are daemonic and cannot start page workers; they
+        # already run one file per process
+        parallel = (
+            self.page_workers > 1
+            and page_count >= PDF_PARALLEL_MIN_PAGES
+            and not multiprocessing.current_process().daemon
+        )
+        if not parallel:
+            with pymupdf.open(path) as doc:
+                for page in doc:
+                    yield self._clean_text(page.get_text())
+            return
+
+        ranges = self._page_ranges(page_count)
+        with ProcessPoolExecutor(max_workers=min(self.page_workers, len(ranges))) as executor:
+            starts, ends = zip(*ranges)
+            for texts in executor.map(_extract_pdf_range, [path] * len(ranges), starts, ends):
+                yield from texts
+
+    def _load_pdf(self, path: str) -> Tuple[str, Dict[str, Any]]:
+        """Load a PDF page by page, cleaning each page as it arrives
         
-        # Process paragraphs
-        for para in doc.paragraphs:
-            if para.text.strip():
-                paragraphs.append(para.text)
+        Returns:
+            The text and metadata; metadata['page_offsets'][i] is the character
+            offset in the text where page i + 1 starts
+        """
+        with pymupdf.open(path) as doc:
+            metadata = self._pdf_metadata(doc, path)
+        
+        pages = []
+        offsets = []
+        length = 0
+        for text in self._iter_pdf_pages(path, metadata['total_pages']):
+            # Pages are separated by a blank line; an empty page starts where the next one will
+            start = length + 2 if pages else 0
+            offsets.append(start)
+            if text:
+                pages.append(text)
+                length = start + len(text)
+        metadata['page_offsets'] = offsets
+        return '\n\n'.join(pages), metadata
+
+    def _iter_docx(self, path: str) -> Iterator[Tuple[str, Any]]:
+        """Stream a DOCX body as ('paragraph', text) and ('row', [cell texts]) items in document order
         
-        # Process tables
-        for table in doc.tables:
-            for row in table.rows:
-                row_text = []
-                for cell in row.cells:
-                    if cell.text.strip():
-                        row_text.append(cell.text.strip())
-                if row_text:
-                    paragraphs.append('\t'.join(row_text))
+        word/document.xml is parsed with iterparse and every finished paragraph or
+        table row is cleared from the tree, so memory does not grow with the file.
+        Like python-docx, text boxes and nested tables are skipped, and a cell's
+        text is its paragraphs joined by newlines.
+        """
+        with zipfile.ZipFile(path) as archive, archive.open('word/document.xml') as source:
+            table_depth = 0
+            paragraph_depth = 0
+            paragraph: List[str] = []
+            cell: List[str] = []
+            row: List[str] = []
+            events = etree.iterparse(source, events=('start', 'end'), resolve_entities=False, no_network=True)
+            for event, elem in events:
+                tag = elem.tag
+                if event == 'start':
+                    if tag == W_P:
+                        paragraph_depth += 1
+                        if paragraph_depth == 1:
+                            paragraph = []
+                    elif tag == W_TBL:
+                        table_depth += 1
+                    elif tag == W_TR and table_depth == 1:
+                        row = []
+                    elif tag == W_TC and table_depth == 1:
+                        cell = []
+                    continue
+                
+                # Runs of the outermost paragraph only (text boxes hold nested paragraphs)
+                if paragraph_depth == 1 and table_depth <= 1 and elem.getparent().tag == W_R:
+                    if tag == W_T:
+                        paragraph.append(elem.text or '')
+                    elif tag in W_RUN_TEXT:
+                        paragraph.append(W_RUN_TEXT[tag])
+                    elif tag == W_BR and elem.get(W_BR_TYPE, 'textWrapping') == 'textWrapping':
+                        paragraph.append('\n')
+                
+                if tag == W_P:
+                    paragraph_depth -= 1
+                    if paragraph_depth == 0:
+                        if table_depth == 0:
+                            yield 'paragraph', ''.join(paragraph)
+                            self._release(elem)
+                        elif table_depth == 1:
+                            cell.append(''.join(paragraph))
+                elif tag == W_TC and table_depth == 1:
+                    row.append('\n'.join(cell))
+                elif tag == W_TR and table_depth == 1:
+                    yield 'row', row
+                    self._release(elem)
+                elif tag == W_TBL:
+                    table_depth -= 1
+                    if table_depth == 0:
+                        self._release(elem)
+    
+    @staticmethod
+    def _release(elem):
+        """Free a parsed element and the siblings before it"""
+        elem.clear()
+        parent = elem.getparent()
+        if parent is not None:
+            while elem.getprevious() is not None:
+                del parent[0]
+    
+    def _load_docx(self, path: str, limits: Optional[ExtractionLimits] = None) -> Tuple[str, Optional[str]]:
+        """Load a DOCX file's paragraphs and table rows
         
-        return '\n'.join(paragraphs)
+        Returns:
+            The text, and the reason it was truncated (None if complete)
+        """
+        budget = _TextBudget(limits or ExtractionLimits())
+        for kind, value in self._iter_docx(path):
+            if kind == 'paragraph':
+                if value.strip() and not budget.add_line(value):
+                    break
+            else:
+                if not budget.add_row(len(value)):
+                    break
+                row_text = [text.strip() for text in value if text.strip()]
+                if row_text and not budget.add_line('\t'.join(row_text)):
+                    break
+        return budget.text(), budget.truncated
+
+    def _iter_xlsx(self, path: str) -> Iterator[Tuple[str, Any]]:
+        """Stream a workbook as ('sheet', title) and ('row', values) items using openpyxl's read-only mode"""
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            for sheet in workbook.worksheets:
+                # Stated dimensions are often wrong and pad every row to the last used column
+                sheet.reset_dimensions()
+                yield 'sheet', sheet.title
+                for row in sheet.iter_rows(values_only=True):
+                    yield 'row', row
+        finally:
+            workbook.close()
 
-    def _load_xlsx(self, path: str):
-        """Load an Excel file and return its content"""
-        workbook = openpyxl.load_workbook(path, data_only=True)
-        sheets_text = []
+    def _load_xlsx(self, path: str, limits: Optional[ExtractionLimits] = None) -> Tuple[str, Optional[str]]:
+        """Load an Excel file's non-empty rows, sheet by sheet
         
-        for sheet in workbook.worksheets:
-            # Get sheet name
-            sheet_name = sheet.title
-            sheets_text.append(f"Sheet: {sheet_name}")
-            sheets_text.append("-" * 40)
+        Returns:
+            The text, and the reason it was truncated (None if complete)
+        """
+        budget = _TextBudget(limits or ExtractionLimits())
+        sheet_has_rows = False
+        for kind, value in self._iter_xlsx(path):
+            if kind == 'sheet':
+                if sheet_has_rows:
+                    budget.lines.append("")  # Add space between sheets
+                sheet_has_rows = False
+                if not budget.add_line(f"Sheet: {value}") or not budget.add_line("-" * 40):
+                    break
+                continue
             
-            # Process cells
-            rows_text = []
-            max_col = sheet.max_column
-            for row in sheet.iter_rows():
-                row_text = []
-                for cell in row[:max_col]:
-                    value = cell.value
-                    if value is not None:
-                        # Convert numbers to strings with proper formatting
-                        if isinstance(value, (int, float)):
-                            if isinstance(value, int) or value.is_integer():
-                                value = f"{int(value):,}"
-                            else:
-                                value = f"{value:,.2f}"
-                        row_text.append(str(value))
-                if any(text.strip() for text in row_text):
-                    rows_text.append('\t'.join(row_text))
+            row_text = [self._format_cell(cell) for cell in value if cell is not None]
+            if not any(text.strip() for text in row_text):
+                continue
+            if not budget.add_row(len(value)) or not budget.add_line('\t'.join(row_text)):
+                break
+            sheet_has_rows = True
+        if sheet_has_rows:
+            budget.lines.append("")
+        return budget.text(), budget.truncated
+
+    def _format_cell(self, value) -> str:
+        """Format a cell value, with thousands separators for numbers"""
+        if isinstance(value, (int, float)):
+            if isinstance(value, int) or value.is_integer():
+                return f"{int(value):,}"
+            return f"{value:,.2f}"
+        return str(value)
+
+    def _preview_pdf(self, path: str, max_chars: int):
+        """Text of the first pages of a PDF, stopping once max_chars is reached"""
+        with pymupdf.open(path) as doc:
+            texts = []
+            length = 0
+            for page in doc:
+                text = page.get_text()
+                texts.append(text)
+                length += len(text)
+                if length >= max_chars:
+                    break
+            metadata = self._pdf_metadata(doc, path)
+            metadata['preview_pages'] = len(texts)
+        return '\n'.join(texts), metadata
+
+    def _preview_docx(self, path: str, max_chars: int) -> str:
+        """Leading paragraphs and table rows of a DOCX file up to max_chars"""
+        lines = []
+        length = 0
+        for kind, value in self._iter_docx(path):
+            text = value if kind == 'paragraph' else '\t'.join(t.strip() for t in value if t.strip())
+            if text.strip():
+                lines.append(text)
+                length += len(text)
+                if length >= max_chars:
+                    break
+        return '\n'.join(lines)
+
+    def _preview_xlsx(self, path: str, max_rows: int) -> str:
+        """First rows of the first sheet of an Excel file"""
+        rows_text = []
+        rows_read = 0
+        for kind, value in self._iter_xlsx(path):
+            if kind == 'sheet':
+                if rows_text:
+                    break
+                rows_text = [f"Sheet: {value}", "-" * 40]
+                continue
+            rows_read += 1
+            if rows_read > max_rows:
+                break
+            row_text = [self._format_cell(cell) for cell in value if cell is not None]
+            if any(text.strip() for text in row_text):
+                rows_text.append('\t'.join(row_text))
+        return '\n'.join(rows_text)
+
+    def preview_document(
+        self,
+        path: str,
+        max_chars: int = ATTACHMENT_PREVIEW_CHARS,
+        max_rows: int = ATTACHMENT_PREVIEW_ROWS
+    ) -> ProcessedDocument:
+        """Extract only the beginning of a document, enough to classify the email it came with
+        
+        Args:
+            path: Path to the document
+            max_chars: Maximum characters of PDF/DOCX text to keep
+            max_rows: Number of rows read from the first sheet of a spreadsheet
             
-            if rows_text:
-                sheets_text.extend(rows_text)
-                sheets_text.append("")  # Add space between sheets
+        Returns:
+            ProcessedDocument with the preview text; metadata['preview'] is True
+        """
+        full_path = self._get_full_path(path)
+        
+        if not full_path.exists():
+            raise FileNotFoundError(f"File not found: {full_path}")
+        
+        extension = full_path.suffix.lower()
+        if extension not in self.SUPPORTED_EXTENSIONS:
+            raise ValueError(f"Unsupported file type: {extension}")
+        
+        metadata = {}
+        if extension == '.pdf':
+            content, metadata = self._preview_pdf(str(full_path), max_chars)
+        elif extension == '.docx':
+            content = self._preview_docx(str(full_path), max_chars)
+        else:
+            content = self._preview_xlsx(str(full_path), max_rows)
         
-        return '\n'.join(sheets_text)
+        metadata.update({
+            'extension': extension,
+            'source': str(full_path),
+            'file_name': full_path.name,
+            'document_type': self.SUPPORTED_EXTENSIONS[extension],
+            'preview': True
+        })
+        return ProcessedDocument(
+            content=self._clean_text(content)[:max_chars],
+            metadata=metadata
+        )
 
     def process_document(self, path: str) -> Generator[ProcessedDocument, None, None]:
         """Process a document and yield ProcessedDocument objects
@@ -194,6 +484,7 @@ class DocumentProcessor:
             >>> docs = list(processor.process_document("path/to/document.pdf"))
             >>> print(f"Content: {docs[0].content}")
             >>> print(f"Pages: {docs[0].metadata['total_pages']}")
+            >>> print(f"Page 2 starts at: {docs[0].metadata['page_offsets'][1]}")
         """
         full_path = self._get_full_path(path)
         
@@ -204,36 +495,28 @@ class DocumentProcessor:
         if extension not in self.SUPPORTED_EXTENSIONS:
             raise ValueError(f"Unsupported file type: {extension}")
         
-        loader = self._get_loader_from_extension(extension, str(full_path))
-        
+        truncated = None
+        metadata = {}
         if extension == '.docx':
-            content = loader
+            content, truncated = self._load_docx(str(full_path))
+            content = self._clean_text(content)
         elif extension == '.xlsx':
-            content = loader
+            content, truncated = self._load_xlsx(str(full_path))
+            content = self._clean_text(content)
         else:
-            # Load all pages
-            pages = list(loader.lazy_load())
-            if not pages:
+            # Pages are cleaned one at a time
+            content, metadata = self._load_pdf(str(full_path))
+            if not metadata['total_pages']:
                 return
-            
-            # Combine content from all pages
-            content = '\n'.join(page.page_content for page in pages)
-        
-        content = self._clean_text(content)
         
-        # Use metadata from first page, but include total pages
-        metadata = {}
-        if extension != '.docx' and extension != '.xlsx':
-            metadata = pages[0].metadata.copy()
         metadata.update({
             'extension': extension,
             'source': str(full_path),
             'file_name': full_path.name,
             'document_type': self.SUPPORTED_EXTENSIONS[extension],
         })
-        
-        if extension != '.docx' and extension != '.xlsx':
-            metadata['total_pages'] = len(pages)
+        if truncated:
+            metadata['truncated'] = truncated
         
         yield ProcessedDocument(
             content=content,
@@ -5,29 +5,76 @@ import json
 from pathlib import Path
 from typing import Dict, List, Optional
 from bs4 import BeautifulSoup
+import lxml.html
+from lxml import etree
 import logging
 
+from ..common.settings import EMAIL_HTML_PARSER
+
 logger = logging.getLogger(__name__)
 
+# Markup that makes html.parser change the text: tags, comments, declarations and entities.
+# Bodies without any of these are returned unchanged by the parser, so parsing is skipped.
+HTML_SNIFF_PATTERN = re.compile(r'<[a-zA-Z!/?]|&')
+
 class EmailPreprocessor:
     """Preprocesses email content for better classification and RAG processing."""
     
-    def __init__(self):
+    def __init__(self, html_parser: str = EMAIL_HTML_PARSER):
+        """Initialize the preprocessor
+        
+        Args:
+            html_parser: 'html.parser' (default) or 'lxml'. lxml is several times faster on
+                HTML bodies but treats stray '<' and whitespace-only text differently, so
+                its output is not identical to html.parser's.
+        """
+        if html_parser not in ('html.parser', 'lxml'):
+            raise ValueError(f"Unsupported HTML parser: {html_parser}")
+        self.html_parser = html_parser
+        
         # Common patterns to clean
         self.url_pattern = re.compile(r'<https?://[^>]+>')
+        self.tracking_url_pattern = re.compile(r'https?://\S*tracking\S+')
         self.email_pattern = re.compile(r'[\w\.-]+@[\w\.-]+\.\w+')
         self.quote_pattern = re.compile(r'^>.*$', re.MULTILINE)
-        self.signature_pattern = re.compile(r'(-{2,}|\_{2,}|={2,}|Best regards|Sincerely|Thanks|Thank you|BR,|Best,).*', re.DOTALL | re.IGNORECASE)
+        # Everything from the first match on is signature, so a search and a slice replace the old .* DOTALL sub
+        self.signature_pattern = re.compile(r'-{2,}|\_{2,}|={2,}|Best regards|Sincerely|Thanks|Thank you|BR,|Best,', re.IGNORECASE)
         self.thread_pattern = re.compile(r'On.*wrote:|From:.*Sent:|To:.*Subject:', re.MULTILINE | re.IGNORECASE)
-        
-        # Unicode patterns
-        self.zero_width_chars = re.compile(r'[\u200B-\u200F\u202A-\u202E\uFEFF]')
-        self.special_spaces = re.compile(r'[\xa0\u2000-\u200A\u202F\u205F\u3000]')
+        self.comment_pattern = re.compile(r'<!--.*?-->', re.DOTALL)
+        
+        # Formatting patterns
+        self.bullet_pattern = re.compile(r'^\s*[-*•]\s+', re.MULTILINE)
+        self.exclamation_pattern = re.compile(r'!+')
+        self.repeated_word_pattern = re.compile(r'(\b\w+\b)( \1\b)+')
+        
+        # Whitespace patterns
+        self.newlines_pattern = re.compile(r'[\r\n]+')
+        self.spaces_pattern = re.compile(r' {2,}')
+        self.paragraph_pattern = re.compile(r'\n\s*\n')
+        
+        # Zero-width characters are dropped; special spaces and tabs become spaces
+        # (tab runs collapse with the other spaces afterwards)
+        self.whitespace_table = {ord('\t'): ' '}
+        for start, end in [(0x200B, 0x200F), (0x202A, 0x202E), (0xFEFF, 0xFEFF)]:
+            self.whitespace_table.update({code: None for code in range(start, end + 1)})
+        for start, end in [(0xA0, 0xA0), (0x2000, 0x200A), (0x202F, 0x202F), (0x205F, 0x205F), (0x3000, 0x3000)]:
+            self.whitespace_table.update({code: ' ' for code in range(start, end + 1)})
         
     def clean_html(self, text: str) -> str:
         """Remove HTML tags while preserving important text."""
         if not text:
             return ""
+        
+        # Plain text comes out of the parser unchanged
+        if not HTML_SNIFF_PATTERN.search(text):
+            return text
+        
+        if self.html_parser == 'lxml':
+            try:
+                return self._clean_html_lxml(text)
+            except (etree.ParserError, ValueError):
+                # Empty documents and text lxml cannot represent go through html.parser
+                pass
             
         # First extract text with BeautifulSoup
         soup = BeautifulSoup(text, "html.parser")
@@ -40,30 +87,38 @@ class EmailPreprocessor:
         text = soup.get_text()
         
         # Remove HTML comments
-        text = re.sub(r'<!--.*?-->', '', text, flags=re.DOTALL)
+        if '<!--' in text:
+            text = self.comment_pattern.sub('', text)
         
         return text
+    
+    def _clean_html_lxml(self, text: str) -> str:
+        """clean_html using lxml directly instead of building a BeautifulSoup tree"""
+        root = lxml.html.document_fromstring(text)
+        for element in list(root.iter('script', 'style')):
+            element.drop_tree()
+        text = root.text_content()
+        if '<!--' in text:
+            text = self.comment_pattern.sub('', text)
+        return text
         
     def normalize_whitespace(self, text: str) -> str:
         """Normalize all forms of whitespace."""
         if not text:
             return ""
             
-        # Replace zero-width and special space characters
-        text = self.zero_width_chars.sub('', text)
-        text = self.special_spaces.sub(' ', text)
+        # Drop zero-width characters and turn special spaces and tabs into spaces in one pass
+        text = text.translate(self.whitespace_table)
         
         # Normalize newlines
-        text = re.sub(r'[\r\n]+', '\n', text)
-        
-        # Remove tabs
-        text = re.sub(r'\t+', ' ', text)
+        text = self.newlines_pattern.sub('\n', text)
         
         # Normalize multiple spaces
-        text = re.sub(r' {2,}', ' ', text)
+        if '  ' in text:
+            text = self.spaces_pattern.sub(' ', text)
         
         # Ensure paragraphs are preserved with double newlines
-        text = re.sub(r'\n\s*\n', '\n\n', text)
+        text = self.paragraph_pattern.sub('\n\n', text)
         
         return text.strip()
         
@@ -73,13 +128,16 @@ class EmailPreprocessor:
             return ""
             
         # Replace URLs with <URL> placeholder
-        text = self.url_pattern.sub('<URL>', text)
+        if '<http' in text:
+            text = self.url_pattern.sub('<URL>', text)
         
         # Replace tracking URLs
-        text = re.sub(r'https?://\S*tracking\S+', '', text)
+        if 'tracking' in text:
+            text = self.tracking_url_pattern.sub('', text)
         
         # Replace email addresses with <EMAIL> placeholder
-        text = self.email_pattern.sub('<EMAIL>', text)
+        if '@' in text:
+            text = self.email_pattern.sub('<EMAIL>', text)
         
         return text
         
@@ -89,13 +147,17 @@ class EmailPreprocessor:
             return ""
             
         # Remove quoted text
-        text = self.quote_pattern.sub('', text)
+        if '>' in text:
+            text = self.quote_pattern.sub('', text)
         
         # Remove signatures
-        text = self.signature_pattern.sub('', text)
+        signature = self.signature_pattern.search(text)
+        if signature:
+            text = text[:signature.start()]
         
         # Remove thread markers
-        text = self.thread_pattern.sub('', text)
+        if ':' in text:
+            text = self.thread_pattern.sub('', text)
         
         return text
         
@@ -105,13 +167,15 @@ class EmailPreprocessor:
             return ""
             
         # Normalize bullet points
-        text = re.sub(r'^\s*[-*•]\s+', '- ', text, flags=re.MULTILINE)
+        if '-' in text or '*' in text or '•' in text:
+            text = self.bullet_pattern.sub('- ', text)
         
         # Normalize exclamation marks
-        text = re.sub(r'!+', '.', text)
+        if '!' in text:
+            text = self.exclamation_pattern.sub('.', text)
         
         # Remove repeated words (possible template artifacts)
-        text = re.sub(r'(\b\w+\b)( \1\b)+', r'\1', text)
+        text = self.repeated_word_pattern.sub(r'\1', text)
         
         return text
         
@@ -0,0 +1,201 @@
+"""Near-duplicate detection for broadcast emails using MinHash signatures and LSH buckets.
+
+The same newsletter or research note often reaches the inbox in many separate
+conversations. Preprocessing indexes every single-message conversation and marks
+near-duplicates of an earlier conversation with CANONICAL_FIELD, so the filter
+classifies each cluster once and chunking embeds it once. Attachments are only
+previews at this stage, so chunking still embeds attachments whose full text
+differs from the canonical conversation's.
+"""
+import re
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set
+import numpy as np
+
+from ..common.settings import (
+    NEAR_DUP_THRESHOLD, NEAR_DUP_NUM_PERM, NEAR_DUP_BANDS, NEAR_DUP_SHINGLE_WORDS, NEAR_DUP_MIN_WORDS
+)
+
+# Set on a conversation that near-duplicates an earlier one: the earlier conversation's ID
+CANONICAL_FIELD = 'CanonicalConversationID'
+# Set by chunking on a canonical conversation: the IDs of its near-duplicates
+REFERENCES_FIELD = 'NearDuplicateConversationIDs'
+
+WORD_PATTERN = re.compile(r'\w+')
+
+_SHIFT = np.uint64(32)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_SHINGLE_BASE = np.uint64(1000003)
+# Shingles hashed per block, bounding the (shingles x permutations) matrix
+_BLOCK_SIZE = 4096
+
+def conversation_text(conversation: Dict) -> str:
+    """Message bodies and extracted attachment text of a conversation"""
+    parts = []
+    for message in conversation['Messages']:
+        parts.append(message.get('Body') or '')
+        for attachment in message.get('Attachments') or []:
+            parts.append(attachment.get('content') or '')
+    return '\n'.join(parts)
+
+class MinHasher:
+    """MinHash signatures over word shingles
+
+    Each permutation is a multiply-shift hash ((a * x + b) mod 2**64) >> 32 of a
+    32-bit shingle hash built from CRC32s of its words, so signatures are
+    identical across processes and runs.
+    """
+
+    def __init__(self, num_perm: int = NEAR_DUP_NUM_PERM, shingle_words: int = NEAR_DUP_SHINGLE_WORDS, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.shingle_words = shingle_words
+        # Odd multipliers for multiply-shift hashing
+        self._a = rng.randint(0, np.iinfo(np.uint64).max, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.randint(0, np.iinfo(np.uint64).max, size=num_perm, dtype=np.uint64)
+
+    def shingle_hashes(self, words: List[str]) -> np.ndarray:
+        """32-bit hashes of the distinct runs of shingle_words words
+
+        Words are hashed once and combined into shingle hashes with a polynomial
+        rolled over the whole array (uint64 arithmetic wraps around).
+        """
+        vocabulary = {word: zlib.crc32(word.encode('utf-8')) for word in set(words)}
+        word_hashes = np.fromiter(map(vocabulary.__getitem__, words), dtype=np.uint64, count=len(words))
+        k = min(self.shingle_words, len(words))
+        count = len(words) - k + 1
+        shingles = np.zeros(count, dtype=np.uint64)
+        for offset in range(k):
+            shingles = shingles * _SHINGLE_BASE + word_hashes[offset:offset + count]
+        return np.unique((shingles >> _SHIFT) ^ (shingles & _MAX_HASH))
+
+    def signature(self, words: List[str]) -> np.ndarray:
+        """Minimum of each permutation over the shingles of a word list"""
+        hashes = self.shingle_hashes(words)
+        signature = np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        for start in range(0, len(hashes), _BLOCK_SIZE):
+            block = hashes[start:start + _BLOCK_SIZE]
+            values = (np.outer(block, self._a) + self._b) >> _SHIFT
+            np.minimum(signature, values.min(axis=0), out=signature)
+        return signature.astype(np.uint32)
+
+@dataclass
+class NearDuplicateStats:
+    """Dedup ratios of one run"""
+    documents: int = 0
+    too_short: int = 0
+    duplicates: int = 0
+    clusters: int = 0
+
+    @property
+    def dedup_ratio(self) -> float:
+        indexed = self.documents - self.too_short
+        return self.duplicates / indexed if indexed else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"Near-duplicates: {self.duplicates} of {self.documents - self.too_short} indexed conversations "
+            f"({100 * self.dedup_ratio:.1f}%) repeat an earlier one, in {self.clusters} clusters "
+            f"({self.too_short} too short to compare)"
+        )
+
+class NearDuplicateIndex:
+    """Streaming near-duplicate index with LSH banding
+
+    Only canonical documents (the first of each cluster) are stored; a new
+    document is a near-duplicate when an LSH candidate's estimated Jaccard
+    similarity reaches the threshold, and then maps straight to that canonical.
+
+    Example:
+        >>> index = NearDuplicateIndex()
+        >>> for conv in conversations:
+        ...     canonical = index.add(conv['ConversationID'], conversation_text(conv))
+        >>> print(index.stats.summary())
+    """
+
+    def __init__(
+        self,
+        threshold: float = NEAR_DUP_THRESHOLD,
+        num_perm: int = NEAR_DUP_NUM_PERM,
+        bands: int = NEAR_DUP_BANDS,
+        shingle_words: int = NEAR_DUP_SHINGLE_WORDS,
+        min_words: int = NEAR_DUP_MIN_WORDS
+    ):
+        """Initialize the index
+
+        Args:
+            threshold: Minimum estimated Jaccard similarity of word shingles for a near-duplicate
+            num_perm: MinHash permutations per signature (must be divisible by bands)
+            bands: LSH bands; more bands find candidates at lower similarity
+            shingle_words: Words per shingle
+            min_words: Shorter documents are not indexed, so short replies never cluster
+        """
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.min_words = min_words
+        self.hasher = MinHasher(num_perm, shingle_words)
+        self.stats = NearDuplicateStats()
+        self._buckets: List[Dict[bytes, List[str]]] = [{} for _ in range(bands)]
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._clustered: Set[str] = set()
+
+    def query(self, signature: np.ndarray) -> Optional[str]:
+        """Most similar canonical document at or above the threshold"""
+        best_key = None
+        best_similarity = self.threshold
+        checked = set()
+        for band in range(self.bands):
+            band_key = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            for key in self._buckets[band].get(band_key, ()):
+                if key in checked:
+                    continue
+                checked.add(key)
+                similarity = float(np.mean(self._signatures[key] == signature))
+                if similarity >= best_similarity:
+                    best_key, best_similarity = key, similarity
+        return best_key
+
+    def add(self, key: str, text: str) -> Optional[str]:
+        """Index a document
+
+        Args:
+            key: Document ID (e.g. ConversationID)
+            text: Document text
+
+        Returns:
+            Key of the canonical document this one near-duplicates, or None if it is
+            new (it then becomes canonical for later documents) or too short
+        """
+        self.stats.documents += 1
+        words = WORD_PATTERN.findall(text.lower())
+        if len(words) < self.min_words:
+            self.stats.too_short += 1
+            return None
+
+        signature = self.hasher.signature(words)
+        canonical = self.query(signature)
+        if canonical is not None:
+            self.stats.duplicates += 1
+            if canonical not in self._clustered:
+                self._clustered.add(canonical)
+                self.stats.clusters += 1
+            return canonical
+
+        self._signatures[key] = signature
+        for band in range(self.bands):
+            band_key = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            self._buckets[band].setdefault(band_key, []).append(key)
+        return None
+
+def near_duplicate_references(conversations: Iterable[Dict]) -> Dict[str, List[str]]:
+    """Near-duplicate conversation IDs grouped by their canonical conversation ID"""
+    references: Dict[str, List[str]] = {}
+    for conversation in conversations:
+        canonical = conversation.get(CANONICAL_FIELD)
+        if canonical:
+            references.setdefault(canonical, []).append(conversation['ConversationID'])
+    return references
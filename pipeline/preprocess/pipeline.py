@@ -1,115 +1,181 @@
 """Pipeline for preprocessing email content and attachments."""
 
-import json
 import warnings
 from pathlib import Path
+from typing import Dict, List, Tuple
 from tqdm import tqdm
 from .email_preprocessor import EmailPreprocessor
-from .attachment_processor import DocumentProcessor
+from .attachment_extraction import AttachmentExtractionPool, SUPPORTED_ATTACHMENT_TYPES
+from .near_duplicates import NearDuplicateIndex, CANONICAL_FIELD, conversation_text
+from ..common.settings import ATTACHMENT_WORKERS, NEAR_DUP_ENABLED
+from ..common.records import read_records, resolve_records_path, stage_writer, batched
 
-def run_preprocess(input_file: str = "email_conversations.json") -> None:
+def _data_dir() -> Path:
+    return Path(__file__).parent.parent.parent / 'data'
+
+def extract_attachments(conversations: List[Dict], pool: AttachmentExtractionPool) -> Tuple[int, int]:
+    """
+    Fill each message's 'Attachments' from its 'AttachmentFiles'.
+    
+    Args:
+        conversations: Conversations to update in place
+        pool: Extraction pool (its preview setting decides preview or full extraction)
+        
+    Returns:
+        (processed_count, error_count)
+    """
+    messages = [msg for conv in conversations for msg in conv['Messages']]
+    for msg in messages:
+        msg['Attachments'] = []
+    tasks = [
+        (msg, attachment)
+        for msg in messages
+        for attachment in msg['AttachmentFiles'] or []
+        if Path(attachment).suffix.lower() in SUPPORTED_ATTACHMENT_TYPES
+    ]
+    
+    processed_count = 0
+    error_count = 0
+    entries = pool.imap(attachment for _, attachment in tasks)
+    # Entries come back in input order, so attachments keep their original order
+    for (msg, _), entry in zip(tasks, entries):
+        msg['Attachments'].append(entry)
+        if 'error' in entry:
+            error_count += 1
+        else:
+            processed_count += 1
+    return processed_count, error_count
+
+def complete_attachments(conversations: List[Dict], pool: AttachmentExtractionPool) -> Tuple[int, int]:
+    """
+    Replace attachment previews with full extractions.
+    
+    Run this on conversations that passed classification; attachments that
+    are already fully extracted (or failed) are left untouched.
+    
+    Args:
+        conversations: Conversations to update in place
+        pool: Extraction pool created with preview=False
+        
+    Returns:
+        (processed_count, error_count)
+    """
+    pending = [
+        (msg, idx)
+        for conv in conversations
+        for msg in conv['Messages']
+        for idx, attachment in enumerate(msg.get('Attachments') or [])
+        if attachment.get('preview')
+    ]
+    if not pending:
+        return 0, 0
+    
+    processed_count = 0
+    error_count = 0
+    entries = pool.imap(msg['Attachments'][idx]['path'] for msg, idx in pending)
+    for (msg, idx), entry in zip(pending, entries):
+        msg['Attachments'][idx] = entry
+        if 'error' in entry:
+            error_count += 1
+        else:
+            processed_count += 1
+    return processed_count, error_count
+
+def preprocess_conversation(preprocessor: EmailPreprocessor, conv: Dict) -> Dict:
+    """Copy of a conversation with every message body cleaned"""
+    processed_conv = conv.copy()
+    processed_messages = []
+    
+    for msg in conv['Messages']:
+        processed_msg = msg.copy()
+        processed_msg['Body'] = preprocessor.preprocess_email_body(msg['Body'])
+        processed_messages.append(processed_msg)
+        
+    processed_conv['Messages'] = processed_messages
+    return processed_conv
+
+def mark_near_duplicates(conversations: List[Dict], index: NearDuplicateIndex) -> int:
+    """
+    Set CANONICAL_FIELD on single-message conversations that near-duplicate an earlier one.
+    
+    Only single-message conversations are indexed: they are the ones the filter
+    classifies one by one and that end up embedded from included_emails.
+    
+    Args:
+        conversations: Conversations with cleaned bodies and extracted attachments, updated in place
+        index: Index holding the conversations seen so far in this run
+        
+    Returns:
+        Number of conversations marked as near-duplicates
+    """
+    marked = 0
+    for conv in conversations:
+        conv.pop(CANONICAL_FIELD, None)
+        if len(conv['Messages']) != 1:
+            continue
+        canonical = index.add(conv['ConversationID'], conversation_text(conv))
+        if canonical is not None:
+            conv[CANONICAL_FIELD] = canonical
+            marked += 1
+    return marked
+
+def run_preprocess(
+    input_file: str = "email_conversations",
+    full_attachments: bool = False,
+    workers: int = ATTACHMENT_WORKERS,
+    near_duplicates: bool = NEAR_DUP_ENABLED
+) -> None:
     """
     Run the preprocessing pipeline that handles both email body and attachments.
     
+    Conversations are streamed through in batches, so memory use does not grow
+    with the size of the inbox. By default attachments are only previewed
+    (first page, first rows); the filter pipeline fully extracts them for
+    conversations it includes.
+    
     Args:
-        input_file: Name of the input JSON file in the data directory
+        input_file: Name of the input file (.json, .jsonl or .jsonl.zst) in the data directory
+        full_attachments: Fully extract every attachment up front
+        workers: Number of attachment extraction processes
+        near_duplicates: Mark near-duplicate broadcast emails so later stages handle each cluster once
     """
     # Suppress warnings
     warnings.filterwarnings('ignore', category=UserWarning)
     warnings.filterwarnings('ignore', module='bs4')
     
-    root_dir = Path(__file__).parent.parent.parent
-    input_path = root_dir / 'data' / input_file
-    output_path = root_dir / 'data' / 'preprocessed_email_conversations.json'
+    input_path = resolve_records_path(_data_dir(), input_file)
     
     print("\n=== Starting Email Preprocessing Pipeline ===")
+    print(f"\nStreaming conversations from {input_path}")
     
-    # Load conversations
-    print(f"\nLoading conversations from {input_path}")
-    with open(input_path, 'r', encoding='utf-8') as f:
-        conversations = json.load(f)
-    print(f"Found {len(conversations)} conversations")
-    
-    # Step 1: Preprocess email body content
-    print("\nStep 1: Processing email body content...")
+    mode = "full extraction" if full_attachments else "previews for classification"
+    print(f"Processing email bodies and attachments ({mode})...")
     preprocessor = EmailPreprocessor()
     
-    processed_conversations = []
-    pbar = tqdm(total=len(conversations), ascii=True)
-    for conv in conversations:
-        processed_conv = conv.copy()
-        processed_messages = []
-        
-        for msg in conv['Messages']:
-            processed_msg = msg.copy()
-            processed_msg['Body'] = preprocessor.preprocess_email_body(msg['Body'])
-            processed_messages.append(processed_msg)
-            
-        processed_conv['Messages'] = processed_messages
-        processed_conversations.append(processed_conv)
-        pbar.update(1)
-    pbar.close()
-    
-    print("Email body preprocessing complete!")
-    
-    # Step 2: Process attachments
-    print("\nStep 2: Processing attachments...")
-    doc_processor = DocumentProcessor()
-    
     processed_count = 0
     error_count = 0
-    total_attachments = sum(len(msg['AttachmentFiles']) 
-                          for conv in processed_conversations 
-                          for msg in conv['Messages'])
-    
-    pbar = tqdm(total=total_attachments, ascii=True)
-    for conv in processed_conversations:
-        for msg in conv['Messages']:
-            attachments = []
-            if msg['AttachmentFiles']:
-                for attachment in msg['AttachmentFiles']:
-                    ext = Path(attachment).suffix.lower()
-                    
-                    if ext in ['.pdf', '.docx', '.xlsx']:
-                        try:
-                            path_parts = attachment.replace('\\', '/').split('/')
-                            full_path = root_dir / 'data' / '/'.join(path_parts)
-                            
-                            if not full_path.exists():
-                                raise FileNotFoundError(f"File does not exist: {full_path}")
-                            
-                            processed_docs = list(doc_processor.process_document(str(full_path)))
-                            combined_content = "\n\n".join(doc.content for doc in processed_docs)
-                            
-                            attachments.append({
-                                'path': attachment,
-                                'type': ext,
-                                'content': combined_content,
-                                'metadata': [doc.metadata for doc in processed_docs]
-                            })
-                            processed_count += 1
-                        except Exception as e:
-                            error_msg = f"Error processing {attachment}: {str(e)}"
-                            print(f"\nError: {error_msg}")
-                            attachments.append({
-                                'path': attachment,
-                                'type': ext,
-                                'error': error_msg
-                            })
-                            error_count += 1
-                    pbar.update(1)
-            
-            msg['Attachments'] = attachments
-    pbar.close()
-    
-    print("\nAttachment processing complete!")
+    near_duplicate_index = NearDuplicateIndex() if near_duplicates else None
+    with AttachmentExtractionPool(workers=workers, preview=not full_attachments) as pool, \
+            stage_writer(_data_dir(), 'preprocessed_email_conversations') as writer:
+        pbar = tqdm(ascii=True, unit='conv')
+        for batch in batched(read_records(input_path)):
+            processed_conversations = [preprocess_conversation(preprocessor, conv) for conv in batch]
+            processed, errors = extract_attachments(processed_conversations, pool)
+            processed_count += processed
+            error_count += errors
+            if near_duplicate_index is not None:
+                mark_near_duplicates(processed_conversations, near_duplicate_index)
+            writer.write_many(processed_conversations)
+            pbar.update(len(batch))
+        pbar.close()
+    
+    print("\nPreprocessing complete!")
+    print(f"Conversations processed: {writer.count}")
     print(f"Successfully processed: {processed_count} attachments")
     print(f"Errors encountered: {error_count} attachments")
-    
-    # Save final preprocessed result
-    print(f"\nWriting preprocessed results to {output_path}")
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(processed_conversations, f, indent=2, ensure_ascii=False)
+    print(pool.stats.summary())
+    if near_duplicate_index is not None:
+        print(near_duplicate_index.stats.summary())
     
     print("\n=== Preprocessing Pipeline Complete! ===")
-    print(f"Output saved to: {output_path}")
+    print(f"Output saved to: {writer.path}")
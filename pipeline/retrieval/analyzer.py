@@ -65,7 +65,7 @@ class QueryAnalyzer(BaseAgent):
             print(f"Failed to create QueryAnalysis object: {e}")
             return None
 
-    def invoke(self, query: str) -> Optional[QueryAnalysis]:
+    def invoke(self, query: str, config=None, **kwargs) -> Optional[QueryAnalysis]:
         """Main entry point for query analysis.
         
         Args:
@@ -78,7 +78,19 @@ class QueryAnalyzer(BaseAgent):
             print("Query must be a non-empty string")
             return None
             
-        output = super().invoke({"query": query})
+        output = super().invoke({"query": query}, config, **kwargs)
+        return self._to_analysis(output)
+
+    async def ainvoke(self, query: str, config=None, **kwargs) -> Optional[QueryAnalysis]:
+        """Async version of invoke."""
+        if not query or not isinstance(query, str):
+            print("Query must be a non-empty string")
+            return None
+            
+        output = await super().ainvoke({"query": query}, config, **kwargs)
+        return self._to_analysis(output)
+
+    def _to_analysis(self, output: Optional[Dict]) -> Optional[QueryAnalysis]:
         if not output:
             return None
             
@@ -1,4 +1,4 @@
-from typing import Dict, List, Literal
+from typing import Dict, List, Literal, Optional
 from langchain.schema.runnable import RunnablePassthrough
 
 from ..common.store import EmailStore
@@ -6,7 +6,8 @@ from .retrievers import VectorRetriever, WeightedAverageRetriever, Multiplicativ
 from .analyzer import QueryAnalyzer
 from .filter_builder import ElasticsearchFilterBuilder
 from .processor import ConversationProcessor, ConversationGroup
-from .schema import RetrievalResult
+from .schema import RetrievalResult, QueryAnalysis
+from .request_context import RequestContext
 
 # Type for retriever selection
 RetrieverType = Literal["vector", "weighted", "multiplicative"]
@@ -14,9 +15,13 @@ RetrieverType = Literal["vector", "weighted", "multiplicative"]
 class RetrievalPipeline:
     """Pipeline for retrieving and processing email conversations"""
     
-    def __init__(self):
-        """Initialize pipeline components"""
-        self.store = EmailStore()
+    def __init__(self, store: Optional[EmailStore] = None):
+        """Initialize pipeline components
+        
+        Args:
+            store: Email store to search (defaults to a new EmailStore)
+        """
+        self.store = store or EmailStore()
         
         # Initialize retrievers
         self.vector_retriever = VectorRetriever(store=self.store)
@@ -28,58 +33,56 @@ class RetrievalPipeline:
         self.filter_builder = ElasticsearchFilterBuilder()
         
         # Initialize processor
-        self.processor = ConversationProcessor()
+        self.processor = ConversationProcessor(store=self.store)
         
         # Create retriever chains
         self._setup_chains()
     
     def _setup_chains(self):
-        """Set up retriever chains"""
+        """Set up retriever chains
+        
+        Chains take a RequestContext; the analysis and filter are read from it
+        rather than recomputed, so the analyzer runs once per request.
+        """
         # Vector-only chain (no query analysis)
-        self.vector_chain = RunnablePassthrough() | {"results": lambda x: self.vector_retriever.retrieve(x)}
+        self.vector_chain = RunnablePassthrough() | {"results": lambda ctx: self.vector_retriever.retrieve(ctx.query)}
         
         # Weighted chain with query analysis
         self.weighted_chain = (
             RunnablePassthrough()
-            | {"query": lambda x: x}
-            | {
-                "query": lambda x: x["query"],
-                "analysis": lambda x: self.query_analyzer.invoke(x["query"]),
-                "filter_dict": lambda x: self.filter_builder.build_filter(
-                    self.query_analyzer.invoke(x["query"])
-                ) if self.query_analyzer.invoke(x["query"]) else None
-            }
-            | {"results": lambda x: self.weighted_retriever.retrieve(
-                query=x["query"],
-                analysis=x["analysis"],
-                filter_dict=x["filter_dict"]
+            | {"results": lambda ctx: self.weighted_retriever.retrieve(
+                query=ctx.query,
+                analysis=self._analyze(ctx),
+                filter_dict=ctx.filter_dict
               )}
         )
         
         # Multiplicative chain with query analysis
         self.multiplicative_chain = (
             RunnablePassthrough()
-            | {"query": lambda x: x}
-            | {
-                "query": lambda x: x["query"],
-                "analysis": lambda x: self.query_analyzer.invoke(x["query"]),
-                "filter_dict": lambda x: self.filter_builder.build_filter(
-                    self.query_analyzer.invoke(x["query"])
-                ) if self.query_analyzer.invoke(x["query"]) else None
-            }
-            | {"results": lambda x: self.multiplicative_retriever.retrieve(
-                query=x["query"],
-                analysis=x["analysis"],
-                filter_dict=x["filter_dict"]
+            | {"results": lambda ctx: self.multiplicative_retriever.retrieve(
+                query=ctx.query,
+                analysis=self._analyze(ctx),
+                filter_dict=ctx.filter_dict
               )}
         )
     
+    def _analyze(self, context: RequestContext) -> Optional[QueryAnalysis]:
+        """Analyze the query of a request (no-op if it was already analyzed)"""
+        analysis = context.analyze(self.query_analyzer, self.filter_builder)
+        if context.error:
+            print(f"Warning: Query analysis failed: {context.error}")
+            # Fall back to vector-only search if analysis fails
+            context.error = None
+        return analysis
+    
     def retrieve(
         self,
         query: str,
         retriever_type: RetrieverType = "multiplicative",
         return_conversations: bool = True,
-        top_k: int = 5
+        top_k: int = 5,
+        context: Optional[RequestContext] = None
     ) -> RetrievalResult:
         """Run the retrieval pipeline
         
@@ -88,24 +91,20 @@ class RetrievalPipeline:
             retriever_type: Type of retriever to use ("vector", "weighted", "multiplicative")
             return_conversations: If True, return conversation groups. If False, return individual chunks.
             top_k: Number of top results to return
+            context: Request context carrying an existing analysis for this query
             
         Returns:
             RetrievalResult containing query analysis and either conversation groups or chunks
         """
+        context = context or RequestContext(query=query)
+        
         # Initialize result
         result = RetrievalResult(query=query)
         
         # Run query analysis for weighted/multiplicative retrievers
         if retriever_type != "vector":
-            try:
-                result.analysis = self.query_analyzer.invoke(query)
-                if result.analysis:
-                    result.filter_dict = self.filter_builder.build_filter(result.analysis)
-            except Exception as e:
-                print(f"Warning: Query analysis failed: {e}")
-                # Fall back to vector-only search if analysis fails
-                result.analysis = None
-                result.filter_dict = None
+            result.analysis = self._analyze(context)
+            result.filter_dict = context.filter_dict
         
         # Select and run appropriate chain
         chain = {
@@ -114,10 +113,10 @@ class RetrievalPipeline:
             "multiplicative": self.multiplicative_chain
         }[retriever_type]
         
-        output = chain.invoke(query)
+        output = chain.invoke(context)
         
         # Process results
-        conversation_groups = self.processor.group_conversations(output["results"])
+        conversation_groups = self.processor.group_conversations(output["results"], lazy=True)
         result.conversation_groups = conversation_groups
         
         if return_conversations:
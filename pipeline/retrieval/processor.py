@@ -1,61 +1,122 @@
-from typing import Dict, List, Any
-from dataclasses import dataclass
+from typing import Dict, List, Any, Iterable
+from dataclasses import dataclass, field
 
 @dataclass
 class ConversationGroup:
     chunks: List[Dict]
     max_score: float
     conversation_id: str
+    # False while chunks only holds the search hits (see ConversationProcessor.hydrate)
+    hydrated: bool = True
+    # Near-duplicate conversations that were indexed through this one
+    duplicate_conversation_ids: List[str] = field(default_factory=list)
+
+def get_group_field(group: Any, name: str, default: Any = None) -> Any:
+    """Read a field from a ConversationGroup or its serialized dict form"""
+    if isinstance(group, dict):
+        return group.get(name, default)
+    return getattr(group, name, default)
+
+def set_group_field(group: Any, name: str, value: Any):
+    if isinstance(group, dict):
+        group[name] = value
+    else:
+        setattr(group, name, value)
+
+def group_conversation_ids(group: Any) -> List[str]:
+    """The group's conversation ID followed by the near-duplicates it stands for"""
+    return [get_group_field(group, 'conversation_id')] + list(get_group_field(group, 'duplicate_conversation_ids') or [])
+
+def _add_duplicate_ids(group: Any, chunks: Iterable[Dict]):
+    """Collect the near-duplicate IDs recorded in chunk metadata onto the group"""
+    duplicate_ids = list(get_group_field(group, 'duplicate_conversation_ids') or [])
+    for chunk in chunks:
+        for conv_id in chunk['metadata'].get('duplicate_conversation_ids') or []:
+            if conv_id not in duplicate_ids:
+                duplicate_ids.append(conv_id)
+    set_group_field(group, 'duplicate_conversation_ids', duplicate_ids)
 
 class ConversationProcessor:
-    def __init__(self, max_chunk_length: int = 1000):
+    def __init__(self, max_chunk_length: int = 1000, store=None):
         self.max_chunk_length = max_chunk_length
+        self._store = store
+
+    @property
+    def store(self):
+        """Email store used for hydration (created on first use)"""
+        if self._store is None:
+            from ..common.store import EmailStore
+            self._store = EmailStore()
+        return self._store
 
     def group_conversations(
         self,
-        chunks: List[Dict]
+        chunks: List[Dict],
+        lazy: bool = False
     ) -> Dict[str, ConversationGroup]:
-        """Group chunks by conversation and fetch all related chunks"""
-        from ..common.store import EmailStore
-        store = EmailStore()
-        
-        # First create a map of chunk text to scores from search results
-        chunk_scores = {}
-        for chunk in chunks:
-            chunk_scores[chunk['text']] = {
-                'combined_score': chunk.get('combined_score', 0),
-                'vector_score': chunk.get('vector_score', 0)
-            }
+        """Group chunks by conversation and fetch all related chunks
         
+        Args:
+            chunks: Search hits, highest ranked first
+            lazy: If True, groups only hold their search hits and full conversations
+                are fetched later with hydrate()
+        """
         conversation_groups = {}
-        conv_ids_seen = set()
-        
         for chunk in chunks:
             conv_id = chunk['metadata']['conversation_id']
-            if conv_id in conv_ids_seen:
-                continue
-                
-            conv_ids_seen.add(conv_id)
-            
-            # Get ALL chunks for this conversation from the store
-            all_conv_chunks = store.get_chunks_by_conversation_id(conv_id)
+            if conv_id not in conversation_groups:
+                # The first (highest ranked) hit sets the group score
+                conversation_groups[conv_id] = ConversationGroup(
+                    chunks=[],
+                    max_score=chunk.get('combined_score', 0),
+                    conversation_id=conv_id,
+                    hydrated=False
+                )
+            conversation_groups[conv_id].chunks.append(chunk)
+        
+        for group in conversation_groups.values():
+            group.chunks.sort(key=lambda c: c['metadata'].get('chunk_index', 0))
+            _add_duplicate_ids(group, group.chunks)
+        
+        if not lazy:
+            self.hydrate(conversation_groups.values())
+        return conversation_groups
+
+    def hydrate(self, groups: Iterable[Any]):
+        """Replace the hit-only chunks of unhydrated groups with their full conversations
+        
+        All pending groups are fetched in one request. Works on ConversationGroup
+        objects and on their serialized dict form; groups are updated in place.
+        """
+        pending = [group for group in groups if not get_group_field(group, 'hydrated', True)]
+        if not pending:
+            return
+        
+        conversation_chunks = self.store.get_chunks_by_conversation_ids(
+            [get_group_field(group, 'conversation_id') for group in pending]
+        )
+        
+        for group in pending:
+            hits = {self._chunk_key(c): c for c in get_group_field(group, 'chunks', [])}
+            # Keep the hits if the conversation could not be fetched
+            all_conv_chunks = conversation_chunks.get(get_group_field(group, 'conversation_id')) or list(hits.values())
             
             # Update scores for chunks that were in search results
             for c in all_conv_chunks:
-                if c['text'] in chunk_scores:
-                    scores = chunk_scores[c['text']]
-                    c['combined_score'] = scores['combined_score']
-                    c['vector_score'] = scores['vector_score']
+                hit = hits.get(self._chunk_key(c))
+                if hit is not None:
+                    c['combined_score'] = hit.get('combined_score', 0)
+                    c['vector_score'] = hit.get('vector_score', 0)
                 # Other chunks keep their zero scores from store
             
-            # Create group with all chunks
-            conversation_groups[conv_id] = ConversationGroup(
-                chunks=all_conv_chunks,
-                max_score=chunk.get('combined_score', 0),
-                conversation_id=conv_id
-            )
-        
-        return conversation_groups
+            set_group_field(group, 'chunks', all_conv_chunks)
+            set_group_field(group, 'hydrated', True)
+            _add_duplicate_ids(group, all_conv_chunks)
+
+    @staticmethod
+    def _chunk_key(chunk: Dict) -> str:
+        """Match chunks by document ID, falling back to text for results without one"""
+        return chunk.get('id') or chunk['text']
 
     def process_conversation(
         self,
@@ -106,9 +167,13 @@ class ConversationProcessor:
             reverse=True
         )
         
+        # Fetch full conversations for the selected groups only
+        top_convs = sorted_convs[:max_conversations]
+        self.hydrate(top_convs)
+        
         # Process top conversations
         final_results = []
-        for conv_group in sorted_convs[:max_conversations]:
+        for conv_group in top_convs:
             processed_chunks = self.process_conversation(conv_group)
             final_results.extend(processed_chunks)
         
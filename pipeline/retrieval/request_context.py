@@ -0,0 +1,62 @@
+"""Per-request state shared by the retrieval steps."""
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from .schema import QueryAnalysis
+
+@dataclass
+class RequestContext:
+    """Carries the query analysis and filter through one request so the analyzer runs once"""
+    query: str
+    analysis: Optional[QueryAnalysis] = None
+    filter_dict: Optional[Dict] = None
+    analyzed: bool = False
+    error: Optional[str] = None
+
+    def analyze(self, analyzer, filter_builder) -> Optional[QueryAnalysis]:
+        """Run query analysis and build the filter, unless this request already did
+
+        Args:
+            analyzer: QueryAnalyzer used on the first call
+            filter_builder: Filter builder applied to a successful analysis
+
+        Returns:
+            QueryAnalysis object, or None if analysis failed
+        """
+        if self.analyzed:
+            return self.analysis
+
+        self.analyzed = True
+        try:
+            self.analysis = analyzer.invoke(self.query)
+            if self.analysis:
+                self.filter_dict = filter_builder.build_filter(self.analysis)
+        except Exception as e:
+            self.analysis = None
+            self.filter_dict = None
+            self.error = str(e)
+        return self.analysis
+
+    def to_query_info(self) -> Dict[str, Any]:
+        """Serialize into the query info dict exchanged between chat tools"""
+        query_info = {"query": self.query}
+        if self.error:
+            query_info["error"] = self.error
+        if self.analysis:
+            query_info["analysis"] = self.analysis.model_dump()
+            query_info["filter_dict"] = self.filter_dict
+        return query_info
+
+    @classmethod
+    def from_query_info(cls, query_info: Dict[str, Any]) -> "RequestContext":
+        """Rebuild a context from a query info dict produced by to_query_info"""
+        analysis = query_info.get("analysis")
+        if isinstance(analysis, dict):
+            analysis = QueryAnalysis(**analysis)
+        return cls(
+            query=query_info["query"],
+            analysis=analysis,
+            filter_dict=query_info.get("filter_dict"),
+            analyzed=True,
+            error=query_info.get("error")
+        )
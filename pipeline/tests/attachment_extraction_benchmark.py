@@ -0,0 +1,74 @@
+import json
+import time
+from pathlib import Path
+from typing import Dict, List
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from pipeline.preprocess.attachment_extraction import AttachmentExtractionPool, SUPPORTED_ATTACHMENT_TYPES
+
+app = typer.Typer()
+console = Console()
+
+DATA_DIR = Path(__file__).parent.parent.parent / 'data'
+
+def load_attachment_paths(input_file: str, limit: int) -> List[str]:
+    """Supported attachment paths from a raw conversations file"""
+    with open(DATA_DIR / input_file, 'r', encoding='utf-8') as f:
+        conversations = json.load(f)
+    paths = [
+        attachment
+        for conv in conversations
+        for msg in conv['Messages']
+        for attachment in msg['AttachmentFiles'] or []
+        if Path(attachment).suffix.lower() in SUPPORTED_ATTACHMENT_TYPES
+    ]
+    return paths[:limit]
+
+def test_extraction_pool(paths: List[str], worker_counts: List[int], timeout: float) -> Dict[int, Dict[str, float]]:
+    """Extract the same attachments with different worker counts and check the outputs match"""
+    results = {}
+    reference = None
+    for workers in worker_counts:
+        start = time.perf_counter()
+        with AttachmentExtractionPool(workers=workers, timeout=timeout) as pool:
+            entries = list(pool.imap(paths))
+        elapsed = time.perf_counter() - start
+
+        assert [entry['path'] for entry in entries] == paths, "entries out of order"
+        contents = [entry.get('content') for entry in entries]
+        if reference is None:
+            reference = contents
+        else:
+            assert contents == reference, f"{workers} workers produced different content"
+
+        results[workers] = {
+            'seconds': elapsed,
+            'files_per_second': len(paths) / elapsed if elapsed else 0.0,
+            'errors': sum(1 for entry in entries if 'error' in entry)
+        }
+    return results
+
+@app.command()
+def main(
+    input_file: str = typer.Option("email_conversations.json", help="Raw conversations file in data/"),
+    limit: int = typer.Option(200, help="Maximum number of attachments to extract"),
+    workers: List[int] = typer.Option([0, 2, 4, 8], help="Worker counts to compare (0 = in-process)"),
+    timeout: float = typer.Option(120, help="Per-file timeout in seconds")
+):
+    """Benchmark attachment extraction throughput across worker counts."""
+    paths = load_attachment_paths(input_file, limit)
+    results = test_extraction_pool(paths, workers, timeout)
+
+    table = Table(title=f"Attachment Extraction ({len(paths)} files)")
+    table.add_column("Workers", style="cyan")
+    table.add_column("Seconds", style="green")
+    table.add_column("Files / s", style="green")
+    table.add_column("Errors", style="green")
+    for count, stats in results.items():
+        table.add_row(str(count), f"{stats['seconds']:.1f}", f"{stats['files_per_second']:.1f}", str(stats['errors']))
+    console.print(table)
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,82 @@
+import json
+import time
+import asyncio
+from pathlib import Path
+from typing import Dict, List
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from pipeline.filter.email_classifier import EmailClassifier, BatchEmailClassifier
+from pipeline.filter.email_filter import split_conversations_by_message_count
+
+app = typer.Typer()
+console = Console()
+
+DATA_DIR = Path(__file__).parent.parent.parent / 'data'
+
+def prompt_tokens(classifier: BatchEmailClassifier, agent: EmailClassifier, input_data) -> int:
+    """Input tokens of the full message list (few-shot examples included) sent for one call"""
+    return sum(len(classifier.encoding.encode(m['content'], disallowed_special=())) for m in agent._build_messages(input_data))
+
+def test_batch_classification(conversations: List[Dict], batch_size: int = 10, workers: int = 8) -> Dict[str, Dict[str, float]]:
+    """Classify the same emails one per prompt and batched, comparing tokens, latency and agreement"""
+    single = EmailClassifier(use_cache=False, max_concurrency=workers)
+    batched = BatchEmailClassifier(max_batch_size=batch_size, use_cache=False, max_concurrency=workers)
+    batched.single_classifier.cache = None
+    batches = batched.pack_batches(conversations)
+
+    async def run_single():
+        return await asyncio.gather(*[single.ainvoke(conv) for conv in conversations], return_exceptions=True)
+
+    async def run_batched():
+        results = await asyncio.gather(*[batched.aclassify_batch([conversations[i] for i in batch]) for batch in batches])
+        return [result for batch_results in results for result in batch_results]
+
+    start = time.perf_counter()
+    single_results = asyncio.run(run_single())
+    single_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch_results = asyncio.run(run_batched())
+    batch_seconds = time.perf_counter() - start
+
+    single_tokens = sum(prompt_tokens(batched, single, conv) for conv in conversations)
+    batch_tokens = sum(prompt_tokens(batched, batched, [conversations[i] for i in batch]) for batch in batches)
+
+    agreed = sum(
+        1 for a, b in zip(single_results, batch_results)
+        if isinstance(a, dict) and b and a['decision'] == b['decision']
+    )
+    n = len(conversations)
+    return {
+        "single": {"prompts": n, "input_tokens_per_email": single_tokens / n, "seconds_per_email": single_seconds / n},
+        "batched": {"prompts": len(batches), "input_tokens_per_email": batch_tokens / n, "seconds_per_email": batch_seconds / n},
+        "agreement": {"pct": 100 * agreed / n}
+    }
+
+@app.command()
+def main(
+    input_file: str = typer.Option("preprocessed_email_conversations.json", help="Preprocessed conversations in data/"),
+    limit: int = typer.Option(50, help="Number of single-message emails to classify"),
+    batch_size: int = typer.Option(10, help="Emails per batched prompt"),
+    workers: int = typer.Option(8, help="Concurrent LLM requests")
+):
+    """Compare single-email and batched classification prompts on real emails."""
+    with open(DATA_DIR / input_file, 'r') as f:
+        single_conversations, _ = split_conversations_by_message_count(json.load(f))
+    results = test_batch_classification(single_conversations[:limit], batch_size, workers)
+
+    table = Table(title=f"Email Classification ({limit} emails, batch size {batch_size})")
+    table.add_column("Mode", style="cyan")
+    table.add_column("Prompts", style="green")
+    table.add_column("Input tokens / email", style="green")
+    table.add_column("Seconds / email", style="green")
+    for mode in ["single", "batched"]:
+        stats = results[mode]
+        table.add_row(mode, str(stats["prompts"]), f"{stats['input_tokens_per_email']:.0f}", f"{stats['seconds_per_email']:.2f}")
+    console.print(table)
+    console.print(f"Decision agreement: {results['agreement']['pct']:.1f}%")
+
+if __name__ == "__main__":
+    app()
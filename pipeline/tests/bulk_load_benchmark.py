@@ -0,0 +1,100 @@
+import time
+import uuid
+from typing import Dict, List
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from pipeline.common.store import EmailStore
+from pipeline.tests.chunking_benchmark import CountingEmbeddings
+
+app = typer.Typer()
+console = Console()
+
+def make_corpus(num_chunks: int) -> List[Dict]:
+    """Create a synthetic chunk corpus shaped like the real email index"""
+    corpus = []
+    for i in range(num_chunks):
+        conversation_id = f"bench-conv-{i // 10}"
+        corpus.append({
+            'id': uuid.uuid5(uuid.NAMESPACE_URL, f"{conversation_id}:{i}").hex,
+            'text': f"Chunk {i} of {conversation_id}: quarterly revenue and margin update for company {i % 97}.",
+            'metadata': {
+                'conversation_id': conversation_id,
+                'subject': f"Benchmark subject {i // 10}",
+                'sender_name': 'Benchmark',
+                'sender_email': 'bench@example.com',
+                'year': 2025,
+                'month': (i % 12) + 1,
+                'day': (i % 28) + 1,
+                'chunk_type': 'email_body',
+                'chunk_index': i,
+                'total_chunks': i + 1
+            }
+        })
+    return corpus
+
+def index_corpus(store: EmailStore, corpus: List[Dict], batch_size: int) -> None:
+    for i in range(0, len(corpus), batch_size):
+        batch = corpus[i:i + batch_size]
+        store.add_documents(
+            texts=[doc['text'] for doc in batch],
+            metadatas=[doc['metadata'] for doc in batch],
+            ids=[doc['id'] for doc in batch]
+        )
+
+def run_mode(mode: str, corpus: List[Dict], batch_size: int, force_merge: bool) -> Dict[str, float]:
+    """Index the corpus into a fresh index and measure docs/sec"""
+    store = EmailStore(
+        index_name=f"bench_bulk_{mode}",
+        status_index="bench_bulk_status",
+        embeddings=CountingEmbeddings()
+    )
+    store.clear_index()
+
+    start = time.perf_counter()
+    if mode == "bulk":
+        with store.bulk_load(force_merge=force_merge):
+            index_corpus(store, corpus, batch_size)
+    else:
+        index_corpus(store, corpus, batch_size)
+    elapsed = time.perf_counter() - start
+
+    store.client.indices.refresh(index=store.index_name)
+    doc_count = store.count_documents()
+    assert doc_count == len(corpus), f"{mode}: expected {len(corpus)} documents, found {doc_count}"
+
+    store.client.indices.delete(index=store.index_name)
+    return {'seconds': elapsed, 'docs_per_sec': len(corpus) / elapsed if elapsed else 0.0}
+
+def test_bulk_load_throughput(num_chunks: int = 100_000, batch_size: int = 500, force_merge: bool = True) -> Dict[str, Dict[str, float]]:
+    """Compare the default indexing path against bulk-load mode"""
+    corpus = make_corpus(num_chunks)
+    results = {
+        'default': run_mode("default", corpus, batch_size, force_merge),
+        'bulk': run_mode("bulk", corpus, batch_size, force_merge)
+    }
+    return results
+
+@app.command()
+def main(
+    num_chunks: int = typer.Option(100_000, help="Number of synthetic chunks to index"),
+    batch_size: int = typer.Option(500, help="Chunks per add_documents call"),
+    force_merge: bool = typer.Option(True, help="Force-merge after bulk loading (included in timing)")
+):
+    """Benchmark docs/sec of the default indexing path against EmailStore.bulk_load."""
+    results = test_bulk_load_throughput(num_chunks, batch_size, force_merge)
+
+    table = Table(title=f"Indexing {num_chunks:,} chunks")
+    table.add_column("Mode", style="cyan")
+    table.add_column("Seconds", style="green")
+    table.add_column("Docs/sec", style="green")
+    for mode, stats in results.items():
+        table.add_row(mode, f"{stats['seconds']:.1f}", f"{stats['docs_per_sec']:,.0f}")
+    console.print(table)
+
+    speedup = results['bulk']['docs_per_sec'] / results['default']['docs_per_sec'] if results['default']['docs_per_sec'] else 0
+    console.print(f"Bulk-load speedup: [bold]{speedup:.2f}x[/bold]")
+
+if __name__ == "__main__":
+    app()
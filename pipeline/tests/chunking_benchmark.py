@@ -0,0 +1,116 @@
+import time
+import hashlib
+from typing import Dict, List
+import typer
+from rich.console import Console
+from rich.table import Table
+from langchain_core.embeddings import Embeddings
+
+from pipeline.chunking.document_chunker import DocumentChunker
+
+app = typer.Typer()
+console = Console()
+
+EMBEDDING_DIM = 64
+
+class CountingEmbeddings(Embeddings):
+    """Deterministic fake embeddings that count every embedding call"""
+
+    def __init__(self):
+        self.document_calls = 0
+        self.query_calls = 0
+        self.texts_embedded = 0
+
+    def _vector(self, text: str) -> List[float]:
+        digest = hashlib.sha256(text.encode('utf-8')).digest()
+        return [digest[i % len(digest)] / 255.0 for i in range(EMBEDDING_DIM)]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.document_calls += 1
+        self.texts_embedded += len(texts)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self.query_calls += 1
+        return self._vector(text)
+
+    def reset(self):
+        self.document_calls = 0
+        self.query_calls = 0
+        self.texts_embedded = 0
+
+def make_attachment(doc_type: str, num_sentences: int) -> Dict:
+    """Create a synthetic attachment large enough to trigger semantic chunking"""
+    sentences = [
+        f"Sentence {i} discusses quarterly revenue for company {i % 7} in region {i % 3}."
+        for i in range(num_sentences)
+    ]
+    return {
+        'content': ' '.join(sentences),
+        'metadata': {
+            'conversation_id': f'bench-{doc_type}',
+            'subject': f'Benchmark {doc_type}',
+            'sender_name': 'Benchmark',
+            'sender_email': 'bench@example.com',
+            'year': 2025,
+            'month': 1,
+            'day': 1,
+            'extension': doc_type,
+            'attachment_metadata': {'extension': doc_type.lstrip('.')}
+        }
+    }
+
+def test_single_pass_chunking(num_documents: int = 20, num_sentences: int = 200) -> Dict[str, float]:
+    """Check that each semantically split document triggers exactly one embedding call"""
+    embeddings = CountingEmbeddings()
+    chunker = DocumentChunker("benchmark", embeddings=embeddings)
+
+    documents = [
+        make_attachment('.pdf' if i % 2 == 0 else '.docx', num_sentences)
+        for i in range(num_documents)
+    ]
+
+    total_chunks = 0
+    start = time.perf_counter()
+    for doc in documents:
+        embeddings_before = embeddings.document_calls
+        chunks = chunker.process_document(doc['content'], doc['metadata'])
+        calls = embeddings.document_calls - embeddings_before
+        assert calls == 1, f"Expected 1 embedding call per document, got {calls}"
+        total_chunks += len(chunks)
+    elapsed = time.perf_counter() - start
+
+    # Global indices must be contiguous across documents
+    assert chunker._current_chunk_index == total_chunks
+    assert chunker._total_chunks == total_chunks
+
+    return {
+        'documents': num_documents,
+        'chunks': total_chunks,
+        'embedding_calls': embeddings.document_calls,
+        'texts_embedded': embeddings.texts_embedded,
+        'calls_per_document': embeddings.document_calls / num_documents,
+        'seconds': elapsed
+    }
+
+@app.command()
+def main(
+    num_documents: int = typer.Option(20, help="Number of synthetic attachments to chunk"),
+    num_sentences: int = typer.Option(200, help="Number of sentences per attachment")
+):
+    """Benchmark embedding calls made while chunking attachments."""
+    stats = test_single_pass_chunking(num_documents, num_sentences)
+
+    table = Table(title="Chunking Embedding Calls")
+    table.add_column("Metric", style="cyan")
+    table.add_column("Value", style="green")
+    table.add_row("Documents", str(stats['documents']))
+    table.add_row("Chunks", str(stats['chunks']))
+    table.add_row("Embedding Calls", str(stats['embedding_calls']))
+    table.add_row("Texts Embedded", str(stats['texts_embedded']))
+    table.add_row("Calls per Document", f"{stats['calls_per_document']:.2f}")
+    table.add_row("Elapsed", f"{stats['seconds']:.3f}s")
+    console.print(table)
+
+if __name__ == "__main__":
+    app()
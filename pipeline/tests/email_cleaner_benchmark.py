@@ -0,0 +1,177 @@
+import json
+import time
+import random
+from pathlib import Path
+from typing import Dict, List, Optional
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from pipeline.preprocess.email_preprocessor import EmailPreprocessor, HTML_SNIFF_PATTERN
+from pipeline.common.records import read_records, resolve_records_path
+
+app = typer.Typer()
+console = Console()
+
+DATA_DIR = Path(__file__).parent.parent.parent / 'data'
+# Bodies and their cleaned text as produced by the original BeautifulSoup + regex cleaner
+GOLDEN_PATH = Path(__file__).parent / 'email_cleaner_golden.jsonl'
+
+WORDS = (
+    "the quarterly report fund portfolio revenue growth please review attached deal memo "
+    "term sheet valuation update meeting call tomorrow investment committee approval draft"
+).split()
+
+SIGNATURES = ['Best regards,', 'Thanks', '--', 'Sincerely,', 'BR,', 'Best,', 'Thank you', '__________']
+
+# Inputs that sit on the edges of the HTML sniff and the regex passes
+EDGE_CASES = [
+    '', '   ', '​', '\xa0\xa0', '\r\n\r\n', 'a < b and c > d', 'AT&T P&L &copy 2024', 'I <3 this', 'x<y', '<', '&',
+    'Tom & Jerry', '&amp;', 'Use <b>bold</b>', '<https://x.com>', 'Price <$100', 'see <mailto:a@b.com>',
+    'Thanks!!!', 'Yes yes yes no no', 'the the the end', 'theory the theory', '<!-- only a comment -->',
+    '<p>&lt;!-- escaped comment --&gt; text</p>', '<script>alert(1)</script>Visible', '\t\tIndented\t\ttext',
+    '- one\n* two\n• three', 'On Monday Jane wrote: hi', '> quoted\nreply', 'a\n \n\x0b\nb'
+]
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(4, 14))]
+    if rng.random() < 0.15:
+        i = rng.randrange(len(words))
+        words.insert(i, words[i])
+    return ' '.join(words).capitalize() + rng.choice(['.', '.', '!', '!!', '?', ''])
+
+def make_plain_body(rng: random.Random) -> str:
+    """Plain-text body with quotes, bullets, links, addresses, thread markers and signatures"""
+    lines = []
+    for _ in range(rng.randint(1, 8)):
+        r = rng.random()
+        if r < 0.1:
+            lines.append('> ' + _sentence(rng))
+        elif r < 0.2:
+            lines.append(rng.choice(['- ', '* ', '• ', '  - ']) + _sentence(rng))
+        elif r < 0.28:
+            lines.append(f"{_sentence(rng)} <https://example.com/path?id={rng.randint(0, 999)}>")
+        elif r < 0.33:
+            lines.append(f"Contact john.doe{rng.randint(0, 9)}@example.com for details")
+        elif r < 0.36:
+            lines.append('See https://mail.example.com/tracking123/abc')
+        elif r < 0.40:
+            lines.append('On Mon, Jan 6, 2025 Jane wrote:')
+        elif r < 0.43:
+            lines.append('From: Jane Sent: Monday To: Bob Subject: Hi')
+        elif r < 0.47:
+            lines.append(f"\t{_sentence(rng)} ​ end")
+        elif r < 0.5:
+            lines.append('')
+        else:
+            lines.append(_sentence(rng))
+    if rng.random() < 0.4:
+        lines.append(rng.choice(SIGNATURES))
+        lines.append('Jane Doe\r\nAnalyst')
+    return rng.choice(['\n', '\r\n', '\n\n', '\r\n\r\n']).join(lines)
+
+def make_html_body(rng: random.Random) -> str:
+    """HTML body: full Outlook-style documents and bare fragments"""
+    parts = []
+    for _ in range(rng.randint(1, 8)):
+        text = make_plain_body(rng) if rng.random() < 0.2 else _sentence(rng)
+        tag = rng.choice(['p', 'div', 'span', 'b', 'td', 'li'])
+        parts.append(f"<{tag}>{text.replace(chr(10), '<br>' + chr(10))}</{tag}>")
+        if rng.random() < 0.2:
+            parts.append('<!-- comment -->')
+        if rng.random() < 0.1:
+            parts.append('&nbsp;&amp;&lt;x&gt;')
+    inner = rng.choice(['\n', '']).join(parts)
+    style = '<style>p{color:red}</style>' if rng.random() < 0.5 else ''
+    script = '<script>var x=1;</script>' if rng.random() < 0.2 else ''
+    kind = rng.random()
+    if kind < 0.6:
+        return f'<html><head><meta charset="utf-8">{style}</head>\n<body>{inner}{script}</body></html>'
+    if kind < 0.7:
+        return f'<!DOCTYPE html>\r\n<html>\r\n<head>\r\n{style}</head>\r\n<body>\r\n<div>{inner}</div>\r\n</body>\r\n</html>\r\n'
+    return inner
+
+def make_bodies(count: int, seed: int = 0) -> List[str]:
+    """Deterministic mix of plain-text and HTML bodies plus the edge cases"""
+    rng = random.Random(seed)
+    bodies = [make_plain_body(rng) if rng.random() < 0.6 else make_html_body(rng) for _ in range(count)]
+    return EDGE_CASES + bodies
+
+def load_bodies(input_file: str, limit: int) -> List[str]:
+    """Message bodies from a raw conversations file in data/"""
+    bodies = []
+    for conv in read_records(resolve_records_path(DATA_DIR, input_file)):
+        for msg in conv['Messages']:
+            bodies.append(msg.get('Body') or '')
+            if len(bodies) >= limit:
+                return bodies
+    return bodies
+
+def test_golden_identity(preprocessor: EmailPreprocessor) -> int:
+    """The cleaner must reproduce the golden outputs byte for byte"""
+    count = 0
+    with open(GOLDEN_PATH, 'r', encoding='utf-8') as f:
+        for line in f:
+            case = json.loads(line)
+            cleaned = preprocessor.preprocess_email_body(case['body'])
+            assert cleaned == case['cleaned'], f"golden case {count} differs:\n{case['body']!r}\n{cleaned!r}\n{case['cleaned']!r}"
+            count += 1
+    return count
+
+def test_throughput(bodies: List[str], parsers: List[str]) -> Dict[str, Dict[str, float]]:
+    """Per-email cleaning time for plain and HTML bodies under each parser"""
+    groups = {
+        'plain': [body for body in bodies if not HTML_SNIFF_PATTERN.search(body)],
+        'html': [body for body in bodies if HTML_SNIFF_PATTERN.search(body)],
+        'all': bodies
+    }
+    results = {}
+    reference: Optional[List[str]] = None
+    for parser in parsers:
+        preprocessor = EmailPreprocessor(html_parser=parser)
+        stats = {}
+        for name, group in groups.items():
+            start = time.perf_counter()
+            cleaned = [preprocessor.preprocess_email_body(body) for body in group]
+            elapsed = time.perf_counter() - start
+            stats[f'{name}_us'] = elapsed / len(group) * 1e6 if group else 0.0
+        stats['emails_per_second'] = 1e6 / stats['all_us'] if stats['all_us'] else 0.0
+        if reference is None:
+            reference = cleaned
+            stats['mismatches'] = 0
+        else:
+            stats['mismatches'] = sum(1 for a, b in zip(reference, cleaned) if a != b)
+        results[parser] = stats
+    return results
+
+@app.command()
+def main(
+    input_file: Optional[str] = typer.Option(None, help="Raw conversations file in data/ to benchmark instead of synthetic bodies"),
+    count: int = typer.Option(5000, help="Number of synthetic bodies (or real bodies read from input-file)"),
+    parsers: List[str] = typer.Option(["html.parser", "lxml"], help="HTML parsers to compare (the first is the reference)")
+):
+    """Check the email body cleaner against the golden corpus and measure its throughput."""
+    golden_cases = test_golden_identity(EmailPreprocessor())
+    console.print(f"[green]Golden corpus: {golden_cases} bodies cleaned identically[/green]")
+
+    bodies = load_bodies(input_file, count) if input_file else make_bodies(count)
+    results = test_throughput(bodies, parsers)
+
+    table = Table(title=f"Email Body Cleaning ({len(bodies)} bodies)")
+    table.add_column("Parser", style="cyan")
+    table.add_column("Plain µs / email", style="green")
+    table.add_column("HTML µs / email", style="green")
+    table.add_column("Emails / s", style="green")
+    table.add_column("Outputs differing from first parser", style="yellow")
+    for parser, stats in results.items():
+        table.add_row(
+            parser,
+            f"{stats['plain_us']:.0f}",
+            f"{stats['html_us']:.0f}",
+            f"{stats['emails_per_second']:.0f}",
+            str(stats['mismatches'])
+        )
+    console.print(table)
+
+if __name__ == "__main__":
+    app()
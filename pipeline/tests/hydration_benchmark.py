@@ -0,0 +1,82 @@
+import time
+from typing import Dict, List
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from pipeline.common.store import EmailStore
+from pipeline.retrieval.processor import ConversationProcessor
+
+app = typer.Typer()
+console = Console()
+
+DEFAULT_QUERIES = [
+    "Summarize Shin-Etsu Chemical's actions regarding its share repurchase and tender offer in early 2025.",
+    "What did analysts say about TSMC's capex guidance?",
+    "Recent updates on Toyota's EV strategy",
+    "Semiconductor equipment demand outlook for 2025",
+    "Which companies announced buybacks last quarter?"
+]
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of values"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def hydrate_sequential(store: EmailStore, conversation_ids: List[str]) -> Dict[str, List[Dict]]:
+    """Previous behaviour: one search per conversation"""
+    return {conv_id: store.get_chunks_by_conversation_id(conv_id) for conv_id in conversation_ids}
+
+def test_hydration_latency(queries: List[str], repeats: int = 5, k: int = 100) -> Dict[str, Dict[str, float]]:
+    """Compare per-conversation hydration against the batched msearch path"""
+    store = EmailStore()
+    processor = ConversationProcessor(store=store)
+
+    timings = {"sequential": [], "batched": []}
+    for query in queries:
+        hits = store.similarity_search(query=query, k=k)
+        conversation_ids = list(dict.fromkeys(hit['metadata']['conversation_id'] for hit in hits))
+
+        for _ in range(repeats):
+            start = time.perf_counter()
+            sequential = hydrate_sequential(store, conversation_ids)
+            timings["sequential"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            groups = processor.group_conversations(hits)
+            timings["batched"].append(time.perf_counter() - start)
+
+        # Both paths must return the same chunks
+        for conv_id, chunks in sequential.items():
+            assert [c['id'] for c in chunks] == [c['id'] for c in groups[conv_id].chunks], conv_id
+
+    return {
+        mode: {
+            'p50_ms': percentile(values, 50) * 1000,
+            'p95_ms': percentile(values, 95) * 1000,
+            'runs': len(values)
+        }
+        for mode, values in timings.items()
+    }
+
+@app.command()
+def main(
+    query: List[str] = typer.Option(None, help="Query to run (repeatable, defaults to a built-in set)"),
+    repeats: int = typer.Option(5, help="Timed runs per query"),
+    k: int = typer.Option(100, help="Number of search hits to hydrate")
+):
+    """Benchmark conversation hydration latency against a live index."""
+    results = test_hydration_latency(query or DEFAULT_QUERIES, repeats, k)
+
+    table = Table(title="Conversation Hydration Latency")
+    table.add_column("Mode", style="cyan")
+    table.add_column("p50 (ms)", style="green")
+    table.add_column("p95 (ms)", style="green")
+    table.add_column("Runs", style="green")
+    for mode, stats in results.items():
+        table.add_row(mode, f"{stats['p50_ms']:.1f}", f"{stats['p95_ms']:.1f}", str(stats['runs']))
+    console.print(table)
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,127 @@
+import time
+import random
+from pathlib import Path
+from typing import Dict, List, Optional
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from pipeline.preprocess.near_duplicates import NearDuplicateIndex, CANONICAL_FIELD, conversation_text
+from pipeline.preprocess.pipeline import mark_near_duplicates
+from pipeline.common.records import read_records, resolve_records_path
+
+app = typer.Typer()
+console = Console()
+
+DATA_DIR = Path(__file__).parent.parent.parent / 'data'
+
+WORDS = (
+    "the quarterly report fund portfolio revenue growth please review attached deal memo "
+    "term sheet valuation update meeting call tomorrow investment committee approval draft "
+    "pricing desk hedge exposure margin clearing settlement volume futures options spread "
+    "rates credit equity commodity energy inflation yield curve duration liquidity outlook"
+).split()
+
+def _text(rng: random.Random, words: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+def _conversation(conv_id: str, body: str, attachment: Optional[str] = None) -> Dict:
+    message = {'Body': body, 'Attachments': [{'content': attachment}] if attachment else []}
+    return {'ConversationID': conv_id, 'Messages': [message]}
+
+def make_newsletter_copy(rng: random.Random, newsletter: str, recipient: str) -> str:
+    """A broadcast copy: personalised greeting, tracking link and a few edited words"""
+    words = newsletter.split()
+    for _ in range(rng.randint(0, 3)):
+        words[rng.randrange(len(words))] = rng.choice(WORDS)
+    link = f"https://news.example.com/t/{rng.getrandbits(48):x}"
+    return f"Dear {recipient},\n{' '.join(words)}\nUnsubscribe: {link}"
+
+def make_corpus(rng: random.Random, newsletters: int, copies: int, unique: int) -> List[Dict]:
+    """Conversations with a 'cluster' label: copies of each newsletter share one"""
+    conversations = []
+    for n in range(newsletters):
+        newsletter = _text(rng, rng.randint(150, 600))
+        report = _text(rng, 2000) if n % 2 else None
+        for c in range(copies):
+            conv = _conversation(f"news-{n}-{c}", make_newsletter_copy(rng, newsletter, f"Reader {c}"), report)
+            conv['cluster'] = f"news-{n}"
+            conversations.append(conv)
+    for u in range(unique):
+        conv = _conversation(f"unique-{u}", _text(rng, rng.randint(60, 400)))
+        conv['cluster'] = f"unique-{u}"
+        conversations.append(conv)
+    # Same newsletter body with a different attached report is not a duplicate
+    body = _text(rng, 100)
+    for r in range(2):
+        conv = _conversation(f"template-{r}", body, _text(rng, 2000))
+        conv['cluster'] = f"template-{r}"
+        conversations.append(conv)
+    rng.shuffle(conversations)
+    return conversations
+
+def load_conversations(input_file: str, limit: int) -> List[Dict]:
+    """Single-message conversations from a preprocessed file in data/"""
+    conversations = []
+    for conv in read_records(resolve_records_path(DATA_DIR, input_file)):
+        if len(conv['Messages']) == 1:
+            conversations.append(conv)
+            if len(conversations) >= limit:
+                break
+    return conversations
+
+def test_clusters(conversations: List[Dict]) -> Dict[str, int]:
+    """Marked duplicates must point at a conversation of the same labelled cluster"""
+    clusters = {conv['ConversationID']: conv['cluster'] for conv in conversations}
+    first_of_cluster = {}
+    for conv in conversations:
+        first_of_cluster.setdefault(conv['cluster'], conv['ConversationID'])
+
+    false_positives = 0
+    missed = 0
+    for conv in conversations:
+        canonical = conv.get(CANONICAL_FIELD)
+        if canonical is not None and clusters[canonical] != conv['cluster']:
+            false_positives += 1
+        if canonical is None and first_of_cluster[conv['cluster']] != conv['ConversationID']:
+            missed += 1
+    assert false_positives == 0, f"{false_positives} conversations marked as duplicates of a different cluster"
+    return {'false_positives': false_positives, 'missed': missed}
+
+@app.command()
+def main(
+    input_file: Optional[str] = typer.Option(None, help="Preprocessed conversations file in data/ to measure instead of a synthetic corpus"),
+    newsletters: int = typer.Option(200, help="Distinct newsletters in the synthetic corpus"),
+    copies: int = typer.Option(10, help="Copies of each newsletter"),
+    unique: int = typer.Option(3000, help="Unique emails in the synthetic corpus"),
+    limit: int = typer.Option(20000, help="Conversations read from input-file")
+):
+    """Measure near-duplicate clustering quality, speed and dedup ratio."""
+    if input_file:
+        conversations = load_conversations(input_file, limit)
+    else:
+        conversations = make_corpus(random.Random(0), newsletters, copies, unique)
+
+    index = NearDuplicateIndex()
+    start = time.perf_counter()
+    mark_near_duplicates(conversations, index)
+    elapsed = time.perf_counter() - start
+    chars = sum(len(conversation_text(conv)) for conv in conversations)
+
+    table = Table(title=f"Near-Duplicate Detection ({len(conversations)} conversations)")
+    table.add_column("Metric", style="cyan")
+    table.add_column("Value", style="green")
+    table.add_row("Conversations / s", f"{len(conversations) / elapsed:.0f}")
+    table.add_row("MB / s", f"{chars / elapsed / 1e6:.1f}")
+    table.add_row("Near-duplicates", str(index.stats.duplicates))
+    table.add_row("Clusters", str(index.stats.clusters))
+    table.add_row("Dedup ratio", f"{100 * index.stats.dedup_ratio:.1f}%")
+    if not input_file:
+        quality = test_clusters(conversations)
+        table.add_row("Wrong cluster", str(quality['false_positives']))
+        table.add_row("Missed copies", str(quality['missed']))
+    console.print(table)
+    console.print(index.stats.summary())
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,110 @@
+import time
+import resource
+import tempfile
+import multiprocessing
+from pathlib import Path
+from typing import Dict, List
+import typer
+import openpyxl
+from docx import Document
+from rich.console import Console
+from rich.table import Table
+
+from pipeline.preprocess.attachment_processor import DocumentProcessor, ExtractionLimits
+
+app = typer.Typer()
+console = Console()
+
+def make_xlsx(path: Path, rows: int, columns: int = 10):
+    """Write a trading-volume style workbook without holding it in memory"""
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('Volume')
+    sheet.append([f'Column {c}' for c in range(columns)])
+    for i in range(rows):
+        sheet.append([i if c % 3 == 0 else i * 1.25 if c % 3 == 1 else f'Contract {i % 97}' for c in range(columns)])
+    workbook.save(path)
+
+def make_docx(path: Path, paragraphs: int, table_rows: int):
+    """Write a Word document with many paragraphs followed by a large table"""
+    doc = Document()
+    for i in range(paragraphs):
+        doc.add_paragraph(f"Paragraph {i}: average daily volume rose in interest rate futures. " * 3)
+    table = doc.add_table(rows=table_rows, cols=4)
+    for i, row in enumerate(table.rows):
+        for j, cell in enumerate(row.cells):
+            cell.text = f"r{i}c{j}"
+    doc.save(path)
+
+def _extract(path: str, limits: ExtractionLimits, queue):
+    """Child process: extract one file and report time, peak memory and output size"""
+    processor = DocumentProcessor()
+    start = time.perf_counter()
+    if path.endswith('.xlsx'):
+        content, truncated = processor._load_xlsx(path, limits)
+    else:
+        content, truncated = processor._load_docx(path, limits)
+    queue.put({
+        'seconds': time.perf_counter() - start,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'chars': len(content),
+        'truncated': truncated or ''
+    })
+
+def test_extraction(paths: List[Path], limits: ExtractionLimits) -> Dict[str, Dict]:
+    """Extract each file in a fresh process so peak memory is measured per file"""
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    for path in paths:
+        queue = context.Queue()
+        process = context.Process(target=_extract, args=(str(path), limits, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+        assert result['chars'] > 0, f"no text extracted from {path.name}"
+        if limits.max_bytes is not None:
+            assert result['chars'] <= limits.max_bytes, f"{path.name} exceeded the text limit"
+        results[path.name] = result
+    return results
+
+@app.command()
+def main(
+    rows: int = typer.Option(200000, help="Rows in the synthetic spreadsheet"),
+    paragraphs: int = typer.Option(20000, help="Paragraphs in the synthetic Word document"),
+    table_rows: int = typer.Option(2000, help="Table rows in the synthetic Word document"),
+    max_rows: int = typer.Option(50000, help="Row cap for the capped run"),
+    max_bytes: int = typer.Option(2_000_000, help="Text cap in bytes for the capped run")
+):
+    """Measure streaming XLSX/DOCX extraction time and peak memory, with and without caps."""
+    with tempfile.TemporaryDirectory() as tmp:
+        xlsx_path = Path(tmp) / 'volume.xlsx'
+        docx_path = Path(tmp) / 'report.docx'
+        make_xlsx(xlsx_path, rows)
+        make_docx(docx_path, paragraphs, table_rows)
+
+        runs = {
+            'uncapped': ExtractionLimits(max_rows=None, max_cells=None, max_bytes=None),
+            'capped': ExtractionLimits(max_rows=max_rows, max_bytes=max_bytes)
+        }
+        table = Table(title="Office Document Extraction")
+        table.add_column("File", style="cyan")
+        table.add_column("Size MB", style="green")
+        table.add_column("Limits", style="cyan")
+        table.add_column("Seconds", style="green")
+        table.add_column("Peak RSS MB", style="green")
+        table.add_column("Chars", style="green")
+        table.add_column("Truncated", style="yellow")
+        for name, limits in runs.items():
+            for file_name, stats in test_extraction([xlsx_path, docx_path], limits).items():
+                table.add_row(
+                    file_name,
+                    f"{(Path(tmp) / file_name).stat().st_size / 1e6:.1f}",
+                    name,
+                    f"{stats['seconds']:.1f}",
+                    f"{stats['peak_rss_mb']:.0f}",
+                    str(stats['chars']),
+                    stats['truncated']
+                )
+        console.print(table)
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,82 @@
+import time
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+import typer
+import pymupdf
+from rich.console import Console
+from rich.table import Table
+
+from pipeline.preprocess.attachment_processor import DocumentProcessor
+
+app = typer.Typer()
+console = Console()
+
+def make_deck(path: Path, pages: int, spans_per_page: int = 400):
+    """Write a broker-deck style PDF with a title and many small text spans per page"""
+    doc = pymupdf.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((50, 40), f"QUARTERLY REVIEW PAGE {i + 1}", fontsize=14)
+        for j in range(spans_per_page):
+            x = 40 + (j * 37) % 500
+            y = 70 + (j * 53) % 720
+            page.insert_text((x, y), f"{j * (i + 1) % 997}.{j % 10}%", fontsize=5)
+    doc.save(path)
+    doc.close()
+
+def test_page_offsets(path: Path, content: str, page_offsets: List[int]):
+    """Every page offset must point at the start of that page's cleaned text"""
+    processor = DocumentProcessor(page_workers=1)
+    with pymupdf.open(path) as doc:
+        assert len(page_offsets) == doc.page_count, "one offset per page expected"
+        for number, page in enumerate(doc):
+            text = processor._clean_text(page.get_text())
+            if text:
+                assert content[page_offsets[number]:].startswith(text), f"page {number + 1} offset is wrong"
+
+def test_page_workers(path: Path, worker_counts: List[int]) -> Dict[int, float]:
+    """Extract the same PDF with different page worker counts and check the outputs match"""
+    results = {}
+    reference = None
+    for workers in worker_counts:
+        processor = DocumentProcessor(page_workers=workers)
+        start = time.perf_counter()
+        doc = next(processor.process_document(str(path)))
+        results[workers] = time.perf_counter() - start
+
+        if reference is None:
+            reference = doc
+            test_page_offsets(path, doc.content, doc.metadata['page_offsets'])
+        else:
+            assert doc.content == reference.content, f"{workers} page workers produced different text"
+            assert doc.metadata['page_offsets'] == reference.metadata['page_offsets'], "page offsets differ"
+    return results
+
+@app.command()
+def main(
+    pdf: Optional[Path] = typer.Option(None, help="PDF to benchmark instead of a synthetic deck"),
+    pages: int = typer.Option(200, help="Pages in the synthetic deck"),
+    workers: List[int] = typer.Option([1, 2, 4, 8], help="Page worker counts to compare (1 = sequential)")
+):
+    """Benchmark page-parallel PDF extraction and check page offsets."""
+    with tempfile.TemporaryDirectory() as tmp:
+        if pdf is None:
+            pdf = Path(tmp) / 'deck.pdf'
+            make_deck(pdf, pages)
+        with pymupdf.open(pdf) as doc:
+            page_count = doc.page_count
+        results = test_page_workers(pdf, workers)
+
+    table = Table(title=f"PDF Extraction ({page_count} pages)")
+    table.add_column("Page workers", style="cyan")
+    table.add_column("Seconds", style="green")
+    table.add_column("Pages / s", style="green")
+    table.add_column("Speedup", style="green")
+    baseline = results[workers[0]]
+    for count, seconds in results.items():
+        table.add_row(str(count), f"{seconds:.2f}", f"{page_count / seconds:.0f}", f"{baseline / seconds:.2f}x")
+    console.print(table)
+
+if __name__ == "__main__":
+    app()
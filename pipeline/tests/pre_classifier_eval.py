@@ -0,0 +1,71 @@
+import random
+from pathlib import Path
+from typing import Dict
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from pipeline.filter.pre_classifier import (
+    PreClassifier,
+    TfidfLogisticModel,
+    conversation_features,
+    load_training_examples
+)
+
+app = typer.Typer()
+console = Console()
+
+def test_pre_classifier_agreement(output_dir: Path, holdout: float = 0.2, confidence: float = 0.97, seed: int = 0) -> Dict[str, float]:
+    """Train on part of a previous run's LLM decisions and check the local decisions on the rest"""
+    conversations, labels, categories = load_training_examples(output_dir)
+    assert conversations, f"No LLM decisions found in {output_dir}"
+
+    order = list(range(len(conversations)))
+    random.Random(seed).shuffle(order)
+    split = int(len(order) * (1 - holdout))
+    train, test = order[:split], order[split:]
+
+    model = TfidfLogisticModel().fit(
+        [conversation_features(conversations[i]) for i in train],
+        [labels[i] for i in train],
+        [categories[i] for i in train]
+    )
+    pre_classifier = PreClassifier(model=model, confidence=confidence)
+    results = pre_classifier.classify_batch([conversations[i] for i in test])
+
+    decided = [(r, labels[i]) for r, i in zip(results, test) if r is not None]
+    agreed = sum(1 for r, label in decided if (r['decision'] == 'INCLUDE') == bool(label))
+    by_model = [(r, i) for r, i in zip(results, test) if r is not None and r.get('classified_by') == 'model']
+    same_category = sum(1 for r, i in by_model if r['category'] == categories[i])
+    # Included emails wrongly excluded are the costly mistake
+    lost = sum(1 for r, label in decided if label and r['decision'] == 'EXCLUDE')
+    stats = pre_classifier.stats
+    return {
+        'test_conversations': len(test),
+        'decided_by_rules': stats.by_rules,
+        'decided_by_model': stats.by_model,
+        'llm_calls_saved_pct': 100 * stats.llm_calls_saved / max(stats.total, 1),
+        'agreement_pct': 100 * agreed / max(len(decided), 1),
+        'model_category_agreement_pct': 100 * same_category / max(len(by_model), 1),
+        'includes_lost': lost
+    }
+
+@app.command()
+def main(
+    output_dir: str = typer.Option("processed_emails", help="Filter output directory in data/ with LLM decisions"),
+    holdout: float = typer.Option(0.2, help="Fraction of decisions held out for evaluation"),
+    confidence: float = typer.Option(0.97, help="Minimum model confidence for a local decision")
+):
+    """Measure how many LLM calls the pre-classifier saves and how often it agrees with the LLM."""
+    root_dir = Path(__file__).parent.parent.parent
+    results = test_pre_classifier_agreement(root_dir / 'data' / output_dir, holdout, confidence)
+
+    table = Table(title="Pre-classifier vs LLM")
+    table.add_column("Metric", style="cyan")
+    table.add_column("Value", style="green")
+    for metric, value in results.items():
+        table.add_row(metric, f"{value:.1f}" if isinstance(value, float) else str(value))
+    console.print(table)
+
+if __name__ == "__main__":
+    app()
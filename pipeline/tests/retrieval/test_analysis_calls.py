@@ -0,0 +1,115 @@
+import json
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from pipeline.common.store import EmailStore
+from pipeline.retrieval.pipeline import RetrievalPipeline
+from pipeline.chat.tools import QueryAnalysisTool, ContentRetrievalTool
+
+app = typer.Typer()
+console = Console()
+
+TEST_QUERY = "Summarize the reports on Samsung SDS over the past 3 quarters"
+
+ANALYSIS_RESPONSE = json.dumps({
+    "thought_process": ["Identify Samsung SDS and the last three quarters"],
+    "company_info": {
+        "name": "Samsung SDS",
+        "origin": "Korea",
+        "variations": ["Samsung SDS", "SDS"],
+        "confidence": 0.9
+    },
+    "temporal_info": {
+        "years": [2024],
+        "months": None,
+        "quarter": {"number": [2, 3, 4], "year": [2024, 2024, 2024]},
+        "confidence": 0.9
+    },
+    "content_info": {
+        "domain": "IT services",
+        "key_terms": ["earnings"],
+        "action_type": "report",
+        "confidence": 0.8
+    },
+    "original_query": TEST_QUERY
+})
+
+class CountingLLM:
+    """Stand-in chat model that returns a fixed analysis and counts calls"""
+
+    def __init__(self, content: str = ANALYSIS_RESPONSE):
+        self.content = content
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        return SimpleNamespace(content=self.content)
+
+class FakeStore(EmailStore):
+    """EmailStore that serves canned hits without Elasticsearch"""
+
+    def __init__(self):
+        self.searches = 0
+
+    def similarity_search(self, query: str, filter_dict: Optional[Dict] = None, k: int = 50, with_vectors: bool = False) -> List[Dict]:
+        self.searches += 1
+        return [
+            {
+                'id': f'doc-{i}',
+                'text': f'Chunk {i} about {query}',
+                'metadata': {'conversation_id': f'conv-{i % 3}', 'chunk_index': i, 'chunk_type': 'email_body'},
+                'vector_score': 1.0 - i / 100
+            }
+            for i in range(min(k, 10))
+        ]
+
+    def get_chunks_by_conversation_ids(self, conversation_ids: List[str], with_vectors: bool = False, max_searches: int = 100) -> Dict[str, List[Dict]]:
+        return {conversation_id: [] for conversation_id in conversation_ids}
+
+def test_retrieval_pipeline_calls(retriever_type: str) -> int:
+    """Run RetrievalPipeline.retrieve and return the number of LLM calls it made"""
+    llm = CountingLLM()
+    pipeline = RetrievalPipeline(store=FakeStore())
+    pipeline.query_analyzer.llm = llm
+    pipeline.query_analyzer.cache = None
+
+    result = pipeline.retrieve(TEST_QUERY, retriever_type=retriever_type)
+    expected = 0 if retriever_type == "vector" else 1
+    assert llm.calls == expected, f"{retriever_type}: expected {expected} LLM calls, got {llm.calls}"
+    if expected:
+        assert result.analysis is not None and result.filter_dict
+    return llm.calls
+
+def test_chat_tools_calls() -> int:
+    """Run the chat analysis and retrieval steps and return the number of LLM calls"""
+    llm = CountingLLM()
+    analysis_tool = QueryAnalysisTool()
+    analysis_tool.analyzer.llm = llm
+    analysis_tool.analyzer.cache = None
+    retrieval_tool = ContentRetrievalTool(retriever_type="advanced", store=FakeStore())
+
+    # Same sequence as AnalysisChain.run
+    query_info = analysis_tool.run(TEST_QUERY)
+    output = retrieval_tool.run({"query": TEST_QUERY, "query_info": query_info})
+
+    assert llm.calls == 1, f"chat tools: expected 1 LLM call, got {llm.calls}"
+    assert output["results"]
+    return llm.calls
+
+@app.command()
+def main():
+    """Check that query analysis runs exactly once per request."""
+    table = Table(title="LLM Calls per Query")
+    table.add_column("Path", style="cyan")
+    table.add_column("LLM Calls", style="green")
+
+    for retriever_type in ["vector", "weighted", "multiplicative"]:
+        table.add_row(f"RetrievalPipeline ({retriever_type})", str(test_retrieval_pipeline_calls(retriever_type)))
+    table.add_row("Chat tools (advanced)", str(test_chat_tools_calls()))
+    console.print(table)
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,148 @@
+import time
+import random
+from pathlib import Path
+from typing import Dict, List, Optional
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from pipeline.chunking.thread_dedup import ThreadDeduplicator
+from pipeline.chunking.conversation_processor import ConversationProcessor
+from pipeline.common.records import read_records, resolve_records_path
+
+app = typer.Typer()
+console = Console()
+
+DATA_DIR = Path(__file__).parent.parent.parent / 'data' / 'processed_emails'
+
+WORDS = (
+    "the quarterly report fund portfolio revenue growth please review attached deal memo "
+    "term sheet valuation update meeting call tomorrow investment committee approval draft "
+    "pricing desk hedge exposure margin clearing settlement volume futures options spread"
+).split()
+
+SENDERS = ['Jane Doe', 'Bob Smith', 'Alice Wong', 'Carlos Diaz']
+
+def _paragraph(rng: random.Random, marker: str) -> str:
+    sentences = [' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 16))).capitalize() + '.' for _ in range(rng.randint(2, 5))]
+    return f"{marker} " + ' '.join(sentences)
+
+def _quote(rng: random.Random, sender: str, date: str, body: str) -> str:
+    """Previous message in one of the reply styles mail clients produce"""
+    style = rng.choice(['outlook', 'gmail', 'forward', 'inline'])
+    if style == 'outlook':
+        return f"From: {sender} <{sender.split()[0].lower()}@example.com>\nSent: {date}\nTo: Team\nSubject: RE: Update\n\n{body}"
+    if style == 'gmail':
+        return f"On {date}, {sender} wrote:\n" + '\n'.join('> ' + line for line in body.split('\n'))
+    if style == 'forward':
+        return f"---------- Forwarded message ---------\nFrom: {sender}\nDate: {date}\nSubject: Update\n\n{body}"
+    return '-----Original Message-----\n' + body
+
+def make_conversation(rng: random.Random, index: int, replies: int) -> Dict:
+    """Thread where every reply adds a marked paragraph on top of the quoted history"""
+    messages = []
+    history = ''
+    for i in range(replies):
+        sender = SENDERS[i % len(SENDERS)]
+        date = f"2024-03-{1 + i:02d}T09:00:00"
+        novel = _paragraph(rng, f"NOVEL-{index}-{i}")
+        body = novel if not history else f"{novel}\n\n{_quote(rng, SENDERS[(i - 1) % len(SENDERS)], messages[-1]['ReceivedTime'], history)}"
+        messages.append({
+            'Subject': 'RE: Update',
+            'SenderName': sender,
+            'SenderEmail': f"{sender.split()[0].lower()}@example.com",
+            'ReceivedTime': date,
+            'Body': body
+        })
+        history = body
+    rng.shuffle(messages)
+    return {'ConversationID': f"conv-{index}", 'Topic': 'Update', 'Messages': messages}
+
+def load_conversations(input_file: str, limit: int) -> List[Dict]:
+    """Multi-message conversations from an included emails file in data/processed_emails"""
+    conversations = []
+    for item in read_records(resolve_records_path(DATA_DIR, input_file)):
+        conv = item.get('conversation', item)
+        if len(conv.get('Messages', [])) > 1:
+            conversations.append(conv)
+            if len(conversations) >= limit:
+                break
+    return conversations
+
+def test_novel_text_kept(conversations: List[Dict]):
+    """Each synthetic message keeps its own paragraph and none of the quoted ones"""
+    dedup = ThreadDeduplicator()
+    for conv in conversations:
+        for message, body in zip(conv['Messages'], dedup.novel_bodies(conv['Messages'])):
+            own = message['Body'].split('\n\n')[0]
+            assert own in body, f"novel text lost in {conv['ConversationID']}:\n{body}"
+            marker = own.split()[0]
+            assert body.count('NOVEL-') == 1, f"quoted text kept after {marker}:\n{body}"
+
+def test_short_replies_kept():
+    """Short answers posted below or between quoted text survive deduplication"""
+    question = ("Can you confirm the size of the revenue guidance the company gave on the call, "
+                "and whether the buyback was also raised during the quarter?")
+    follow_up = "Please also check whether the dividend was changed at the same time as the buyback."
+    replies = {
+        'bottom-posted': f"On 2024-03-01, Jane Doe wrote:\n> {question}\n\nNo, it was 30 billion.",
+        'unmarked': f"{question}\nNo, it was 30 billion.",
+        'inline': f"> {question}\nNo, it was 30 billion.\n> {follow_up}\nUnchanged.",
+    }
+    dedup = ThreadDeduplicator()
+    for style, reply in replies.items():
+        messages = [
+            {'ReceivedTime': '2024-03-01T09:00:00', 'Body': f"{question}\n{follow_up}"},
+            {'ReceivedTime': '2024-03-02T09:00:00', 'Body': reply}
+        ]
+        body = dedup.novel_bodies(messages)[1]
+        assert "No, it was 30 billion." in body, f"{style} reply lost: {body!r}"
+        assert "revenue guidance" not in body, f"{style} reply kept the quoted question: {body!r}"
+        if style == 'inline':
+            assert "Unchanged." in body and "dividend" not in body, f"inline reply: {body!r}"
+
+def test_chunking(conversations: List[Dict]) -> Dict[str, Dict[str, float]]:
+    """Chunk count, embedded characters and time with and without thread deduplication"""
+    results = {}
+    for name, dedup in [('full bodies', False), ('novel text', True)]:
+        processor = ConversationProcessor(dataset='email', dedup_threads=dedup)
+        start = time.perf_counter()
+        chunks = [chunk for conv in conversations for chunk in processor.process_conversation(conv)]
+        results[name] = {
+            'seconds': time.perf_counter() - start,
+            'chunks': len(chunks),
+            'chars': sum(len(chunk.content) for chunk in chunks)
+        }
+    return results
+
+@app.command()
+def main(
+    input_file: Optional[str] = typer.Option(None, help="Included emails file in data/processed_emails to measure instead of synthetic threads"),
+    count: int = typer.Option(500, help="Number of conversations"),
+    replies: int = typer.Option(8, help="Messages per synthetic conversation")
+):
+    """Measure how much thread deduplication cuts chunks and embedded text."""
+    if input_file:
+        conversations = load_conversations(input_file, count)
+    else:
+        rng = random.Random(0)
+        conversations = [make_conversation(rng, i, replies) for i in range(count)]
+        test_novel_text_kept(conversations)
+        test_short_replies_kept()
+        console.print("[green]Synthetic threads: novel text and short replies kept, quoted history removed[/green]")
+
+    results = test_chunking(conversations)
+    table = Table(title=f"Thread Deduplication ({len(conversations)} conversations)")
+    table.add_column("Bodies", style="cyan")
+    table.add_column("Chunks", style="green")
+    table.add_column("Characters", style="green")
+    table.add_column("Seconds", style="green")
+    for name, stats in results.items():
+        table.add_row(name, str(stats['chunks']), str(stats['chars']), f"{stats['seconds']:.2f}")
+    console.print(table)
+    full, novel = results['full bodies'], results['novel text']
+    if full['chars']:
+        console.print(f"Embedded text reduced by {100 * (1 - novel['chars'] / full['chars']):.1f}%")
+
+if __name__ == "__main__":
+    app()
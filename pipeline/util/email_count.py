@@ -1,15 +1,18 @@
-import json
 from pathlib import Path
 
+from pipeline.common.records import read_records, resolve_records_path
+
 def count_email_metrics():
-    data_path = Path(__file__).parent.parent.parent / 'data' / 'email_conversations.json'
-    with open(data_path, 'r') as f:
-        conversations = json.load(f)
-    
-    total_conversations = len(conversations)
-    total_messages = sum(len(conv['Messages']) for conv in conversations)
+    data_path = resolve_records_path(Path(__file__).parent.parent.parent / 'data', 'email_conversations')
     
-    multi_message_convs = sum(1 for conv in conversations if len(conv['Messages']) > 1)
+    total_conversations = 0
+    total_messages = 0
+    multi_message_convs = 0
+    for conv in read_records(data_path):
+        total_conversations += 1
+        total_messages += len(conv['Messages'])
+        if len(conv['Messages']) > 1:
+            multi_message_convs += 1
     single_message_convs = total_conversations - multi_message_convs
     
     print(f"Total number of conversations: {total_conversations}")
@@ -18,4 +21,4 @@ def count_email_metrics():
     print(f"Number of conversations with exactly 1 message: {single_message_convs}")
 
 if __name__ == "__main__":
-    count_email_metrics()
\ No newline at end of file
+    count_email_metrics()